@@ -0,0 +1,217 @@
+"""
+AI Coach latency benchmark against the local OpenAI stand-in.
+
+    python benchmarks/ai_latency.py --sessions 8 --requests 5 --latency 0.3
+
+1. Tab latency: renders pages/ai_coach.py with Streamlit's AppTest and
+   clicks each analysis button, cold (empty response cache) then warm,
+   recording end-to-end time, time to first token and prompt size.
+2. Throughput: N concurrent sessions each send --requests uncached
+   completions using the prompts captured in step 1.
+
+Uses the runs in run_log.db of the working directory, so run it from the
+repository root with some data logged. Nothing is sent to OpenAI and the
+real response cache is left untouched.
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd  # noqa: E402
+
+from benchmarks.openai_standin import serve_in_background  # noqa: E402
+from utils import ai_helpers  # noqa: E402
+
+
+PAGE = os.path.join(ROOT, "pages", "ai_coach.py")
+
+# AI Coach analysis buttons, in tab order
+TAB_BUTTONS = {
+    "btn_last_run": "Last run",
+    "btn_week": "Weekly summary",
+    "btn_wg": "Workout generator",
+    "btn_7day": "7-day planner",
+    "btn_race": "Race simulator",
+    "btn_injury": "Injury risk",
+    "btn_pr": "PR progress",
+    "btn_tb": "Training block",
+    "btn_all": "Generate all (batch)",
+}
+
+# Section (coach_tab radio) each button lives in; btn_all is always shown
+BUTTON_SECTIONS = {
+    "btn_last_run": "📅 Daily + Weekly",
+    "btn_week": "📅 Daily + Weekly",
+    "btn_wg": "⚡ Workout Generator",
+    "btn_7day": "🗓️ 7-Day Planner",
+    "btn_race": "🏁 Race Simulator",
+    "btn_injury": "🩻 Injury Risk",
+    "btn_pr": "🎖️ PR Milestones",
+    "btn_tb": "📦 Training Block",
+}
+
+PROMPT_RE = re.compile(r"📝 Prompt: (\d+) chars \(~(\d+) tokens\)")
+TTFT_RE = re.compile(r"Time to first token: ([\d.]+)s")
+
+
+def _isolate_cache(directory, name="ai_cache"):
+    """Points the AI response cache at an empty scratch file and empties memory."""
+    ai_helpers.CACHE_PATH = os.path.join(directory, f"{name}.db")
+    ai_helpers._cache_ready = False
+    with ai_helpers._cache_lock:
+        ai_helpers._memory_cache.clear()
+
+
+def _percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+# -------------------------------------------------------------------
+# Tab latency (end-to-end through Streamlit)
+# -------------------------------------------------------------------
+def _click(button_key):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(PAGE, default_timeout=120)
+    at.run()
+    if button_key in BUTTON_SECTIONS and at.radio(key="coach_tab") is not None:
+        at.radio(key="coach_tab").set_value(BUTTON_SECTIONS[button_key]).run()
+    if not any(b.key == button_key for b in at.button):
+        return None
+
+    started = time.perf_counter()
+    at.button(key=button_key).click().run()
+    elapsed = time.perf_counter() - started
+
+    debug = at.session_state["debug_info"] if "debug_info" in at.session_state else ""
+    prompts = PROMPT_RE.findall(debug)
+    ttft = TTFT_RE.search(debug)
+    return {
+        "seconds": elapsed,
+        "ttft": float(ttft.group(1)) if ttft else None,
+        "prompt_chars": sum(int(c) for c, _ in prompts),
+        "prompt_tokens": sum(int(t) for _, t in prompts),
+        "errors": [e.value for e in at.exception],
+    }
+
+
+def bench_tabs(buttons, scratch):
+    rows = []
+    for key in buttons:
+        # Fresh cache per button so "cold" never benefits from an earlier tab
+        _isolate_cache(scratch, key)
+        cold = _click(key)
+        if cold is None:
+            print(f"  skipped {key}: button not rendered (no runs logged?)")
+            continue
+        warm = _click(key)
+        rows.append({
+            "tab": TAB_BUTTONS.get(key, key),
+            "cold_s": round(cold["seconds"], 3),
+            "ttft_s": round(cold["ttft"], 3) if cold["ttft"] is not None else None,
+            "warm_s": round(warm["seconds"], 3),
+            "prompt_chars": cold["prompt_chars"],
+            "prompt_tokens": cold["prompt_tokens"],
+            "errors": "; ".join(cold["errors"] + warm["errors"]),
+        })
+    return pd.DataFrame(rows)
+
+
+# -------------------------------------------------------------------
+# Throughput under concurrent sessions
+# -------------------------------------------------------------------
+def bench_throughput(prompts, sessions, requests_per_session, api_key):
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+    endpoint = ai_helpers.get_endpoint()
+
+    def session(index):
+        for i in range(requests_per_session):
+            prompt = prompts[(index + i) % len(prompts)]
+            started = time.perf_counter()
+            text = ai_helpers.complete(prompt, api_key, [], use_cache=False, endpoint=endpoint)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if text.startswith("❌"):
+                    failures[0] += 1
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    return {
+        "sessions": sessions,
+        "requests": len(latencies),
+        "failed": failures[0],
+        "wall_s": round(wall, 3),
+        "req_per_s": round(len(latencies) / wall, 2) if wall else None,
+        "p50_s": round(statistics.median(latencies), 3) if latencies else None,
+        "p95_s": round(_percentile(latencies, 95), 3),
+        "max_s": round(max(latencies), 3) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent sessions")
+    parser.add_argument("--requests", type=int, default=5, help="requests per session")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tabs", nargs="*", default=list(TAB_BUTTONS), help="button keys to time")
+    parser.add_argument("--skip-tabs", action="store_true", help="only run the throughput test")
+    args = parser.parse_args()
+
+    server = serve_in_background(
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        retry_after=0 if args.error_rate else None,
+    )
+    api_key = "standin"
+    ai_helpers.configure_ai(base_url=server.base_url, key_provider=lambda: api_key)
+    print(f"Stand-in at {server.base_url} · latency {args.latency}s · "
+          f"{args.tokens_per_sec:g} tok/s · {args.reply_tokens} tokens · "
+          f"error rate {args.error_rate:g}")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        _isolate_cache(scratch)
+
+        if not args.skip_tabs:
+            print("\n== AI Coach tab latency (cold = API call, warm = cached) ==")
+            tabs = bench_tabs(args.tabs, scratch)
+            print(tabs.to_string(index=False) if not tabs.empty else "  no tabs measured")
+
+        prompts = list(dict.fromkeys(server.prompts)) or ["Summarize my last week of running."]
+        print(f"\n== Throughput ({len(prompts)} distinct prompts, uncached) ==")
+        result = bench_throughput(prompts, args.sessions, args.requests, api_key)
+        print(pd.DataFrame([result]).to_string(index=False))
+
+        print(f"\nStand-in served {server.stats['requests']} requests "
+              f"({server.stats['errors']} injected errors, "
+              f"{server.stats['prompt_chars']:,} prompt chars)")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
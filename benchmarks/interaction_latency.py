@@ -0,0 +1,187 @@
+"""
+Interaction-to-render benchmark for the fragment-scoped pages.
+
+    python benchmarks/interaction_latency.py --repeat 5
+
+For each page interaction (AI Coach lookback slider, feed filter, calendar
+month, dashboard volume granularity) the time from widget change to
+finished render is measured twice:
+
+- full: the interaction reruns the whole script (what every interaction
+  cost before the pages were split into st.fragment units)
+- fragment: the interaction reruns only the fragment containing the widget,
+  the way the browser requests it
+
+Streamlit's AppTest always reruns the whole script, so this drives it with
+a script runner that keeps fragment storage between runs and sends the
+widget's fragment id, like a real browser session. Uses run_log.db of the
+working directory; run from the repository root with some data logged.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd  # noqa: E402
+from streamlit.runtime.fragment import MemoryFragmentStorage  # noqa: E402
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+from streamlit.testing.v1 import app_test as app_test_module  # noqa: E402
+from streamlit.testing.v1.local_script_runner import (  # noqa: E402
+    LocalScriptRunner,
+    require_widgets_deltas,
+)
+from streamlit.testing.v1.element_tree import parse_tree_from_messages  # noqa: E402
+
+
+# -------------------------------------------------------------------
+# Fragment-aware script runner
+# -------------------------------------------------------------------
+class _FragmentSession:
+    """Per-benchmark state shared by successive runner instances."""
+
+    def __init__(self):
+        self.storage = MemoryFragmentStorage()
+        self.widget_fragments = {}   # widget id → fragment id
+        self.fragment_queue = []     # fragment ids for the next run
+
+
+_session = None
+
+
+class FragmentAwareRunner(LocalScriptRunner):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if _session is not None:
+            self._fragment_storage = _session.storage
+
+    def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+        queue = list(_session.fragment_queue) if _session is not None else []
+        rerun_data = RerunData(
+            widget_states=widget_state,
+            page_script_hash=page_hash,
+            fragment_id_queue=queue,
+            is_fragment_scoped_rerun=bool(queue),
+        )
+        self.request_rerun(rerun_data)
+        if not self._script_thread:
+            self.start()
+        require_widgets_deltas(self, timeout)
+
+        messages = self.forward_msgs()
+        if _session is not None:
+            _session.fragment_queue = []
+            _record_widget_fragments(messages, _session.widget_fragments)
+        return parse_tree_from_messages(messages)
+
+
+def _record_widget_fragments(messages, mapping):
+    for msg in messages:
+        if msg.WhichOneof("type") != "delta" or not msg.delta.fragment_id:
+            continue
+        element = msg.delta.new_element
+        kind = element.WhichOneof("type")
+        widget_id = getattr(getattr(element, kind), "id", None) if kind else None
+        if widget_id:
+            mapping[widget_id] = msg.delta.fragment_id
+
+
+# -------------------------------------------------------------------
+# Interactions
+# -------------------------------------------------------------------
+def _coach_setup(at):
+    at.radio(key="coach_tab").set_value("🩻 Injury Risk").run()
+
+
+INTERACTIONS = [
+    {
+        "name": "AI Coach · lookback slider",
+        "page": "pages/ai_coach.py",
+        "setup": _coach_setup,
+        "widget": lambda at: at.slider(key="injury_lookback"),
+        "values": [28, 14],
+    },
+    {
+        "name": "Feed · min distance filter",
+        "page": "pages/feed.py",
+        "widget": lambda at: at.number_input(key="feed_min_distance"),
+        "values": [3.0, 5.0],
+    },
+    {
+        "name": "Calendar · month",
+        "page": "pages/calendar.py",
+        "widget": lambda at: at.number_input(key="cal_month"),
+        "values": [3, 9],
+    },
+    {
+        "name": "Dashboard · volume granularity",
+        "page": "pages/dashboard.py",
+        "widget": lambda at: at.radio(key="dash_volume_granularity"),
+        "values": ["month", "year"],
+    },
+]
+
+
+def _measure(interaction, value, scoped):
+    global _session
+    _session = _FragmentSession()
+
+    at = AppTest.from_file(os.path.join(ROOT, interaction["page"]), default_timeout=120)
+    at.run()
+    if interaction.get("setup"):
+        interaction["setup"](at)
+
+    widget = interaction["widget"](at)
+    widget.set_value(value)
+    if scoped:
+        fragment_id = _session.widget_fragments.get(widget.id)
+        if fragment_id is None:
+            raise RuntimeError(f"{interaction['name']}: widget is not inside a fragment")
+        _session.fragment_queue = [fragment_id]
+
+    started = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - started
+
+    errors = [e.value for e in at.exception]
+    if errors:
+        raise RuntimeError(f"{interaction['name']}: {errors[0]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="measurements per mode")
+    args = parser.parse_args()
+
+    app_test_module.LocalScriptRunner = FragmentAwareRunner
+
+    rows = []
+    for interaction in INTERACTIONS:
+        timings = {"full": [], "fragment": []}
+        for i in range(args.repeat):
+            value = interaction["values"][i % len(interaction["values"])]
+            for mode in timings:
+                timings[mode].append(_measure(interaction, value, scoped=(mode == "fragment")))
+
+        full = statistics.median(timings["full"]) * 1000
+        fragment = statistics.median(timings["fragment"]) * 1000
+        rows.append({
+            "interaction": interaction["name"],
+            "full_ms": round(full, 1),
+            "fragment_ms": round(fragment, 1),
+            "speedup": f"{full / fragment:.1f}x" if fragment else "n/a",
+        })
+        print(f"  measured {interaction['name']}")
+
+    print("\n== Interaction → render (median of "
+          f"{args.repeat}; includes AppTest parse overhead) ==")
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Answers POST /v1/chat/completions (plain JSON or `stream: true` SSE) with
+a canned coaching reply, after a configurable latency, at a configurable
+token rate, with optional error injection. Point the app at it with
+
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=local streamlit run app.py
+
+or from Python via utils.ai_helpers.configure_ai(base_url=...).
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_PORT = 8765
+
+WORDS = (
+    "Keep easy days easy and let the long run build slowly. Your heart rate "
+    "drift suggests aerobic fitness is improving; hold cadence near 170 and "
+    "add strides twice a week. Watch the shins after hills and back off if "
+    "pain lingers into the next morning."
+).split()
+
+DEFAULTS = {
+    "latency": 0.3,          # seconds before the first byte
+    "tokens_per_sec": 60.0,  # streaming / generation rate; 0 = instant
+    "reply_tokens": 120,
+    "error_rate": 0.0,       # fraction of requests answered with error_status
+    "error_status": 503,
+    "retry_after": None,     # seconds, sent with injected 429/503s
+}
+
+
+def _reply_tokens(n):
+    return [(WORDS[i % len(WORDS)] + " ") for i in range(n)]
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "OpenAIStandin/1.0"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        cfg = self.server.config
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._json(400, {"error": {"message": "invalid JSON"}})
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._json(401, {"error": {"message": "missing bearer token"}})
+
+        self.server.record(body)
+        time.sleep(cfg["latency"])
+
+        if cfg["error_rate"] and random.random() < cfg["error_rate"]:
+            self.server.count("errors")
+            headers = {}
+            if cfg["retry_after"] is not None:
+                headers["Retry-After"] = str(cfg["retry_after"])
+            return self._json(
+                cfg["error_status"],
+                {"error": {"message": "injected failure", "type": "standin"}},
+                headers,
+            )
+
+        tokens = _reply_tokens(cfg["reply_tokens"])
+        delay = 1.0 / cfg["tokens_per_sec"] if cfg["tokens_per_sec"] else 0.0
+
+        if body.get("stream"):
+            self._stream(tokens, delay, body.get("model", ""))
+        else:
+            time.sleep(delay * len(tokens))
+            self._json(200, {
+                "object": "chat.completion",
+                "model": body.get("model", ""),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"completion_tokens": len(tokens)},
+            })
+
+    def _json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, tokens, delay, model):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        for token in tokens:
+            if delay:
+                time.sleep(delay)
+            send(json.dumps({
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}}],
+            }))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, StandinHandler)
+        self.config = config
+        self.stats = {"requests": 0, "errors": 0, "prompt_chars": 0}
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients dropping idle keep-alive connections is normal here
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def record(self, body):
+        prompt = "".join(
+            m.get("content", "") for m in body.get("messages", []) if m.get("role") == "user"
+        )
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_chars"] += len(prompt)
+            self.prompts.append(prompt)
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, **config) -> StandinServer:
+    unknown = set(config) - set(DEFAULTS)
+    if unknown:
+        raise TypeError(f"unknown stand-in options: {sorted(unknown)}")
+    return StandinServer((host, port), {**DEFAULTS, **config})
+
+
+def serve_in_background(host="127.0.0.1", port=0, **config) -> StandinServer:
+    """Starts a stand-in on a daemon thread (port 0 = any free port)."""
+    server = make_server(host, port, **config)
+    threading.Thread(target=server.serve_forever, name="openai-standin", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=DEFAULTS["latency"])
+    parser.add_argument("--tokens-per-sec", type=float, default=DEFAULTS["tokens_per_sec"])
+    parser.add_argument("--reply-tokens", type=int, default=DEFAULTS["reply_tokens"])
+    parser.add_argument("--error-rate", type=float, default=DEFAULTS["error_rate"])
+    parser.add_argument("--error-status", type=int, default=DEFAULTS["error_status"])
+    parser.add_argument("--retry-after", type=float, default=DEFAULTS["retry_after"])
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host,
+        args.port,
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+    )
+    print(f"OpenAI stand-in listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,263 +3,369 @@ from utils.styling import inject_css
 inject_css()
 
 import pandas as pd
+import time
 from datetime import datetime, timedelta
+from functools import cached_property
 from streamlit_lottie import st_lottie
-import requests
 
-from utils.database import fetch_runs
-from utils.metrics import prepare_metrics_df
+from utils.efficiency import efficiency_summary, load_efficiency
+from utils.metrics import load_metrics, load_runs
 from utils.prs import calculate_prs
-from utils.ai_helpers import call_ai, get_debug_info
+from utils.ai_helpers import call_ai_batch, call_ai_stream, get_debug_info, last_stream_failed
+from utils.ai_context import build_training_context, format_run
+from utils.remote_assets import load_json_asset
+
+
+HEADER_LOTTIE_URL = "https://assets5.lottiefiles.com/packages/lf20_tk1bdz9z.json"
 
 
 # ------------------------------------------------------
-# Load Lottie Animation
+# Load Lottie Animation — served from memory / disk / bundled
+# copy; never waits on lottiefiles.com during a rerun
 # ------------------------------------------------------
 def load_lottie(url: str):
-    try:
-        return requests.get(url).json()
-    except:
-        return None
+    return load_json_asset(url, fallback="coach_header_lottie.json")
 
 
 # ------------------------------------------------------
-# Efficiency Score (Safe version)
+# Prompt builders (shared by the tabs and "Generate All")
 # ------------------------------------------------------
-def compute_efficiency_score(metrics: pd.DataFrame) -> pd.DataFrame:
-    if metrics.empty:
-        metrics["efficiency_score"] = None
-        return metrics
-
-    m = metrics.copy()
-    m["efficiency_score"] = None
-
-    if "duration_seconds" not in m.columns:
-        m["duration_seconds"] = None
-    if "avg_hr" not in m.columns:
-        m["avg_hr"] = None
-
-    mask = (
-        m["distance"].notna()
-        & (m["distance"] > 0)
-        & m["duration_seconds"].notna()
-        & (m["duration_seconds"] > 0)
-        & m["avg_hr"].notna()
-        & (m["avg_hr"] > 0)
+def last_run_prompt(latest: dict, metrics: pd.DataFrame) -> str:
+    context = build_training_context(
+        metrics,
+        sections=("load", "weekly"),
+        weeks=4,
+        max_tokens=400,
     )
+    return f"""
+Analyze this run:
+{format_run(latest)}
 
-    try:
-        m.loc[mask, "efficiency_score"] = (
-            m.loc[mask, "distance"]
-            / (m.loc[mask, "duration_seconds"] / 60.0)
-            / m.loc[mask, "avg_hr"]
-            * 1000.0
-        )
-    except:
-        pass
+Context:
+{context}
+
+Return:
+- pacing overview
+- HR interpretation
+- biomechanics or form observations
+- fatigue / recovery indicators
+- injury risk
+- 3–5 concise next steps
+"""
+
+
+def weekly_prompt(metrics: pd.DataFrame) -> str:
+    context = build_training_context(
+        metrics,
+        sections=("recent", "load", "weekly"),
+        weeks=4,
+        recent_limit=14,
+        recent_since=datetime.today() - timedelta(days=7),
+    )
+    return f"""
+Weekly summary for the last 7 days.
+
+{context}
+"""
+
+
+def workout_prompt(metrics: pd.DataFrame, focus, terrain, time_avail) -> str:
+    context = build_training_context(
+        metrics,
+        sections=("load", "recent", "key_workouts"),
+        max_tokens=800,
+    )
+    return f"""
+Create a structured workout.
+
+Focus: {focus}
+Terrain: {terrain}
+Time available: {time_avail}
 
-    return m
+Recent training:
+{context}
+"""
+
+
+def injury_prompt(metrics: pd.DataFrame, lookback: int) -> str:
+    context = build_training_context(
+        metrics,
+        sections=("recent", "load", "weekly"),
+        weeks=max(1, lookback // 7),
+        recent_limit=42,
+        recent_since=datetime.today() - timedelta(days=lookback),
+        max_tokens=1500,
+    )
+    return f"""
+Evaluate my injury risk with focus on shin splints.
+Lookback: {lookback} days
+
+Runs:
+{context}
+"""
+
+
+def pr_prompt(metrics: pd.DataFrame, prs: dict) -> str:
+    context = build_training_context(
+        metrics,
+        prs,
+        sections=("prs", "key_workouts", "weekly"),
+        weeks=12,
+    )
+    return f"""
+Analyze my PR progression and improvement trends.
+
+Metrics:
+{context}
+"""
 
 
 # ------------------------------------------------------
-# MAIN AI COACH PAGE
+# Insight display — results persist in session state so
+# reruns and tab switches don't lose them
 # ------------------------------------------------------
-def render_ai_coach_page():
-    st.title("🤖 AI Coach")
-    st.caption("Your personalized running insights powered by data + AI.")
-
-    # Lottie animation header
-    lottie = load_lottie("https://assets5.lottiefiles.com/packages/lf20_tk1bdz9z.json")
-    if lottie:
-        st_lottie(lottie, height=180, key="lottie_header")
+def _store_insight(name: str, text: str):
+    st.session_state.setdefault("ai_insights", {})[name] = {
+        "text": text,
+        "at": datetime.now().strftime("%H:%M"),
+    }
+
+
+def render_insight(name, title, button_label, button_key, build_prompt):
+    """Button streams a fresh answer; otherwise the last stored one is shown."""
+    if st.button(button_label, key=button_key):
+        with st.expander(title, expanded=True):
+            text = st.write_stream(call_ai_stream(build_prompt()))
+        # A failed or cut-off reply is shown but not kept as the insight
+        if not last_stream_failed():
+            _store_insight(name, text if isinstance(text, str) else "".join(map(str, text)))
+        return
 
-    df = fetch_runs()
-    if df.empty:
-        st.info("Log your first run to unlock AI analysis.")
+    stored = st.session_state.get("ai_insights", {}).get(name)
+    if stored:
+        with st.expander(title, expanded=True):
+            st.markdown(stored["text"])
+            st.caption(f"Generated at {stored['at']}")
+
+
+def generate_all_insights(latest, metrics, prs):
+    """Runs the daily, weekly, workout, injury and PR analyses concurrently."""
+    state = st.session_state
+    prompts = {
+        "last_run": last_run_prompt(latest, metrics),
+        "week": weekly_prompt(metrics),
+        "workout": workout_prompt(
+            metrics,
+            state.get("wg_focus", WIDGET_DEFAULTS["wg_focus"]),
+            state.get("wg_terrain", WIDGET_DEFAULTS["wg_terrain"]),
+            state.get("wg_time", WIDGET_DEFAULTS["wg_time"]),
+        ),
+        "injury": injury_prompt(metrics, state.get("injury_lookback", WIDGET_DEFAULTS["injury_lookback"])),
+        "pr": pr_prompt(metrics, prs),
+    }
+
+    started = time.perf_counter()
+    with st.spinner("Generating all insights in parallel…"):
+        results = call_ai_batch(prompts)
+
+    failed = {name: text for name, text in results.items() if text.startswith("❌")}
+    for name, text in results.items():
+        if name not in failed:
+            _store_insight(name, text)
+
+    if failed:
+        st.error(next(iter(failed.values())))
         return
 
-    metrics = prepare_metrics_df(df)
-    metrics = compute_efficiency_score(metrics)
+    st.success(
+        f"Generated {len(results)} insights in {time.perf_counter() - started:.1f}s — "
+        "open any tab to read them."
+    )
 
-    recent = df.tail(30)
-    latest = df.iloc[-1].to_dict()
 
-    race_goal = st.session_state.get("race_goal", "Pittsburgh Half – Sub 1:40")
-    race_date_str = st.session_state.get("race_date_str", "2026-05-03")
-    try:
-        race_date = datetime.fromisoformat(race_date_str).date()
-    except:
-        race_date = datetime.today().date()
+# ------------------------------------------------------
+# Lazy, memoized page data — each property is computed the
+# first time a tab (or button) asks for it, at most once per rerun
+# ------------------------------------------------------
+class CoachData:
+    @cached_property
+    def runs(self) -> pd.DataFrame:
+        return load_runs()
+
+    @cached_property
+    def metrics(self) -> pd.DataFrame:
+        return load_metrics()
+
+    @cached_property
+    def latest(self) -> dict:
+        return self.runs.iloc[-1].to_dict()
+
+    @cached_property
+    def prs(self) -> dict:
+        return calculate_prs(self.metrics)
+
+    @cached_property
+    def efficiency(self) -> dict:
+        return efficiency_summary(load_efficiency())
+
+    @cached_property
+    def last_7_days(self) -> pd.DataFrame:
+        m = self.metrics
+        return m[m["date_dt"] >= datetime.today() - timedelta(days=7)]
+
+    @cached_property
+    def race_goal(self) -> str:
+        return st.session_state.get("race_goal", "Pittsburgh Half – Sub 1:40")
+
+    @cached_property
+    def race_date(self):
+        race_date_str = st.session_state.get("race_date_str", "2026-05-03")
+        try:
+            return datetime.fromisoformat(race_date_str).date()
+        except:
+            return datetime.today().date()
+
+
+# Initial values of the tab widgets. They are seeded into session state
+# once, and the widgets take no value= / index= / default= of their own
+# (Streamlit warns when a widget has both).
+WIDGET_DEFAULTS = {
+    "wg_focus": "Balanced",
+    "wg_terrain": "Road",
+    "wg_time": 60,
+    "planner_days_week": 5,
+    "planner_training": ["Mon", "Tue", "Thu", "Sat", "Sun"],
+    "planner_hard": ["Tue", "Thu"],
+    "planner_rest": ["Fri"],
+    "planner_long": "Sun",
+    "race_type": "Half Marathon",
+    "race_strategy": "Conservative",
+    "injury_lookback": 21,
+    "tb_race": "Half Marathon",
+    "tb_goal_mode": "Finish",
+    "tb_goal_time": "",
+    "tb_weeks": 12,
+    "tb_taper": "1 week",
+    "tb_days": ["Mon", "Tue", "Thu", "Sat", "Sun"],
+    "tb_hard": ["Tue", "Thu"],
+    "tb_rest": ["Fri"],
+    "tb_long": "Sun",
+}
+
+
+def _persist_widget_state():
+    # Re-assigning every rerun keeps the values of hidden tabs' widgets,
+    # which Streamlit would otherwise drop
+    for key, default in WIDGET_DEFAULTS.items():
+        value = st.session_state.get(key, default)
+        st.session_state[key] = list(value) if isinstance(value, list) else value
+
+
+# ======================================================
+# TAB 1 — DAILY + WEEKLY
+# ======================================================
+def render_daily_weekly_tab(data: CoachData):
+    latest = data.latest
+    efficiency = data.efficiency
+
+    st.markdown('<div class="section-header">🏃 Last Run Analysis</div>', unsafe_allow_html=True)
+    st.markdown('<div class="card">', unsafe_allow_html=True)
 
-    prs_all = calculate_prs(metrics)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write(f"**Date:** {latest.get('date')}")
+        st.write(f"**Type:** {latest.get('run_type')}")
+        st.write(f"**Distance:** {latest.get('distance')} mi")
+
+    with col2:
+        st.write(f"**Duration:** {latest.get('duration')}")
+        st.write(f"**Avg Pace:** {latest.get('avg_pace')}")
+        st.write(f"**Avg HR:** {latest.get('avg_hr') or '—'} bpm")
+        if efficiency and str(efficiency["last_date"].date()) == str(latest.get("date"))[:10]:
+            st.write(
+                f"**Efficiency:** {efficiency['last_score']:.2f} "
+                f"({efficiency['last_pct']:.0f}th percentile of {efficiency['last_type']} runs)"
+            )
+
+    render_insight(
+        "last_run",
+        "📘 AI Insights",
+        "🔍 Analyze Last Run",
+        "btn_last_run",
+        lambda: last_run_prompt(latest, data.metrics),
+    )
 
-    # ------------------------------------------------------
-    # Highlight Stats
-    # ------------------------------------------------------
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    # Weekly Summary
+    st.markdown('<div class="section-header">📅 Weekly Summary</div>', unsafe_allow_html=True)
     st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.subheader("📊 Training Snapshot (Last 7 Days)")
 
-    colA, colB, colC = st.columns(3)
-    colA.metric("Last Run", f"{latest.get('distance')} mi", latest.get("duration"))
-    colB.metric("Mileage (7d)", f"{df.tail(7)['distance'].sum():.1f} mi")
-    colC.metric("VO2 Max", latest.get("vo2max", "—"))
+    last7 = data.last_7_days
+
+    if not last7.empty:
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Mileage", f"{last7['distance'].sum():.1f} mi")
+        c2.metric("Runs", len(last7))
+        if "effort" in last7:
+            c3.metric("Avg Effort", f"{last7['effort'].mean():.1f}/10")
+
+    render_insight(
+        "week",
+        "📘 Weekly Insights",
+        "📊 Analyze Week",
+        "btn_week",
+        lambda: weekly_prompt(data.metrics),
+    )
 
-    st.markdown("</div>", unsafe_allow_html=True)
-    st.write("")
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    # ------------------------------------------------------
-    # Tabs with fade-in content
-    # ------------------------------------------------------
-    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
-        "📅 Daily + Weekly",
-        "⚡ Workout Generator",
-        "🗓️ 7-Day Planner",
-        "🏁 Race Simulator",
-        "🩻 Injury Risk",
-        "🎖️ PR Milestones",
-        "📦 Training Block",
-    ])
-
-    # ======================================================
-    # TAB 1 — DAILY + WEEKLY
-    # ======================================================
-    with tab1:
-        st.markdown('<div class="tab-content">', unsafe_allow_html=True)
-
-        st.markdown('<div class="section-header">🏃 Last Run Analysis</div>', unsafe_allow_html=True)
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-
-        col1, col2 = st.columns(2)
-        with col1:
-            st.write(f"**Date:** {latest.get('date')}")
-            st.write(f"**Type:** {latest.get('run_type')}")
-            st.write(f"**Distance:** {latest.get('distance')} mi")
-
-        with col2:
-            st.write(f"**Duration:** {latest.get('duration')}")
-            st.write(f"**Avg Pace:** {latest.get('avg_pace')}")
-            st.write(f"**Avg HR:** {latest.get('avg_hr') or '—'} bpm")
-
-        if st.button("🔍 Analyze Last Run", key="btn_last_run"):
-            with st.spinner("Analyzing your run…"):
-                result = call_ai(f"""
-Analyze this run:
-{latest}
 
-Return:
-- pacing overview
-- HR interpretation
-- biomechanics or form observations
-- fatigue / recovery indicators
-- injury risk
-- 3–5 concise next steps
-""")
-
-            with st.expander("📘 AI Insights", expanded=True):
-                st.markdown(
-                    f"""
-                    <div style='padding:18px;background:rgba(255,255,255,0.04);
-                    border-left:4px solid #4a90e2;border-radius:10px;line-height:1.6;'>
-                    {result}
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-
-        st.markdown('</div>', unsafe_allow_html=True)
-
-        # Weekly Summary
-        st.markdown('<div class="section-header">📅 Weekly Summary</div>', unsafe_allow_html=True)
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-
-        week_mask = pd.to_datetime(df["date"]) >= (datetime.today() - timedelta(days=7))
-        last7 = df[week_mask]
-
-        if not last7.empty:
-            c1, c2, c3 = st.columns(3)
-            c1.metric("Mileage", f"{last7['distance'].sum():.1f} mi")
-            c2.metric("Runs", len(last7))
-            if "effort" in last7:
-                c3.metric("Avg Effort", f"{last7['effort'].mean():.1f}/10")
-
-        if st.button("📊 Analyze Week", key="btn_week"):
-            with st.spinner("Generating weekly insights…"):
-                result = call_ai(f"Weekly summary for: {last7.to_dict('records')}")
-
-            with st.expander("📘 Weekly Insights", expanded=True):
-                st.markdown(
-                    f"""
-                    <div style='padding:18px;background:rgba(255,255,255,0.04);
-                    border-left:4px solid #4a90e2;border-radius:10px;line-height:1.6;'>
-                    {result}
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-
-        st.markdown('</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    # ======================================================
-    # TAB 2 — WORKOUT GENERATOR
-    # ======================================================
-    with tab2:
-        st.markdown('<div class="tab-content">', unsafe_allow_html=True)
-
-        st.markdown('<div class="section-header">⚡ Generate Tomorrow\'s Workout</div>', unsafe_allow_html=True)
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-
-        focus = st.selectbox("Primary Focus", ["Balanced","Speed","Endurance","Tempo","Recovery"], key="wg_focus")
-        terrain = st.selectbox("Terrain", ["Road","Trail","Treadmill","Hilly"], key="wg_terrain")
-        time_avail = st.slider("Available Time (minutes)", 20, 150, 60, key="wg_time")
-
-        if st.button("⚡ Generate Workout", key="btn_wg"):
-            with st.spinner("Designing workout…"):
-                result = call_ai(f"""
-Create a structured workout.
+# ======================================================
+# TAB 2 — WORKOUT GENERATOR
+# ======================================================
+def render_workout_tab(data: CoachData):
+    st.markdown('<div class="section-header">⚡ Generate Tomorrow\'s Workout</div>', unsafe_allow_html=True)
+    st.markdown('<div class="card">', unsafe_allow_html=True)
 
-Focus: {focus}
-Terrain: {terrain}
-Time available: {time_avail}
+    focus = st.selectbox("Primary Focus", ["Balanced","Speed","Endurance","Tempo","Recovery"], key="wg_focus")
+    terrain = st.selectbox("Terrain", ["Road","Trail","Treadmill","Hilly"], key="wg_terrain")
+    time_avail = st.slider("Available Time (minutes)", 20, 150, key="wg_time")
 
-Recent training:
-{recent.to_dict('records')}
-""")
-
-            with st.expander("🏋️ Workout Plan", expanded=True):
-                st.markdown(
-                    f"""
-                    <div style='padding:18px;background:rgba(255,255,255,0.04);
-                    border-left:4px solid #f39c12;border-radius:10px;line-height:1.6;'>
-                    {result}
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-
-        st.markdown('</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    # ======================================================
-    # TAB 3 — 7-DAY PLANNER
-    # ======================================================
-    with tab3:
-        st.markdown('<div class="tab-content">', unsafe_allow_html=True)
-
-        st.markdown('<div class="section-header">🗓️ Plan Your Next 7 Days</div>', unsafe_allow_html=True)
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-
-        days = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
-
-        days_week = st.slider("Days per Week", 2, 7, 5, key="planner_days_week")
-        training_days = st.multiselect("Training Days", days, default=["Mon","Tue","Thu","Sat","Sun"], key="planner_training")
-        hard_days = st.multiselect("Hard Days", days, default=["Tue","Thu"], key="planner_hard")
-        rest_days = st.multiselect("Rest Days", days, default=["Fri"], key="planner_rest")
-        long_day = st.selectbox("Long Run Day", days, index=6, key="planner_long")
-
-        if st.button("🗓️ Generate Weekly Plan", key="btn_7day"):
-            with st.spinner("Creating your training week…"):
-                result = call_ai(f"""
+    render_insight(
+        "workout",
+        "🏋️ Workout Plan",
+        "⚡ Generate Workout",
+        "btn_wg",
+        lambda: workout_prompt(data.metrics, focus, terrain, time_avail),
+    )
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+# ======================================================
+# TAB 3 — 7-DAY PLANNER
+# ======================================================
+def render_planner_tab(data: CoachData):
+    st.markdown('<div class="section-header">🗓️ Plan Your Next 7 Days</div>', unsafe_allow_html=True)
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+
+    days = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
+
+    days_week = st.slider("Days per Week", 2, 7, key="planner_days_week")
+    training_days = st.multiselect("Training Days", days, key="planner_training")
+    hard_days = st.multiselect("Hard Days", days, key="planner_hard")
+    rest_days = st.multiselect("Rest Days", days, key="planner_rest")
+    long_day = st.selectbox("Long Run Day", days, key="planner_long")
+
+    if st.button("🗓️ Generate Weekly Plan", key="btn_7day"):
+        context = build_training_context(
+            data.metrics,
+            sections=("load", "weekly", "recent"),
+            weeks=4,
+            max_tokens=800,
+        )
+        prompt = f"""
 Generate a 7-day plan.
 
 Training days: {training_days}
@@ -268,163 +374,120 @@ Rest days: {rest_days}
 Long run: {long_day}
 
 Recent training:
-{recent.to_dict('records')}
-""")
-
-            with st.expander("📅 Weekly Plan", expanded=True):
-                st.markdown(
-                    f"""
-                    <div style='padding:18px;background:rgba(255,255,255,0.04);
-                    border-left:4px solid #2ecc71;border-radius:10px;line-height:1.6;'>
-                    {result}
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-
-        st.markdown('</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    # ======================================================
-    # TAB 4 — RACE SIMULATOR
-    # ======================================================
-    with tab4:
-        st.markdown('<div class="tab-content">', unsafe_allow_html=True)
-
-        st.markdown('<div class="section-header">🏁 Race Simulation</div>', unsafe_allow_html=True)
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-
-        race_type = st.selectbox("Race", ["5K","10K","Half Marathon","Marathon"], index=2, key="race_type")
-        strategy = st.selectbox("Strategy", ["Conservative","Even","Negative Split","Aggressive"], key="race_strategy")
-
-        if st.button("🏁 Simulate Race", key="btn_race"):
-            with st.spinner("Simulating race…"):
-                result = call_ai(f"""
+{context}
+"""
+
+        with st.expander("📅 Weekly Plan", expanded=True):
+            st.write_stream(call_ai_stream(prompt))
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+# ======================================================
+# TAB 4 — RACE SIMULATOR
+# ======================================================
+def render_race_tab(data: CoachData):
+    st.markdown('<div class="section-header">🏁 Race Simulation</div>', unsafe_allow_html=True)
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+
+    race_type = st.selectbox("Race", ["5K","10K","Half Marathon","Marathon"], key="race_type")
+    strategy = st.selectbox("Strategy", ["Conservative","Even","Negative Split","Aggressive"], key="race_strategy")
+
+    if st.button("🏁 Simulate Race", key="btn_race"):
+        context = build_training_context(
+            data.metrics,
+            data.prs,
+            weeks=12,
+            max_tokens=1500,
+        )
+        prompt = f"""
 Simulate my {race_type} with:
 Strategy: {strategy}
-Goal: {race_goal}
-Race date: {race_date}
-
-Using my entire training history:
-{df.to_dict('records')}
-""")
-
-            with st.expander("🏁 Race Simulation Results", expanded=True):
-                st.markdown(
-                    f"""
-                    <div style='padding:18px;background:rgba(255,255,255,0.04);
-                    border-left:4px solid #e74c3c;border-radius:10px;line-height:1.6;'>
-                    {result}
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-
-        st.markdown('</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    # ======================================================
-    # TAB 5 — INJURY RISK
-    # ======================================================
-    with tab5:
-        st.markdown('<div class="tab-content">', unsafe_allow_html=True)
-
-        st.markdown('<div class="section-header">🩻 Injury Risk Evaluation</div>', unsafe_allow_html=True)
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-
-        lookback = st.slider("Lookback (days)", 7, 42, 21, key="injury_lookback")
-        window = df[pd.to_datetime(df["date"]) >= (datetime.today() - timedelta(days=lookback))]
-
-        if st.button("🩻 Evaluate Injury Risk", key="btn_injury"):
-            with st.spinner("Analyzing injury risk…"):
-                result = call_ai(f"""
-Evaluate my injury risk with focus on shin splints.
-Lookback: {lookback} days
+Goal: {data.race_goal}
+Race date: {data.race_date}
 
-Runs:
-{window.to_dict('records')}
-""")
-
-            with st.expander("🩻 Injury Insights", expanded=True):
-                st.markdown(
-                    f"""
-                    <div style='padding:18px;background:rgba(255,255,255,0.04);
-                    border-left:4px solid #9b59b6;border-radius:10px;line-height:1.6;'>
-                    {result}
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-
-        st.markdown('</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    # ======================================================
-    # TAB 6 — PR MILESTONES
-    # ======================================================
-    with tab6:
-        st.markdown('<div class="tab-content">', unsafe_allow_html=True)
-
-        st.markdown('<div class="section-header">🎖️ PR Milestones</div>', unsafe_allow_html=True)
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-
-        st.write("Your current PRs:")
-        st.json(prs_all or {})
-
-        if st.button("🎯 Analyze PR Progress", key="btn_pr"):
-            with st.spinner("Analyzing PR progression…"):
-                result = call_ai(f"""
-Analyze my PR progression and improvement trends.
+Using my training history:
+{context}
+"""
 
-Metrics:
-{metrics.to_dict('records')}
-
-PRs:
-{prs_all}
-""")
-
-            with st.expander("🎯 PR Insights", expanded=True):
-                st.markdown(
-                    f"""
-                    <div style='padding:18px;background:rgba(255,255,255,0.04);
-                    border-left:4px solid #3498db;border-radius:10px;line-height:1.6;'>
-                    {result}
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-
-        st.markdown('</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    # ======================================================
-    # TAB 7 — TRAINING BLOCK
-    # ======================================================
-    with tab7:
-        st.markdown('<div class="tab-content">', unsafe_allow_html=True)
-
-        st.markdown('<div class="section-header">📦 Training Block Generator</div>', unsafe_allow_html=True)
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-
-        block_race = st.selectbox("Race Type", [
-            "5K","10K","Half Marathon","Marathon","50K","50 Mile","100K","100 Mile"
-        ], index=2, key="tb_race")
-
-        goal_mode = st.radio("Goal Mode", ["Finish","Specific Time"], key="tb_goal_mode")
-        goal_time = st.text_input("Target Time (HH:MM:SS)", key="tb_goal_time") if goal_mode == "Specific Time" else None
-
-        block_weeks = st.slider("Block Length (weeks)", 4, 28, 12, key="tb_weeks")
-        taper = st.selectbox("Taper Length", ["1 week","10 days","2 weeks","3 weeks"], key="tb_taper")
-
-        days = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
-        train_days = st.multiselect("Training Days", days, default=["Mon","Tue","Thu","Sat","Sun"], key="tb_days")
-        hard_days = st.multiselect("Hard Days", days, default=["Tue","Thu"], key="tb_hard")
-        rest_days = st.multiselect("Rest Days", days, default=["Fri"], key="tb_rest")
-        long_day = st.selectbox("Long Run Day", days, index=6, key="tb_long")
-
-        if st.button("📦 Generate Training Block", key="btn_tb"):
-            with st.spinner("Building your custom training block…"):
-                result = call_ai(f"""
+        with st.expander("🏁 Race Simulation Results", expanded=True):
+            st.write_stream(call_ai_stream(prompt))
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+# ======================================================
+# TAB 5 — INJURY RISK
+# ======================================================
+def render_injury_tab(data: CoachData):
+    st.markdown('<div class="section-header">🩻 Injury Risk Evaluation</div>', unsafe_allow_html=True)
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+
+    lookback = st.slider("Lookback (days)", 7, 42, key="injury_lookback")
+
+    render_insight(
+        "injury",
+        "🩻 Injury Insights",
+        "🩻 Evaluate Injury Risk",
+        "btn_injury",
+        lambda: injury_prompt(data.metrics, lookback),
+    )
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+# ======================================================
+# TAB 6 — PR MILESTONES
+# ======================================================
+def render_pr_tab(data: CoachData):
+    st.markdown('<div class="section-header">🎖️ PR Milestones</div>', unsafe_allow_html=True)
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+
+    st.write("Your current PRs:")
+    st.json(data.prs or {})
+
+    render_insight(
+        "pr",
+        "🎯 PR Insights",
+        "🎯 Analyze PR Progress",
+        "btn_pr",
+        lambda: pr_prompt(data.metrics, data.prs),
+    )
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+# ======================================================
+# TAB 7 — TRAINING BLOCK
+# ======================================================
+def render_training_block_tab(data: CoachData):
+    st.markdown('<div class="section-header">📦 Training Block Generator</div>', unsafe_allow_html=True)
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+
+    block_race = st.selectbox("Race Type", [
+        "5K","10K","Half Marathon","Marathon","50K","50 Mile","100K","100 Mile"
+    ], key="tb_race")
+
+    goal_mode = st.radio("Goal Mode", ["Finish","Specific Time"], key="tb_goal_mode")
+    goal_time = st.text_input("Target Time (HH:MM:SS)", key="tb_goal_time") if goal_mode == "Specific Time" else None
+
+    block_weeks = st.slider("Block Length (weeks)", 4, 28, key="tb_weeks")
+    taper = st.selectbox("Taper Length", ["1 week","10 days","2 weeks","3 weeks"], key="tb_taper")
+
+    days = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
+    train_days = st.multiselect("Training Days", days, key="tb_days")
+    hard_days = st.multiselect("Hard Days", days, key="tb_hard")
+    rest_days = st.multiselect("Rest Days", days, key="tb_rest")
+    long_day = st.selectbox("Long Run Day", days, key="tb_long")
+
+    if st.button("📦 Generate Training Block", key="btn_tb"):
+        context = build_training_context(
+            data.metrics,
+            data.prs,
+            weeks=12,
+            max_tokens=1500,
+        )
+        prompt = f"""
 Build a {block_weeks}-week training block.
 
 Race: {block_race}
@@ -438,25 +501,98 @@ Rest days: {rest_days}
 Long run day: {long_day}
 
 Training history:
-{df.to_dict('records')}
-
-PRs:
-{prs_all}
-""")
-
-            with st.expander("📦 Training Block Plan", expanded=True):
-                st.markdown(
-                    f"""
-                    <div style='padding:18px;background:rgba(255,255,255,0.04);
-                    border-left:4px solid #1abc9c;border-radius:10px;line-height:1.6;'>
-                    {result}
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-
-        st.markdown('</div>', unsafe_allow_html=True)
-        st.markdown('</div>', unsafe_allow_html=True)
+{context}
+"""
+
+        with st.expander("📦 Training Block Plan", expanded=True):
+            st.write_stream(call_ai_stream(prompt))
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+COACH_TABS = {
+    "📅 Daily + Weekly": render_daily_weekly_tab,
+    "⚡ Workout Generator": render_workout_tab,
+    "🗓️ 7-Day Planner": render_planner_tab,
+    "🏁 Race Simulator": render_race_tab,
+    "🩻 Injury Risk": render_injury_tab,
+    "🎖️ PR Milestones": render_pr_tab,
+    "📦 Training Block": render_training_block_tab,
+}
+
+
+# ------------------------------------------------------
+# MAIN AI COACH PAGE
+# ------------------------------------------------------
+def render_ai_coach_page():
+    st.title("🤖 AI Coach")
+    st.caption("Your personalized running insights powered by data + AI.")
+
+    # Lottie animation header
+    lottie = load_lottie(HEADER_LOTTIE_URL)
+    if lottie:
+        st_lottie(lottie, height=180, key="lottie_header")
+
+    data = CoachData()
+    if data.runs.empty:
+        st.info("Log your first run to unlock AI analysis.")
+        return
+
+    _persist_widget_state()
+
+    latest = data.latest
+    efficiency = data.efficiency
+
+    # ------------------------------------------------------
+    # Highlight Stats
+    # ------------------------------------------------------
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.subheader("📊 Training Snapshot (Last 7 Days)")
+
+    colA, colB, colC, colD = st.columns(4)
+    colA.metric("Last Run", f"{latest.get('distance')} mi", latest.get("duration"))
+    colB.metric("Mileage (7d)", f"{data.runs.tail(7)['distance'].sum():.1f} mi")
+    colC.metric("VO2 Max", latest.get("vo2max", "—"))
+    if efficiency:
+        change = efficiency["trend_change"]
+        colD.metric(
+            "Efficiency Trend",
+            f"{efficiency['trend'] * 100:.0f}%",
+            f"{change * 100:+.1f} pts (4 wks)" if change is not None else None,
+        )
+    else:
+        colD.metric("Efficiency Trend", "—")
+
+    if st.button("✨ Generate All Insights", key="btn_all"):
+        generate_all_insights(latest, data.metrics, data.prs)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+    st.write("")
+
+    render_coach_sections(data)
+
+
+# ------------------------------------------------------
+# Section switcher — only the selected tab is built, and
+# its widgets rerun just this fragment (not the header,
+# snapshot or data loading above)
+# ------------------------------------------------------
+@st.fragment
+def render_coach_sections(data: CoachData):
+    _persist_widget_state()
+
+    labels = list(COACH_TABS)
+    selected = st.radio(
+        "Section",
+        labels,
+        horizontal=True,
+        key="coach_tab",
+        label_visibility="collapsed",
+    )
+
+    st.markdown('<div class="tab-content">', unsafe_allow_html=True)
+    COACH_TABS[selected](data)
+    st.markdown('</div>', unsafe_allow_html=True)
 
     # ========================================================================
     # DEBUG PANEL
@@ -472,4 +608,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
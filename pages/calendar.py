@@ -6,52 +6,56 @@ import pandas as pd
 import calendar
 from datetime import datetime, date, timedelta
 
-from utils.database import fetch_runs
+from utils.calendar_grid import heatmap_html, month_grid_html
+from utils.daily import SCALE_METRICS, load_daily, load_month, load_thresholds
+from utils.metrics import load_runs
+
+
+VIEWS = ["Month", "Year", "Multi-year"]
 
 
 def render_calendar_page():
     st.title("📆 Training Calendar")
 
-    df = fetch_runs()
+    df = load_runs()
     if df.empty:
         st.info("No runs logged yet. Log a run to see the calendar.")
         return
 
-    df["date_dt"] = pd.to_datetime(df["date"]).dt.date
+    render_calendar()
+
 
+# Switching view / month reruns only the calendar, not the page. Each view
+# is a single HTML grid element built from the cached per-day index.
+@st.fragment
+def render_calendar():
     today = date.today()
-    year = st.sidebar.number_input("Year", min_value=2000, max_value=2100, value=today.year)
-    month = st.sidebar.number_input("Month", min_value=1, max_value=12, value=today.month)
-
-    cal = calendar.Calendar(firstweekday=0)
-    month_days = list(cal.itermonthdates(year, month))
-
-    st.subheader(f"{calendar.month_name[month]} {year}")
-
-    # 7 columns for days of the week
-    cols = st.columns(7)
-    for i, name in enumerate(["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]):
-        cols[i].markdown(f"**{name}**")
-
-    week_cols = st.columns(7)
-    col_index = 0
-
-    for d in month_days:
-        if d.month != month:
-            # gray out other-month days
-            week_cols[col_index].markdown(f"<span style='color: gray'>{d.day}</span>", unsafe_allow_html=True)
-        else:
-            day_runs = df[df["date_dt"] == d]
-            miles = day_runs["distance"].sum()
-            label = f"**{d.day}**"
-            if miles > 0:
-                label += f"<br/>{miles:.1f} mi"
-            week_cols[col_index].markdown(label, unsafe_allow_html=True)
-
-        col_index += 1
-        if col_index == 7:
-            col_index = 0
-            week_cols = st.columns(7)
+
+    c1, c2 = st.columns(2)
+    view = c1.radio("View", VIEWS, horizontal=True, key="cal_view")
+    metric = c2.radio(
+        "Color by", list(SCALE_METRICS), format_func=SCALE_METRICS.get,
+        horizontal=True, key="cal_metric",
+    )
+    thresholds = load_thresholds(metric)
+
+    if view == "Month":
+        c1, c2 = st.columns(2)
+        year = c1.number_input("Year", min_value=2000, max_value=2100, value=today.year, key="cal_year")
+        month = c2.number_input("Month", min_value=1, max_value=12, value=today.month, key="cal_month")
+
+        st.subheader(f"{calendar.month_name[month]} {year}")
+        grid = month_grid_html(load_month(year, month), year, month, thresholds, metric)
+
+    elif view == "Year":
+        year = st.number_input("Year", min_value=2000, max_value=2100, value=today.year, key="cal_year")
+        grid = heatmap_html(load_daily(), [year], thresholds, metric)
+
+    else:
+        span = st.slider("Years", min_value=2, max_value=10, value=5, key="cal_span")
+        grid = heatmap_html(load_daily(), range(today.year - span + 1, today.year + 1), thresholds, metric)
+
+    st.markdown(grid, unsafe_allow_html=True)
 
 
 def main():
@@ -4,31 +4,50 @@ inject_css()
 
 import pandas as pd
 
-from utils.database import fetch_runs
+from utils.cohorts import RANK_METRICS, rank_run
+from utils.metrics import load_runs
+from utils.similarity import load_similar, similarity_pct
+
+
+# Matches listed under Run A (the best one is pre-selected as Run B)
+SIMILAR_K = 5
 
 
 def render_compare_runs_page():
     st.title("📊 Compare Runs")
 
-    df = fetch_runs()
+    df = load_runs()
     if df.empty:
         st.info("Log some runs to compare them.")
         return
 
     df = df.sort_values("date", ascending=False)
-    df["label"] = df.apply(
-        lambda r: f"{r['id']} — {r['date']} · {r['run_type']} · {r['distance']} mi", axis=1
+    df["label"] = (
+        df["id"].astype(str) + " — " + df["date"].astype(str) + " · "
+        + df["run_type"].astype(str) + " · " + df["distance"].astype(str) + " mi"
     )
 
     ids = df["id"].tolist()
     labels = df["label"].tolist()
     options = dict(zip(labels, ids))
+    position = {run_id: i for i, run_id in enumerate(ids)}
 
     col1, col2 = st.columns(2)
     with col1:
         run_a_label = st.selectbox("Run A", options=list(options.keys()), index=0)
+
+    # Default Run B to Run A's closest match; the widget resets whenever
+    # Run A (and so the suggested index) changes
+    similar = load_similar(options[run_a_label], SIMILAR_K)
+    default_b = position[similar["id"].iloc[0]] if not similar.empty else min(1, len(options) - 1)
     with col2:
-        run_b_label = st.selectbox("Run B", options=list(options.keys()), index=min(1, len(options)-1))
+        run_b_label = st.selectbox("Run B", options=list(options.keys()), index=default_b)
+
+    if not similar.empty:
+        with st.expander("🔍 Runs most similar to Run A", expanded=False):
+            matches = df.set_index("id").loc[similar["id"], ["date", "run_type", "distance", "avg_pace", "avg_hr", "effort"]]
+            matches.insert(0, "match", [f"{p:.0f}%" for p in similarity_pct(similar["distance"])])
+            st.dataframe(matches, use_container_width=True)
 
     run_a = df[df["id"] == options[run_a_label]].iloc[0]
     run_b = df[df["id"] == options[run_b_label]].iloc[0]
@@ -55,6 +74,8 @@ def render_compare_runs_page():
     ):
         cols2[i].markdown(f"**{label}**  \nA: {ra}  \nB: {rb}")
 
+    render_cohort_ranks(run_a, run_b)
+
     st.markdown("### Notes / Feel")
     c1, c2 = st.columns(2)
     with c1:
@@ -65,6 +86,28 @@ def render_compare_runs_page():
         st.write(run_b.get("felt", ""))
 
 
+def render_cohort_ranks(run_a, run_b):
+    st.markdown("### Cohort Ranking")
+
+    ranked = {"A": rank_run(run_a), "B": rank_run(run_b)}
+    for name, result in ranked.items():
+        if result["cohort"]:
+            st.caption(f"Run {name} cohort: {result['cohort']}")
+
+    rows = []
+    for metric, (label, _, phrase) in RANK_METRICS.items():
+        row = {"Metric": label}
+        for name, result in ranked.items():
+            pct, n = result["ranks"].get(metric, (None, 0))
+            row[f"Run {name}"] = f"{phrase} {pct:.0f}% (n={n})" if pct is not None else "—"
+        rows.append(row)
+
+    if all(not r["ranks"] for r in ranked.values()):
+        st.info("Not enough similar runs in the last few months to rank these runs.")
+        return
+    st.dataframe(pd.DataFrame(rows).set_index("Metric"), use_container_width=True)
+
+
 def main():
     render_compare_runs_page()
 
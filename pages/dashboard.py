@@ -2,23 +2,27 @@ import streamlit as st
 from utils.styling import inject_css
 inject_css()
 
+from datetime import timedelta
+
 import pandas as pd
 
-from utils.database import fetch_runs
-from utils.metrics import prepare_metrics_df
+from utils.charts import TRENDS, load_trend, trend_date_range
+from utils.efficiency import efficiency_summary, load_efficiency
+from utils.metrics import load_metrics, load_runs
 from utils.prs import calculate_prs
+from utils.volume import format_volume, load_volume
 
 
 def render_dashboard_page():
     st.title("📊 Dashboard")
     st.caption("High-level view of your training volume, pacing, and PRs.")
 
-    df = fetch_runs()
+    df = load_runs()
     if df.empty:
         st.info("Log some runs (or import from Garmin) to view insights here.")
         return
 
-    metrics = prepare_metrics_df(df)
+    metrics = load_metrics()
     prs = calculate_prs(metrics)
 
     # Ensure we have a datetime column for time windows
@@ -82,24 +86,19 @@ def render_dashboard_page():
     st.markdown("</div>", unsafe_allow_html=True)
 
     # -------------------------------------------------
-    # SIMPLE TREND VIEW (WEEKLY MILEAGE)
+    # TRAINING VOLUME (WEEK / MONTH / YEAR)
     # -------------------------------------------------
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.subheader("📆 Weekly Mileage (Quick View)")
-
-    metrics_dt["year_week"] = metrics_dt["date_dt"].dt.strftime("%Y-W%V")
-    weekly = (
-        metrics_dt.groupby("year_week", dropna=True)["distance"]
-        .sum()
-        .reset_index(name="miles")
-    ).sort_values("year_week", ascending=True)
+    render_volume_card()
 
-    if not weekly.empty:
-        st.dataframe(weekly.tail(8), use_container_width=True)
-    else:
-        st.info("Not enough data yet to build a weekly mileage trend.")
+    # -------------------------------------------------
+    # TRENDS (PACE / HR / MILEAGE / EFFICIENCY)
+    # -------------------------------------------------
+    render_trends_card()
 
-    st.markdown("</div>", unsafe_allow_html=True)
+    # -------------------------------------------------
+    # RUNNING EFFICIENCY TREND
+    # -------------------------------------------------
+    render_efficiency_card()
 
     # -------------------------------------------------
     # PR BOARD (PRETTIER)
@@ -138,6 +137,117 @@ def render_dashboard_page():
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+# Periods shown per granularity
+VOLUME_PERIODS = {"week": 12, "month": 12, "year": 10}
+
+
+# Switching granularity reruns only this card
+@st.fragment
+def render_volume_card():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.subheader("📆 Training Volume")
+
+    granularity = st.radio(
+        "Group by",
+        list(VOLUME_PERIODS),
+        format_func=str.title,
+        horizontal=True,
+        key="dash_volume_granularity",
+    )
+    n = VOLUME_PERIODS[granularity]
+
+    table = format_volume(load_volume(granularity, n), granularity)
+
+    if table["runs"].sum() == 0:
+        st.info("Not enough data yet to build a volume trend.")
+    else:
+        st.bar_chart(table["miles"], height=220)
+        st.dataframe(
+            table.iloc[::-1].rename(columns={
+                "miles": "Miles", "runs": "Runs", "hours": "Hours", "long_run": "Long Run",
+            }),
+            use_container_width=True,
+        )
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
+# Metric / range changes rerun only this card. Narrowing the range is the
+# zoom: the window is re-sliced from full resolution and re-downsampled
+# server-side, so the browser never gets more than DEFAULT_POINTS points.
+@st.fragment
+def render_trends_card():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.subheader("📉 Trends")
+
+    name = st.radio(
+        "Metric",
+        list(TRENDS),
+        format_func=TRENDS.get,
+        horizontal=True,
+        key="dash_trend_metric",
+    )
+
+    span = trend_date_range(name)
+    if span is None:
+        st.info("Not enough data yet for this trend.")
+        st.markdown("</div>", unsafe_allow_html=True)
+        return
+
+    first, last = span
+    if first < last:
+        start, end = st.slider(
+            "Range",
+            min_value=first,
+            max_value=last,
+            value=(max(first, last - timedelta(days=365)), last),
+            format="YYYY-MM-DD",
+            key=f"dash_trend_range_{name}",
+        )
+    else:
+        start, end = first, last
+
+    st.line_chart(load_trend(name, start, end), height=240)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
+def render_efficiency_card():
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.subheader("⚡ Running Efficiency")
+    st.caption(
+        "Distance per heartbeat, relative to your typical run of the same type "
+        "(100% = typical). Needs distance, duration and average HR."
+    )
+
+    eff = load_efficiency()
+    summary = efficiency_summary(eff)
+
+    if not summary:
+        st.info("Log runs with average heart rate to see your efficiency trend.")
+        st.markdown("</div>", unsafe_allow_html=True)
+        return
+
+    change = summary["trend_change"]
+    c1, c2, c3 = st.columns(3)
+    c1.metric(
+        "Trend",
+        f"{summary['trend'] * 100:.0f}%",
+        f"{change * 100:+.1f} pts vs 4 wks ago" if change is not None else None,
+    )
+    c2.metric("Last Run Score", f"{summary['last_score']:.2f}")
+    c3.metric(
+        "Last Run Percentile",
+        f"{summary['last_pct']:.0f}th",
+        help=f"Among your {summary['last_type']} runs",
+    )
+
+    last_date = summary["last_date"].date()
+    st.line_chart(load_trend("efficiency", last_date - timedelta(days=365), last_date), height=220)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
 def main():
     render_dashboard_page()
 
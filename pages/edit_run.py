@@ -1,11 +1,27 @@
 import streamlit as st
 from utils.styling import inject_css
 inject_css()
+import numpy as np
 import pandas as pd
-from utils.database import fetch_runs, update_run, delete_run
+from utils.database import (
+    count_runs, delete_run, delete_runs, fetch_run, search_run_labels, search_runs,
+    update_run, update_runs,
+)
 from datetime import datetime, timedelta
 
 
+RUN_TYPES = ["Easy", "Tempo", "Interval", "Long", "Race", "Recovery"]
+
+# Runs listed per page of the picker
+RUNS_PER_PAGE = 50
+
+# Rows per page of the bulk grid (enough for a typical bad import at once)
+BULK_PAGE_SIZE = 500
+
+# Columns editable in the bulk grid
+BULK_COLUMNS = ["date", "run_type", "distance", "duration", "avg_pace", "avg_hr", "effort", "notes"]
+
+
 # ---------------------------------------------------------
 # Utility — parse "0 days 00:30:00"
 # ---------------------------------------------------------
@@ -32,32 +48,70 @@ def parse_duration_to_seconds(duration_str):
 
 
 # ---------------------------------------------------------
-# Edit Run Page
+# Run picker — searches and pages through labels in SQL, so
+# only one page of (id, date, type, distance) is ever loaded
 # ---------------------------------------------------------
-def render_edit_run_page():
-    st.title("✏️ Edit Run")
-    st.caption("Modify your saved run or delete it permanently.")
+def _set_picker_page(page: int, key: str = "edit_run_page"):
+    st.session_state[key] = max(page, 0)
+
+
+def _pager(page: int, pages: int, shown: int, total: int, page_size: int, key: str):
+    c1, c2, c3 = st.columns([1, 3, 1])
+    c1.button("◀ Newer", key=f"{key}_newer", disabled=page == 0,
+              on_click=_set_picker_page, args=(page - 1, key))
+    first = page * page_size + 1
+    c2.caption(f"Runs {first}–{first + shown - 1} of {total}")
+    c3.button("Older ▶", key=f"{key}_older", disabled=page >= pages - 1,
+              on_click=_set_picker_page, args=(page + 1, key))
+
+
+def select_run():
+    query = st.text_input(
+        "Search runs",
+        key="edit_run_query",
+        placeholder="e.g. 2025-03, tempo, or a run id",
+        on_change=_set_picker_page,
+        args=(0,),
+    )
 
-    df = fetch_runs()
+    total = count_runs(query)
+    if total == 0:
+        st.info("No runs match that search.")
+        return None
 
-    if df.empty:
-        st.error("No runs available to edit.")
-        return
+    pages = (total + RUNS_PER_PAGE - 1) // RUNS_PER_PAGE
+    page = min(st.session_state.get("edit_run_page", 0), pages - 1)
+    labels = search_run_labels(query, RUNS_PER_PAGE, page * RUNS_PER_PAGE)
 
-    df = df.sort_values(by="date", ascending=False).reset_index(drop=True)
+    run_labels = (
+        labels["id"].astype(str) + " — " + labels["date"].astype(str) + " · "
+        + labels["run_type"].astype(str) + " · " + labels["distance"].astype(str) + " mi"
+    ).tolist()
+    ids = dict(zip(run_labels, labels["id"].tolist()))
+    selected_label = st.selectbox("Select a run to edit:", run_labels)
+    _pager(page, pages, len(labels), total, RUNS_PER_PAGE, "edit_run_page")
 
-    # ----------------------------
-    # Dropdown to select run
-    # ----------------------------
-    run_labels = [
-        f"{row['id']} — {row['date']} · {row['run_type']} · {row['distance']} mi"
-        for _, row in df.iterrows()
-    ]
+    return ids[selected_label]
 
-    selected_label = st.selectbox("Select a run to edit:", run_labels)
 
-    selected_id = int(selected_label.split("—")[0].strip())
-    selected_row = df[df["id"] == selected_id].iloc[0]
+# ---------------------------------------------------------
+# Single run
+# ---------------------------------------------------------
+def render_single_edit():
+    selected_id = select_run()
+    if selected_id is None:
+        return
+
+    selected_row = fetch_run(selected_id)
+    if selected_row is None:
+        st.error("That run no longer exists.")
+        return
+
+    # Version the form was opened at: saving fails instead of overwriting
+    # if the run has been changed elsewhere since
+    loaded = st.session_state.get("edit_run_loaded")
+    if loaded is None or loaded[0] != selected_id:
+        loaded = st.session_state["edit_run_loaded"] = (selected_id, selected_row.get("row_version"))
 
     st.markdown("<div class='card'>", unsafe_allow_html=True)
 
@@ -68,10 +122,13 @@ def render_edit_run_page():
     # ----------------------------
     new_date = st.date_input("Date", datetime.fromisoformat(selected_row["date"]))
 
+    # Imported runs can carry other types ("Run", Garmin activity names)
+    current_type = selected_row["run_type"] or RUN_TYPES[0]
+    run_types = list(dict.fromkeys(RUN_TYPES + [current_type]))
     new_type = st.selectbox(
         "Run Type",
-        ["Easy", "Tempo", "Interval", "Long", "Race", "Recovery"],
-        index=["Easy", "Tempo", "Interval", "Long", "Race", "Recovery"].index(selected_row["run_type"])
+        run_types,
+        index=run_types.index(current_type)
     )
 
     new_distance = st.number_input("Distance (mi)", value=float(selected_row["distance"]), min_value=0.0, step=0.1)
@@ -86,16 +143,16 @@ def render_edit_run_page():
     new_duration_str = st.text_input("Duration (HH:MM:SS)", value=t)
 
     # Pace
-    new_pace = st.text_input("Avg Pace (MM:SS)", value=selected_row.get("avg_pace", ""))
+    new_pace = st.text_input("Avg Pace (MM:SS)", value=selected_row.get("avg_pace") or "")
 
     # HR
-    new_hr = st.number_input("Avg HR (bpm)", value=int(selected_row.get("avg_hr", 0)), min_value=0, step=1)
+    new_hr = st.number_input("Avg HR (bpm)", value=int(selected_row.get("avg_hr") or 0), min_value=0, step=1)
 
     # Effort
-    new_effort = st.slider("Effort (1–10)", 1, 10, int(selected_row.get("effort", 5)))
+    new_effort = st.slider("Effort (1–10)", 1, 10, int(selected_row.get("effort") or 5))
 
     # Notes
-    new_notes = st.text_area("Notes", value=selected_row.get("notes", ""))
+    new_notes = st.text_area("Notes", value=selected_row.get("notes") or "")
 
 
     # ----------------------------
@@ -108,7 +165,7 @@ def render_edit_run_page():
                 st.error("Invalid duration format. Use HH:MM:SS.")
                 return
 
-            update_run(
+            applied = update_run(
                 selected_id,
                 {
                     "date": str(new_date),
@@ -120,7 +177,12 @@ def render_edit_run_page():
                     "effort": new_effort,
                     "notes": new_notes,
                 },
+                expected_version=loaded[1],
             )
+            st.session_state.pop("edit_run_loaded", None)
+            if not applied:
+                st.warning("This run was changed elsewhere since you opened it; reloaded the latest version.")
+                return
 
             st.success("Run updated successfully!")
             st.rerun()
@@ -139,13 +201,221 @@ def render_edit_run_page():
     st.subheader("🗑 Delete This Run")
 
     if st.button("❌ Delete Run", type="secondary"):
-        delete_run(selected_id)
+        st.session_state.pop("edit_run_loaded", None)
+        if not delete_run(selected_id, expected_version=loaded[1]):
+            st.warning("This run was changed elsewhere since you opened it; reloaded the latest version.")
+            return
         st.success("Run deleted.")
         st.rerun()
 
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+# ---------------------------------------------------------
+# Bulk edit — one page of runs in an editable grid, saved
+# (or deleted) in a single transaction
+# ---------------------------------------------------------
+def _load_bulk_page(query: str, page: int) -> dict:
+    """
+    The rows the grid was opened with, kept until the search, page or a
+    save changes them, so their row_versions are the ones the user saw.
+    """
+    snap = st.session_state.get("bulk_snapshot")
+    if snap is None or (snap["query"], snap["page"]) != (query, page):
+        generation = st.session_state.get("bulk_generation", 0) + 1
+        st.session_state["bulk_generation"] = generation
+        snap = st.session_state["bulk_snapshot"] = {
+            "query": query,
+            "page": page,
+            "generation": generation,
+            "runs": search_runs(query, BULK_PAGE_SIZE, page * BULK_PAGE_SIZE),
+            # Select-all state, and cell edits carried over when it remounts the grid
+            "select_all": False,
+            "pending": {},
+            "editor": 0,
+        }
+    return snap
+
+
+def _bulk_grid_key(snap: dict) -> str:
+    return f"bulk_grid_{snap['generation']}_{snap['editor']}"
+
+
+def _toggle_bulk_select_all():
+    """
+    Select-all rewrites the grid's 🗑 column, so the editor is remounted
+    under a new key with the cell edits made so far folded into its data.
+    """
+    snap = st.session_state["bulk_snapshot"]
+    state = st.session_state.get(_bulk_grid_key(snap), {})
+    for row, values in state.get("edited_rows", {}).items():
+        kept = {col: value for col, value in values.items() if col != "delete"}
+        if kept:
+            snap["pending"].setdefault(int(row), {}).update(kept)
+    snap["select_all"] = st.session_state[f"bulk_select_all_{snap['generation']}"]
+    snap["editor"] += 1
+
+
+def _reload_bulk(message=None):
+    st.session_state.pop("bulk_snapshot", None)
+    if message:
+        st.session_state["bulk_message"] = message
+
+
+def _db_value(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _grid_changes(original: pd.DataFrame, edited: pd.DataFrame):
+    """
+    ([(id, row_version, {column: value})] for rows with edited cells,
+    [error messages]). Only the changed columns of a row are written.
+    """
+    before, after = original[BULK_COLUMNS], edited[BULK_COLUMNS]
+    changed = ~((before == after) | (before.isna() & after.isna()))
+
+    changes, errors = [], []
+    for pos in np.flatnonzero(changed.any(axis=1).to_numpy()):
+        run_id = int(original["id"].iloc[pos])
+        values = {
+            col: _db_value(after[col].iloc[pos])
+            for col in changed.columns[changed.iloc[pos].to_numpy()]
+        }
+        if "date" in values:
+            try:
+                values["date"] = datetime.fromisoformat(str(values["date"])).date().isoformat()
+            except ValueError:
+                errors.append(f"Run {run_id}: invalid date {values['date']!r} (use YYYY-MM-DD).")
+        if "duration" in values:
+            duration = str(values["duration"] or "")
+            if parse_duration_to_seconds(duration) is None:
+                errors.append(f"Run {run_id}: invalid duration {duration!r} (use HH:MM:SS).")
+            elif "days" not in duration:
+                values["duration"] = f"0 days {duration}"
+        changes.append((run_id, int(original["row_version"].iloc[pos]), values))
+    return changes, errors
+
+
+def _conflict_note(conflicts: list) -> str:
+    if not conflicts:
+        return ""
+    shown = ", ".join(str(i) for i in conflicts[:10]) + (" …" if len(conflicts) > 10 else "")
+    return (
+        f" {len(conflicts)} run(s) were changed or deleted elsewhere since the grid was "
+        f"loaded and were left alone ({shown}); the grid now shows their latest values."
+    )
+
+
+def render_bulk_edit():
+    message = st.session_state.pop("bulk_message", None)
+    if message:
+        kind, text = message
+        (st.success if kind == "success" else st.warning)(text)
+
+    query = st.text_input(
+        "Filter runs",
+        key="bulk_query",
+        placeholder="e.g. 2025-03 to pick out one import, tempo, or a run id",
+        on_change=_set_picker_page,
+        args=(0, "bulk_page"),
+    )
+    total = count_runs(query)
+    if total == 0:
+        st.info("No runs match that filter.")
+        return
+
+    pages = (total + BULK_PAGE_SIZE - 1) // BULK_PAGE_SIZE
+    page = min(st.session_state.get("bulk_page", 0), pages - 1)
+    snap = _load_bulk_page(query, page)
+    runs = snap["runs"]
+    if runs.empty:
+        _reload_bulk()
+        st.rerun()
+
+    st.checkbox(
+        "Select all shown for deletion",
+        key=f"bulk_select_all_{snap['generation']}",
+        on_change=_toggle_bulk_select_all,
+    )
+    grid = runs[["id"] + BULK_COLUMNS].copy()
+    grid.insert(0, "delete", snap["select_all"])
+    for row, values in snap["pending"].items():
+        for col, value in values.items():
+            grid.iloc[row, grid.columns.get_loc(col)] = value
+
+    edited = st.data_editor(
+        grid,
+        # Key, data and column config only change together (new snapshot or
+        # select-all toggle): any change remounts the editor
+        key=_bulk_grid_key(snap),
+        hide_index=True,
+        num_rows="fixed",
+        disabled=["id"],
+        use_container_width=True,
+        column_config={
+            "delete": st.column_config.CheckboxColumn("🗑", help="Select for deletion"),
+            "id": st.column_config.NumberColumn("ID", format="%d"),
+            "run_type": st.column_config.SelectboxColumn(
+                "Type", options=sorted(set(RUN_TYPES) | set(runs["run_type"].dropna()))
+            ),
+            "distance": st.column_config.NumberColumn("Distance (mi)", min_value=0.0, step=0.01),
+            "avg_hr": st.column_config.NumberColumn("Avg HR", min_value=0, step=1),
+            "effort": st.column_config.NumberColumn("Effort", min_value=1, max_value=10, step=1),
+        },
+    )
+    _pager(page, pages, len(runs), total, BULK_PAGE_SIZE, "bulk_page")
+
+    changes, errors = _grid_changes(runs, edited)
+    selected = edited["delete"].to_numpy(dtype=bool)
+
+    c1, c2, c3 = st.columns(3)
+    save = c1.button(f"💾 Save {len(changes)} edited run(s)", type="primary", disabled=not changes)
+    confirm = c2.checkbox(f"Yes, delete {selected.sum()} run(s)", disabled=not selected.any())
+    delete = c3.button(f"❌ Delete {selected.sum()} selected", disabled=not (selected.any() and confirm))
+    c1.button("↻ Reload", on_click=_reload_bulk)
+
+    if save:
+        if errors:
+            for error in errors:
+                st.error(error)
+            return
+        conflicts = update_runs(changes)
+        _reload_bulk((
+            "warning" if conflicts else "success",
+            f"Saved {len(changes) - len(conflicts)} run(s)." + _conflict_note(conflicts),
+        ))
+        st.rerun()
+
+    if delete:
+        doomed = runs[selected]
+        conflicts = delete_runs(list(zip(doomed["id"].tolist(), doomed["row_version"].tolist())))
+        _reload_bulk((
+            "warning" if conflicts else "success",
+            f"Deleted {len(doomed) - len(conflicts)} run(s)." + _conflict_note(conflicts),
+        ))
+        st.rerun()
+
+
+# ---------------------------------------------------------
+# Edit Run Page
+# ---------------------------------------------------------
+def render_edit_run_page():
+    st.title("✏️ Edit Run")
+    st.caption("Modify your saved runs or delete them permanently.")
+
+    if count_runs() == 0:
+        st.error("No runs available to edit.")
+        return
+
+    mode = st.radio("Mode", ["Single run", "Bulk edit"], key="edit_run_mode", horizontal=True)
+    if mode == "Single run":
+        render_single_edit()
+    else:
+        render_bulk_edit()
+
+
 def main():
     render_edit_run_page()
 
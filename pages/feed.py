@@ -4,30 +4,39 @@ inject_css()
 
 import pandas as pd
 
-from utils.database import fetch_runs
+from utils.metrics import load_runs
 
 
 def render_feed_page():
     st.title("📜 Training Feed")
 
-    df = fetch_runs()
+    df = load_runs()
     if df.empty:
         st.info("No runs logged yet. Log a run to see your feed.")
         return
 
-    df = df.sort_values("date", ascending=False)
+    render_feed(df.sort_values("date", ascending=False))
 
-    st.sidebar.markdown("### Filters")
+
+# Filter changes rerun only the filters + list, against the runs loaded
+# by the last full run (fragments can't write to the sidebar, so the
+# filters live above the list)
+@st.fragment
+def render_feed(df: pd.DataFrame):
     run_types = sorted(df["run_type"].dropna().unique().tolist())
-    selected_types = st.sidebar.multiselect(
-        "Run Types", options=run_types, default=run_types
-    )
-    min_distance = st.sidebar.number_input(
-        "Min Distance (mi)", min_value=0.0, value=0.0, step=0.5
-    )
-    max_distance = st.sidebar.number_input(
-        "Max Distance (mi)", min_value=0.0, value=float(df["distance"].max() or 0) or 0.0, step=0.5
-    )
+
+    with st.expander("🔎 Filters", expanded=False):
+        c1, c2, c3 = st.columns([2, 1, 1])
+        selected_types = c1.multiselect(
+            "Run Types", options=run_types, default=run_types, key="feed_types"
+        )
+        min_distance = c2.number_input(
+            "Min Distance (mi)", min_value=0.0, value=0.0, step=0.5, key="feed_min_distance"
+        )
+        max_distance = c3.number_input(
+            "Max Distance (mi)", min_value=0.0, value=float(df["distance"].max() or 0) or 0.0,
+            step=0.5, key="feed_max_distance"
+        )
 
     filtered = df[
         df["run_type"].isin(selected_types)
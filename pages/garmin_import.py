@@ -2,14 +2,42 @@ import streamlit as st
 from utils.styling import inject_css
 inject_css()
 
+import os
+
 import pandas as pd
-from datetime import timedelta
 
-from utils.database import add_run
+from utils.garmin import detect_garmin_format
+from utils.import_jobs import ensure_worker, list_import_jobs, submit_import_job
+
+
+STATUS_ICONS = {"queued": "⏳", "running": "🔄", "done": "✅", "failed": "❌"}
 
 
 def render_garmin_import_page():
     st.title("📤 Import Garmin Data")
+    st.caption("Imports run in the background — you can keep using the app while they finish.")
+
+    # Resume anything queued before a server restart
+    ensure_worker()
+
+    # Filled last so jobs queued by this run's buttons show up immediately
+    jobs_slot = st.container()
+
+    st.markdown("---")
+    render_csv_import()
+
+    st.markdown("---")
+    render_activity_file_import()
+
+    st.markdown("---")
+    render_bulk_import()
+
+    with jobs_slot:
+        render_import_jobs()
+
+
+def render_csv_import():
+    st.subheader("Activity Summary CSV")
 
     uploaded = st.file_uploader("Upload Garmin CSV file", type=["csv"])
 
@@ -17,54 +45,118 @@ def render_garmin_import_page():
         st.info("Upload a Garmin export CSV to begin.")
         return
 
-    df = pd.read_csv(uploaded)
+    df = pd.read_csv(uploaded, sep=None, engine="python")
 
     st.write("Preview:")
     st.dataframe(df.head(), use_container_width=True)
 
+    try:
+        plan = detect_garmin_format(df)
+    except ValueError as e:
+        st.error(str(e))
+        return
+
+    st.caption(
+        f"Detected **{plan['flavor']}** export · distance in **{plan['distance_unit']}** · "
+        f"elevation in **{plan['elevation_unit']}**"
+    )
+
     if st.button("Import Runs"):
-        imported_count = 0
-
-        for _, row in df.iterrows():
-            try:
-                # Parse Garmin fields (common names)
-                duration_seconds = row.get("Duration", 0)
-                distance_mi = row.get("Distance", 0) / 1609.34  # meters → miles
-
-                duration_str = str(timedelta(seconds=int(duration_seconds)))
-
-                run_data = {
-                    "date": row.get("Date", ""),
-                    "run_type": row.get("Activity Type", "Run"),
-                    "distance": round(distance_mi, 2),
-                    "duration": duration_str,
-                    "avg_pace": row.get("Avg Pace", None),
-                    "avg_hr": row.get("Avg HR", None),
-                    "max_hr": row.get("Max HR", None),
-                    "cadence": row.get("Avg Run Cadence", None),
-                    "elevation": row.get("Elevation Gain", None),
-                    "effort": 5,
-                    "weather": "",
-                    "terrain": "",
-                    "felt": "",
-                    "pain": "",
-                    "sleep": "",
-                    "stress": "",
-                    "hydration": "",
-                    "vo2max": None,
-                    "training_load": None,
-                    "hrv": None,
-                    "performance_condition": "",
-                    "notes": "",
-                }
-
-                add_run(run_data)
-                imported_count += 1
-
-            except Exception as e:
-                st.warning(f"Skipped a row due to error: {e}")
-
-        st.success(f"Imported {imported_count} runs!")
+        job_id = submit_import_job("csv", uploaded.name, uploaded.getvalue())
+        st.success(f"Queued import job #{job_id}.")
+
+
+def render_activity_file_import():
+    st.subheader("Activity Files (FIT / GPX / TCX)")
+    st.caption("Imports per-second streams; the run summary is derived from the file.")
+
+    files = st.file_uploader(
+        "Upload activity files",
+        type=["fit", "gpx", "tcx"],
+        accept_multiple_files=True,
+    )
+
+    if not files:
+        return
+
+    if st.button("Import Activity Files"):
+        job_id = submit_import_job(
+            "files",
+            f"{len(files)} activity files",
+            [(f.name, f.getvalue()) for f in files],
+        )
+        st.success(f"Queued import job #{job_id}.")
+
+
+def render_bulk_import():
+    st.subheader("Bulk Import (Zip Archive / Folder)")
+    st.caption(
+        "Garmin bulk exports are parsed in parallel across all CPU cores. "
+        "Nested zips inside the archive are expanded automatically."
+    )
+
+    archive = st.file_uploader("Upload Garmin export archive", type=["zip"])
+    folder = st.text_input("…or a local folder of FIT / GPX / TCX files", value="")
+
+    if not archive and not folder.strip():
+        return
+
+    if not st.button("Start Bulk Import"):
+        return
+
+    if archive:
+        job_id = submit_import_job("archive", archive.name, archive.getvalue())
+    else:
+        if not os.path.isdir(folder.strip()):
+            st.error(f"Folder not found: {folder}")
+            return
+        job_id = submit_import_job("folder", folder.strip(), folder.strip())
+
+    st.success(f"Queued import job #{job_id}.")
+
+
+def _job_counts(job) -> str:
+    return f"{job['imported']} new · {job['updated'] or 0} updated"
+
+
+def render_import_jobs():
+    jobs = list_import_jobs()
+    if jobs.empty:
+        return
+
+    active = jobs["status"].isin(["queued", "running"]).any()
+
+    # Poll only while something is queued or running
+    @st.fragment(run_every=2 if active else None)
+    def job_status():
+        st.subheader("📋 Import Jobs")
+
+        current = list_import_jobs()
+        # run_every is fixed when the fragment is defined, so once the last
+        # job finishes rerun the page to re-define it without polling
+        if active and not current["status"].isin(["queued", "running"]).any():
+            st.rerun()
+
+        for job in current.to_dict("records"):
+            icon = STATUS_ICONS.get(job["status"], "")
+            st.markdown(f"{icon} **#{job['id']} · {job['filename']}** — {job['status']}")
+
+            if job["status"] == "running" and job["total"]:
+                st.progress(
+                    job["done"] / job["total"],
+                    text=f"{job['done']}/{job['total']} · {_job_counts(job)}",
+                )
+            elif job["status"] == "done":
+                st.caption(f"{_job_counts(job)} · finished {job['finished_at']}")
+
+            if job["errors"]:
+                with st.expander(f"⚠️ {len(job['errors'])} problems"):
+                    st.dataframe(
+                        pd.DataFrame(job["errors"], columns=["File", "Error"]),
+                        use_container_width=True,
+                    )
+
+    job_status()
 
 
 def main():
@@ -5,7 +5,12 @@ inject_css()
 import pandas as pd
 from datetime import timedelta
 
-from utils.database import fetch_runs
+from utils.zones import RESTING_HR_DEFAULT, ZONE_MODELS, load_zones
+from utils.metrics import load_runs
+
+
+# Weeks shown in the time-in-zone chart
+ZONE_WEEKS = 12
 
 
 def _pace_to_str(pace_sec: float) -> str:
@@ -14,63 +19,71 @@ def _pace_to_str(pace_sec: float) -> str:
     return str(timedelta(seconds=int(pace_sec)))
 
 
+def _hr_to_str(bpm) -> str:
+    return f"{bpm:.0f}" if pd.notna(bpm) else "—"
+
+
 def render_pace_zones_page():
     st.title("📏 Pace Zones")
 
-    df = fetch_runs()
+    df = load_runs()
     if df.empty:
         st.info("Log some runs to calculate pace zones.")
         return
 
-    # Try to infer a "threshold" pace from faster runs (tempo/race)
-    fast_types = ["Tempo", "Threshold", "Interval", "Race"]
-    fast = df[df["run_type"].isin(fast_types) & df["distance"].gt(2)]
+    model = st.radio(
+        "Zone model", list(ZONE_MODELS), format_func=ZONE_MODELS.get,
+        horizontal=True, key="zones_model",
+    )
+    resting_hr = st.session_state.get("resting_hr", RESTING_HR_DEFAULT)
+    zones = load_zones(model, resting_hr, st.session_state.get("max_hr") or None)
 
-    if fast.empty:
-        st.warning("Not enough tempo/threshold/race data. Using overall average pace.")
-        base_df = df[df["distance"] > 0]
-    else:
-        base_df = fast
-
-    # Estimate pace seconds from duration/distance if possible
-    def compute_pace(row):
-        try:
-            if row.get("avg_pace"):
-                # if you saved avg_pace as HH:MM:SS, parse it
-                t = pd.to_timedelta(row["avg_pace"])
-                return t.total_seconds()
-            # else compute from duration + distance
-            t = pd.to_timedelta(row["duration"])
-            if row["distance"] > 0:
-                return t.total_seconds() / row["distance"]
-        except Exception:
-            return None
-        return None
-
-    base_df["pace_sec"] = base_df.apply(compute_pace, axis=1)
-    threshold_pace_sec = base_df["pace_sec"].median()
-
-    if pd.isna(threshold_pace_sec):
+    if not zones or pd.isna(zones["threshold_pace"]):
         st.error("Could not calculate pace zones from your data yet.")
         return
+    if zones["fallback"]:
+        st.warning("Not enough tempo/threshold/race data. Using overall average pace.")
 
-    # Simple pace zone model relative to threshold pace:
-    # (these ratios are rough and user-friendly, not lab-grade)
-    zones = {
-        "Easy / Recovery": threshold_pace_sec * 1.20,
-        "Steady / Aerobic": threshold_pace_sec * 1.08,
-        "Marathon Pace (approx)": threshold_pace_sec * 1.03,
-        "Threshold / Tempo": threshold_pace_sec,
-        "Interval": threshold_pace_sec * 0.90,
-        "Repetition / Speed": threshold_pace_sec * 0.80,
-    }
-
-    st.subheader("Suggested Pace Zones")
-    for name, pace_sec in zones.items():
-        st.markdown(f"**{name}:** {_pace_to_str(pace_sec)} per mile")
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Threshold Pace", f"{_pace_to_str(zones['threshold_pace'])} /mi")
+    c2.metric("Threshold HR", _hr_to_str(zones["threshold_hr"]) if zones["threshold_hr"] else "—")
+    c3.metric("Max HR", _hr_to_str(zones["max_hr"]) if zones["max_hr"] else "—", help=f"Resting HR {resting_hr:.0f} (set in Settings)")
+
+    ranges = zones["ranges"]
+    st.subheader("Suggested Zones")
+    if model == "pace":
+        for name, row in ranges.iterrows():
+            st.markdown(
+                f"**{name}:** {_pace_to_str(row['target'])} per mile "
+                f"({_pace_to_str(row['slowest']) if pd.notna(row['slowest']) else 'slower'}"
+                f" → {_pace_to_str(row['fastest']) if pd.notna(row['fastest']) else 'faster'})"
+            )
+    elif model == "hr" and not zones["threshold_hr"]:
+        st.info("Log heart rate on your tempo / race runs to get HR zones.")
+    else:
+        for name, row in ranges.iterrows():
+            if pd.isna(row["from"]):
+                span = f"below {_hr_to_str(row['to'])}"
+            elif pd.isna(row["to"]):
+                span = f"{_hr_to_str(row['from'])}+"
+            else:
+                span = f"{_hr_to_str(row['from'])}–{_hr_to_str(row['to'])}"
+            st.markdown(f"**{name}:** {span} bpm")
+
+    weekly = zones["weekly"]
+    st.subheader("Time in Zone per Week")
+    if weekly.empty:
+        st.info("No runs with the data this model needs yet.")
+    else:
+        recent = weekly.tail(ZONE_WEEKS)
+        recent.index = [p.start_time.strftime("%Y-%m-%d") for p in recent.index]
+        st.bar_chart(recent, height=260)
+        st.caption("Hours per week, each run counted in the zone of its average pace / HR.")
 
     st.caption(
-        "These zones are estimated based on your faster runs. "
+        f"Thresholds are the median of your tempo / threshold / race runs over the trailing "
+        f"90 days ({zones['qualifying_runs']} qualifying runs, latest "
+        f"{zones['as_of']:%Y-%m-%d}); each run is zoned against the threshold at its date. "
         "Use them as a guide and adjust by feel and heart rate."
     )
 
@@ -23,6 +23,19 @@ def render_settings_page():
         value=st.session_state.get("race_goal_time", "01:39:59"),
     )
 
+    st.subheader("Heart Rate")
+
+    resting_hr = st.number_input(
+        "Resting HR (bpm)",
+        min_value=30, max_value=120,
+        value=int(st.session_state.get("resting_hr", 60)),
+    )
+    max_hr = st.number_input(
+        "Max HR (bpm, 0 = estimate from your runs)",
+        min_value=0, max_value=230,
+        value=int(st.session_state.get("max_hr", 0)),
+    )
+
     st.subheader("Display Preferences")
 
     theme = st.selectbox(
@@ -43,6 +56,8 @@ def render_settings_page():
         st.session_state["race_goal_time"] = target_time
         st.session_state["theme"] = theme
         st.session_state["units"] = units
+        st.session_state["resting_hr"] = resting_hr
+        st.session_state["max_hr"] = max_hr
 
         # also store condensed values used by AI Coach
         st.session_state["race_goal"] = f"{race_name} in {target_time}"
@@ -0,0 +1,234 @@
+import pandas as pd
+
+
+# Rough OpenAI tokenizer ratio for English + numbers
+CHARS_PER_TOKEN = 4
+
+DEFAULT_TOKEN_BUDGET = 1200
+
+KEY_WORKOUT_TYPES = ["Tempo", "Threshold", "Interval", "Long", "Race"]
+
+# Columns considered for the recent-runs table, in display order
+RUN_FIELDS = [
+    "date", "run_type", "distance", "duration", "pace", "avg_hr", "max_hr",
+    "cadence", "elevation", "effort", "terrain", "weather", "felt", "pain",
+    "sleep", "stress", "hydration", "vo2max", "training_load", "hrv",
+    "performance_condition", "notes",
+]
+
+# Free-text fields are clipped so one long note can't eat the budget
+TEXT_LIMIT = 60
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+# -------------------------------------------------------------------
+# Cell formatting
+# -------------------------------------------------------------------
+def _pace(seconds):
+    if seconds is None or pd.isna(seconds) or seconds <= 0:
+        return ""
+    seconds = int(round(seconds))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if pd.isna(value):
+            return ""
+        return f"{value:.1f}".rstrip("0").rstrip(".")
+    text = str(value).strip().replace("|", "/").replace("\n", " ")
+    if text.startswith("0 days "):
+        text = text[len("0 days "):]
+    if len(text) > TEXT_LIMIT:
+        text = text[: TEXT_LIMIT - 1] + "…"
+    return text
+
+
+def _table(title, columns, rows):
+    """Dense pipe table; columns that are empty in every row are dropped."""
+    keep = [i for i, _ in enumerate(columns) if any(row[i] != "" for row in rows)]
+    lines = [title, "|".join(columns[i] for i in keep)]
+    lines += ["|".join(row[i] for i in keep) for row in rows]
+    return "\n".join(lines)
+
+
+def format_run(run: dict) -> str:
+    """Single run as 'key=value' pairs, skipping empty fields."""
+    parts = []
+    for key, value in run.items():
+        if key in ("id", "import_key", "row_version", "date_dt", "duration_seconds", "pace_seconds"):
+            continue
+        text = _cell(value)
+        if text:
+            parts.append(f"{key}={text}")
+    return " ".join(parts)
+
+
+# -------------------------------------------------------------------
+# Sections
+# -------------------------------------------------------------------
+def _with_dates(metrics):
+    m = metrics
+    if "date_dt" not in m.columns:
+        m = m.assign(date_dt=pd.to_datetime(m["date"], errors="coerce"))
+    return m[m["date_dt"].notna()]
+
+
+def weekly_rollups(metrics, weeks=8, today=None):
+    m = _with_dates(metrics)
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    start = (today - pd.Timedelta(weeks=weeks - 1)).to_period("W").start_time
+    m = m[m["date_dt"] >= start]
+    if m.empty:
+        return ""
+
+    g = m.groupby(m["date_dt"].dt.to_period("W"))
+    rollup = pd.DataFrame({
+        "mi": g["distance"].sum(),
+        "runs": g.size(),
+        "long": g["distance"].max(),
+        "pace": g["pace_seconds"].median() if "pace_seconds" in m else None,
+        "hr": g["avg_hr"].mean() if "avg_hr" in m else None,
+    })
+    rollup = rollup.reindex(pd.period_range(start, today, freq="W"), fill_value=0)
+
+    rows = [
+        [str(p.start_time.date()), _cell(float(r.mi)), str(int(r.runs)), _cell(float(r.long)),
+         _pace(r.pace) if r.runs else "", _cell(float(r.hr)) if r.runs and pd.notna(r.hr) else ""]
+        for p, r in rollup.iterrows()
+    ]
+    return _table(f"WEEKLY (last {weeks} wks, week starting):", ["week", "mi", "runs", "long", "pace", "hr"], rows)
+
+
+def key_workouts(metrics, limit=6):
+    m = _with_dates(metrics)
+    mask = m["run_type"].isin(KEY_WORKOUT_TYPES)
+    if "effort" in m:
+        mask |= pd.to_numeric(m["effort"], errors="coerce").ge(7)
+    m = m[mask].sort_values("date_dt").tail(limit)
+    if m.empty:
+        return ""
+
+    rows = [
+        [str(r["date_dt"].date()), _cell(r["run_type"]), _cell(r["distance"]),
+         _pace(r.get("pace_seconds")), _cell(r.get("avg_hr")), _cell(r.get("effort"))]
+        for _, r in m.iterrows()
+    ]
+    return _table("KEY WORKOUTS:", ["date", "type", "mi", "pace", "hr", "effort"], rows)
+
+
+def prs_line(prs):
+    if not prs:
+        return ""
+    return "PRS: " + " ".join(f"{k}={_cell(v)}" for k, v in prs.items())
+
+
+def load_trend(metrics, today=None):
+    """Acute (7d) vs chronic (28d) load; session load = minutes x effort when available."""
+    m = _with_dates(metrics)
+    if m.empty:
+        return ""
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize() + pd.Timedelta(days=1)
+
+    minutes = m["duration_seconds"] / 60.0 if "duration_seconds" in m else None
+    effort = pd.to_numeric(m["effort"], errors="coerce") if "effort" in m else None
+    if minutes is not None and effort is not None:
+        load = (minutes * effort).fillna(m["distance"] * 10)
+        unit = "min×RPE"
+    else:
+        load = m["distance"]
+        unit = "mi"
+
+    def window(days):
+        mask = m["date_dt"] >= today - pd.Timedelta(days=days)
+        return float(load[mask].sum()), float(m.loc[mask, "distance"].sum())
+
+    acute, acute_mi = window(7)
+    chronic, chronic_mi = window(28)
+    chronic_week = chronic / 4.0
+    ratio = acute / chronic_week if chronic_week > 0 else None
+
+    text = (
+        f"LOAD ({unit}): 7d={acute:.0f} ({acute_mi:.1f}mi) "
+        f"28d_avg_wk={chronic_week:.0f} ({chronic_mi / 4:.1f}mi)"
+    )
+    if ratio is not None:
+        trend = "rising" if ratio > 1.1 else "falling" if ratio < 0.9 else "steady"
+        text += f" ACWR={ratio:.2f} ({trend})"
+    return text
+
+
+def recent_runs(metrics, limit=10, since=None):
+    m = _with_dates(metrics).sort_values("date_dt")
+    if since is not None:
+        m = m[m["date_dt"] >= pd.Timestamp(since)]
+    m = m.tail(limit)
+    if m.empty:
+        return ""
+
+    m = m.assign(pace=m["pace_seconds"].map(_pace) if "pace_seconds" in m else "")
+    columns = [c for c in RUN_FIELDS if c in m.columns]
+    rows = []
+    for _, r in m.iterrows():
+        row = [_cell(r[c]) for c in columns]
+        row[columns.index("date")] = str(r["date_dt"].date())
+        rows.append(row)
+    return _table(f"RECENT RUNS (last {len(rows)}):", columns, rows)
+
+
+# -------------------------------------------------------------------
+# Builder
+# -------------------------------------------------------------------
+def build_training_context(
+    metrics: pd.DataFrame,
+    prs=None,
+    sections=("load", "prs", "weekly", "key_workouts", "recent"),
+    weeks=8,
+    recent_limit=10,
+    recent_since=None,
+    max_tokens=DEFAULT_TOKEN_BUDGET,
+) -> str:
+    """
+    Compact, token-budgeted training summary for AI prompts.
+
+    `metrics` is the output of prepare_metrics_df. Sections are listed in
+    priority order; when over budget the recent-runs table is shortened
+    first, then the lowest-priority sections are dropped.
+    """
+    if metrics is None or metrics.empty:
+        return "No runs logged."
+
+    def render(limit, active):
+        parts = []
+        for name in active:
+            if name == "load":
+                parts.append(load_trend(metrics))
+            elif name == "prs":
+                parts.append(prs_line(prs))
+            elif name == "weekly":
+                parts.append(weekly_rollups(metrics, weeks))
+            elif name == "key_workouts":
+                parts.append(key_workouts(metrics))
+            elif name == "recent":
+                parts.append(recent_runs(metrics, limit, recent_since))
+        return "\n\n".join(p for p in parts if p)
+
+    active = list(sections)
+    limit = recent_limit
+    text = render(limit, active)
+
+    while estimate_tokens(text) > max_tokens:
+        if "recent" in active and limit > 3:
+            limit = max(3, limit // 2)
+        elif len(active) > 1:
+            active.pop()
+        else:
+            return text[: max_tokens * CHARS_PER_TOKEN]
+        text = render(limit, active)
+
+    return text
@@ -2,62 +2,676 @@ import streamlit as st
 import requests
 import traceback
 import json
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 
+from requests.adapters import HTTPAdapter
 
-OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+from utils.database import DB_PATH
+
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+OPENAI_URL = f"{OPENAI_BASE_URL}/chat/completions"
+
+# (connect, read) — fail fast on an unreachable host, allow slow completions
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 60
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5      # seconds, doubled per attempt
+BACKOFF_MAX = 20.0
+RETRY_AFTER_MAX = 60.0  # never sleep longer than this on a Retry-After header
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+POOL_SIZE = 10
+
+# Process-wide token bucket: bursts up to RATE_LIMIT_BURST requests, then
+# queue locally at RATE_LIMIT_PER_SEC instead of provoking 429s
+RATE_LIMIT_PER_SEC = 4.0
+RATE_LIMIT_BURST = 8
+
+MODEL = "gpt-4o-mini"
+SYSTEM_PROMPT = "You are a helpful running coach."
+
+# Shown when a stream closes before OpenAI signals the end of the reply
+TRUNCATED_REPLY = "❌ Reply cut off: the connection closed before OpenAI finished. Try again."
+# What followers get when the request they joined was abandoned midway
+CANCELLED_REPLY = "❌ Request was cancelled before it finished. Try again."
+
+# Response cache: SQLite next to run_log.db, fronted by an in-process LRU
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "ai_cache.db")
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_MAX_BYTES = 20 * 1024 * 1024
+MEMORY_CACHE_ENTRIES = 64
+
+
+# =========================================================
+# POOLED KEEP-ALIVE SESSION
+# =========================================================
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Process-wide session so coaching calls reuse TCP+TLS connections.
+    Retries are handled by post_with_retry, not urllib3.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def _retry_after_seconds(response):
+    """Parses Retry-After (delta-seconds or HTTP date); None if absent/invalid."""
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(attempt: int, response=None) -> float:
+    """Server's Retry-After when given, else exponential backoff with full jitter."""
+    retry_after = _retry_after_seconds(response)
+    if retry_after is not None:
+        return min(retry_after, RETRY_AFTER_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+# =========================================================
+# RATE LIMITING (TOKEN BUCKET, SHARED BY ALL SESSIONS)
+# =========================================================
+class TokenBucket:
+    """Allows `burst` requests at once, refilled at `rate` per second."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Blocks until a token is available; returns seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+_rate_limiter = TokenBucket(RATE_LIMIT_PER_SEC, RATE_LIMIT_BURST)
+
+
+def post_with_retry(url, headers, body, debug, stream=False, session=None):
+    """
+    POSTs JSON with retries on connection errors, timeouts, 429 and 5xx.
+    Every attempt (retries included) takes a token from the process-wide
+    rate limiter. Returns the final response (which may still be an error
+    status).
+    """
+    session = session or get_session()
+
+    for attempt in range(MAX_RETRIES + 1):
+        waited = _rate_limiter.acquire()
+        if waited >= 0.05:
+            debug.append(f"🚦 Rate limited locally — waited {waited:.1f}s")
+
+        try:
+            response = session.post(
+                url,
+                headers=headers,
+                json=body,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                stream=stream,
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _retry_delay(attempt)
+            debug.append(f"🔁 {type(e).__name__} — retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            delay = _retry_delay(attempt, response)
+            debug.append(f"🔁 HTTP {response.status_code} — retry {attempt + 1} in {delay:.1f}s")
+            response.close()
+            time.sleep(delay)
+            continue
+
+        return response
+
+
+# =========================================================
+# RESPONSE CACHE (memory LRU → SQLite with TTL + LRU eviction)
+# =========================================================
+_memory_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_ready = False
+_cache_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def cache_key(endpoint: str, model: str, system_prompt: str, prompt: str) -> str:
+    # The endpoint is part of the key so replies from a stand-in or proxy
+    # are never served as answers from another endpoint
+    payload = json.dumps([endpoint, model, system_prompt, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_conn():
+    global _cache_ready
+    conn = sqlite3.connect(CACHE_PATH, timeout=10)
+    if not _cache_ready:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ai_responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                last_access REAL,
+                size INTEGER
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ai_responses_access ON ai_responses(last_access)"
+        )
+        conn.commit()
+        _cache_ready = True
+    return conn
+
+
+def _remember(key, response, created_at):
+    with _cache_lock:
+        _memory_cache[key] = (response, created_at)
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_ENTRIES:
+            _memory_cache.popitem(last=False)
+
+
+def cache_get(key: str):
+    """Returns (response, tier) with tier 'memory' / 'disk', or (None, None)."""
+    now = time.time()
+
+    with _cache_lock:
+        entry = _memory_cache.get(key)
+        if entry is not None:
+            if now - entry[1] < CACHE_TTL_SECONDS:
+                _memory_cache.move_to_end(key)
+                _cache_stats["memory_hits"] += 1
+                return entry[0], "memory"
+            del _memory_cache[key]
+
+    conn = _cache_conn()
+    try:
+        row = conn.execute(
+            "SELECT response, created_at FROM ai_responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and now - row[1] >= CACHE_TTL_SECONDS:
+            conn.execute("DELETE FROM ai_responses WHERE key = ?", (key,))
+            conn.commit()
+            row = None
+        if row is not None:
+            conn.execute("UPDATE ai_responses SET last_access = ? WHERE key = ?", (now, key))
+            conn.commit()
+    finally:
+        conn.close()
+
+    if row is None:
+        with _cache_lock:
+            _cache_stats["misses"] += 1
+        return None, None
+
+    _remember(key, row[0], row[1])
+    with _cache_lock:
+        _cache_stats["disk_hits"] += 1
+    return row[0], "disk"
+
+
+def cache_put(key: str, model: str, response: str):
+    now = time.time()
+    _remember(key, response, now)
+
+    conn = _cache_conn()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, now, now, len(response.encode("utf-8"))),
+            )
+            conn.execute(
+                "DELETE FROM ai_responses WHERE created_at <= ?", (now - CACHE_TTL_SECONDS,)
+            )
+
+            # LRU eviction down to the size budget
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_responses").fetchone()[0]
+            if total > CACHE_MAX_BYTES:
+                for old_key, size in conn.execute(
+                    "SELECT key, size FROM ai_responses ORDER BY last_access ASC"
+                ).fetchall():
+                    if total <= CACHE_MAX_BYTES:
+                        break
+                    conn.execute("DELETE FROM ai_responses WHERE key = ?", (old_key,))
+                    total -= size
+    finally:
+        conn.close()
+
+
+def cache_stats_text() -> str:
+    with _cache_lock:
+        s = dict(_cache_stats)
+    return (
+        f"📦 Cache (this process): {s['memory_hits']} memory hits · "
+        f"{s['disk_hits']} disk hits · {s['misses']} misses"
+    )
+
+
+# =========================================================
+# SINGLE-FLIGHT (IDENTICAL CONCURRENT PROMPTS SHARE ONE REQUEST)
+# =========================================================
+class _Flight:
+    """
+    One in-flight request; followers receive its chunks and final result.
+    A failed flight's result is the '❌ …' error instead of the reply.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.result = None
+        self.done = False
+        self.failed = False
+        self._cond = threading.Condition()
+
+    def publish(self, chunk: str) -> str:
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+        return chunk
+
+    def finish(self, result=None, failed=False):
+        with self._cond:
+            self.result = result if result is not None else "".join(self.chunks)
+            self.failed = failed
+            if not self.chunks and self.result and not failed:
+                self.chunks.append(self.result)
+            self.done = True
+            self._cond.notify_all()
+
+    def wait(self) -> str:
+        with self._cond:
+            self._cond.wait_for(lambda: self.done)
+            return self.result
+
+    def follow(self):
+        """
+        Yields the leader's chunks as they arrive, then stops when it
+        finishes; a failed flight ends with its error.
+        """
+        sent = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.done or len(self.chunks) > sent)
+                new = self.chunks[sent:]
+                finished = self.done
+            sent += len(new)
+            yield from new
+            if finished and sent == len(self.chunks):
+                if self.failed:
+                    if sent:
+                        yield "\n\n"
+                    yield self.result
+                return
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _join_flight(key: str):
+    """Returns (flight, is_leader). The leader must call _land_flight when done."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is not None:
+            return flight, False
+        flight = _flights[key] = _Flight()
+        return flight, True
+
+
+def _land_flight(key: str, flight: _Flight, result=None, failed=False):
+    with _flights_lock:
+        if _flights.get(key) is flight:
+            del _flights[key]
+    flight.finish(result, failed)
 
 
 # =========================================================
 # CALL OPENAI USING RAW HTTPS (NO CLIENT — NO PROXIES BUG)
 # =========================================================
-def call_ai(prompt: str):
+# Endpoint / key overrides — lets the AI path run against a local
+# stand-in (benchmarks/openai_standin.py) instead of api.openai.com
+_endpoint_override = None
+_key_provider = None
+
+
+def configure_ai(base_url=None, key_provider=None):
     """
-    Sends a chat completion request using raw HTTPS.
-    Avoids the Client() constructor completely.
+    Overrides the OpenAI base URL (e.g. "http://127.0.0.1:8765/v1") and/or
+    the API key source (a zero-argument callable). None restores the default.
     """
-    debug = []
+    global _endpoint_override, _key_provider
+    _endpoint_override = base_url
+    _key_provider = key_provider
 
-    if "OPENAI_API_KEY" not in st.secrets:
-        debug.append("❌ OPENAI_API_KEY missing from st.secrets.")
-        st.session_state["debug_info"] = "\n".join(debug)
+
+def _secret(name):
+    try:
+        return st.secrets.get(name)
+    except FileNotFoundError:
+        return None
+
+
+def get_endpoint() -> str:
+    """Chat completions URL: configure_ai → st.secrets / env OPENAI_BASE_URL → OpenAI."""
+    base = _endpoint_override or _secret("OPENAI_BASE_URL") or os.environ.get("OPENAI_BASE_URL")
+    if not base:
+        return OPENAI_URL
+    return f"{base.rstrip('/')}/chat/completions"
+
+
+def get_api_key():
+    """OpenAI key from configure_ai, st.secrets or env OPENAI_API_KEY; None if unset."""
+    if _key_provider is not None:
+        return _key_provider()
+    return _secret("OPENAI_API_KEY") or os.environ.get("OPENAI_API_KEY")
+
+
+def complete(prompt: str, api_key, debug: list, use_cache: bool = True, endpoint=None):
+    """
+    Streamlit-free core of call_ai, safe to run on worker threads:
+    cache lookup → HTTPS request → cache store. Identical prompts already
+    in flight are joined rather than re-sent. Errors come back as
+    '❌ …' strings; diagnostics are appended to `debug`.
+    """
+    debug.append(f"📝 Prompt: {len(prompt)} chars (~{len(prompt) // 4} tokens)")
+
+    endpoint = endpoint or get_endpoint()
+    key = cache_key(endpoint, MODEL, SYSTEM_PROMPT, prompt)
+    if use_cache:
+        cached, tier = cache_get(key)
+        if cached is not None:
+            debug.append(f"⚡ Cache hit ({tier}) — no API call.")
+            return cached
+        debug.append("🔎 Cache miss.")
+
+    if not api_key:
+        debug.append("❌ OPENAI_API_KEY missing from st.secrets and environment.")
         return "❌ Missing API key."
 
-    api_key = st.secrets["OPENAI_API_KEY"]
     debug.append("🔑 API key loaded.")
 
+    flight, leader = _join_flight(key)
+    if not leader:
+        debug.append("🔗 Identical request already in flight — sharing its result.")
+        return flight.wait()
+
+    result = None
+    try:
+        result = _request_completion(prompt, api_key, debug, key, endpoint)
+        return result
+    finally:
+        # result is still None if the leader was interrupted
+        failed = result is None or result.startswith("❌")
+        _land_flight(key, flight, CANCELLED_REPLY if result is None else result, failed)
+
+
+def _request_completion(prompt, api_key, debug, key, endpoint):
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
 
     body = {
-        "model": "gpt-4o-mini",
+        "model": MODEL,
         "messages": [
-            {"role": "system", "content": "You are a helpful running coach."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ]
     }
 
     try:
-        response = requests.post(OPENAI_URL, headers=headers, json=body, timeout=30)
+        response = post_with_retry(endpoint, headers, body, debug)
         debug.append(f"🌐 Status Code: {response.status_code}")
 
         if response.status_code != 200:
             debug.append(f"❌ Error Response:\n{response.text}")
-            st.session_state["debug_info"] = "\n".join(debug)
             return f"❌ OpenAI API Error:\n{response.text}"
 
         data = response.json()
         debug.append("✅ Successfully parsed OpenAI response.")
 
+        content = data["choices"][0]["message"]["content"]
+        cache_put(key, MODEL, content)
+        return content
+
+    except Exception:
+        error_text = traceback.format_exc()
+        debug.append(f"❌ Exception:\n{error_text}")
+        return f"❌ Exception contacting OpenAI:\n{error_text}"
+
+
+def call_ai(prompt: str, use_cache: bool = True):
+    """
+    Sends a chat completion request using raw HTTPS.
+    Avoids the Client() constructor completely.
+
+    Identical requests (model + system prompt + prompt) are answered from
+    the response cache without calling OpenAI.
+    """
+    debug = []
+    result = complete(prompt, get_api_key(), debug, use_cache=use_cache)
+    debug.append(cache_stats_text())
+    st.session_state["debug_info"] = "\n".join(debug)
+    return result
+
+
+# =========================================================
+# CONCURRENT BATCH GENERATION
+# =========================================================
+def call_ai_batch(prompts: dict, max_concurrency: int = 4):
+    """
+    Runs several prompts concurrently on a bounded thread pool.
+
+    `prompts` maps a name to a prompt; returns {name: text}. Cache hits
+    return immediately; network calls go through the shared rate limiter.
+    Wall time is roughly that of the slowest single call.
+    """
+    api_key = get_api_key()
+    endpoint = get_endpoint()
+    logs = {name: [] for name in prompts}
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ai-batch") as pool:
+        futures = {
+            name: pool.submit(complete, prompt, api_key, logs[name], True, endpoint)
+            for name, prompt in prompts.items()
+        }
+        results = {name: future.result() for name, future in futures.items()}
+
+    debug = [f"🧵 Batch of {len(prompts)} prompts · {max_concurrency} concurrent · "
+             f"{time.perf_counter() - started:.2f}s wall"]
+    for name, lines in logs.items():
+        debug.append(f"— {name} —")
+        debug.extend(lines)
+    debug.append(cache_stats_text())
+    st.session_state["debug_info"] = "\n".join(debug)
+
+    return results
+
+
+# =========================================================
+# STREAMING VARIANT (SERVER-SENT EVENTS)
+# =========================================================
+def call_ai_stream(prompt: str, use_cache: bool = True):
+    """
+    Generator version of call_ai for st.write_stream: requests
+    `stream: true` and yields content deltas as SSE events arrive.
+    Time-to-first-token and total time are recorded in the debug panel;
+    last_stream_failed() tells whether the reply ended in an error.
+    """
+    debug = [f"📝 Prompt: {len(prompt)} chars (~{len(prompt) // 4} tokens)"]
+    started = time.perf_counter()
+    # Stays set if the stream is abandoned before it ends
+    st.session_state["ai_stream_failed"] = True
+
+    endpoint = get_endpoint()
+    key = cache_key(endpoint, MODEL, SYSTEM_PROMPT, prompt)
+    if use_cache:
+        cached, tier = cache_get(key)
+        if cached is not None:
+            debug.append(f"⚡ Cache hit ({tier}) — no API call.")
+            debug.append(cache_stats_text())
+            st.session_state["debug_info"] = "\n".join(debug)
+            st.session_state["ai_stream_failed"] = False
+            yield cached
+            return
+        debug.append("🔎 Cache miss.")
+
+    api_key = get_api_key()
+    if not api_key:
+        debug.append("❌ OPENAI_API_KEY missing from st.secrets and environment.")
         st.session_state["debug_info"] = "\n".join(debug)
+        yield "❌ Missing API key."
+        return
+
+    flight, leader = _join_flight(key)
+    if not leader:
+        debug.append("🔗 Identical request already in flight — sharing its stream.")
+        try:
+            yield from flight.follow()
+            st.session_state["ai_stream_failed"] = flight.failed
+        finally:
+            st.session_state["debug_info"] = "\n".join(debug)
+        return
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+    }
+    body = {
+        "model": MODEL,
+        "stream": True,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+    }
+
+    parts = []
+    first_token = None
+    response = None
+    # (result, failed) for the flight, set only once the stream has ended on
+    # its own — closing the generator early (rerun, page change) leaves it None
+    outcome = None
+
+    try:
+        response = post_with_retry(endpoint, headers, body, debug, stream=True)
+        debug.append(f"🌐 Status Code: {response.status_code}")
+
+        if response.status_code != 200:
+            debug.append(f"❌ Error Response:\n{response.text}")
+            outcome = (f"❌ OpenAI API Error:\n{response.text}", True)
+            yield outcome[0]
+            return
 
-        return data["choices"][0]["message"]["content"]
+        response.encoding = "utf-8"
+        # A reply is only complete once [DONE] (or a finish_reason) arrives;
+        # a dropped connection just ends iter_lines early
+        finished = False
+        # chunk_size=None hands over data as soon as it arrives (no 512-byte buffering)
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                finished = True
+                break
+
+            choice = (json.loads(payload).get("choices") or [{}])[0]
+            if choice.get("finish_reason"):
+                finished = True
+            delta = choice.get("delta", {}).get("content")
+            if not delta:
+                continue
+
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            parts.append(delta)
+            yield flight.publish(delta)
+
+        content = "".join(parts)
+        if not finished:
+            debug.append("⚠️ Stream ended before [DONE] — reply is truncated and was not cached.")
+            outcome = (TRUNCATED_REPLY, True)
+        else:
+            outcome = (content, False)
+            if content:
+                cache_put(key, MODEL, content)
+
+        total = time.perf_counter() - started
+        ttft = f"{first_token:.2f}s" if first_token is not None else "n/a"
+        debug.append(f"⏱️ Time to first token: {ttft} · total: {total:.2f}s · {len(parts)} chunks")
+        debug.append(cache_stats_text())
 
     except Exception:
         error_text = traceback.format_exc()
-        st.session_state["debug_info"] = f"❌ Exception:\n{error_text}"
-        return f"❌ Exception contacting OpenAI:\n{error_text}"
+        debug.append(f"❌ Exception:\n{error_text}")
+        outcome = (f"❌ Exception contacting OpenAI:\n{error_text}", True)
+
+    finally:
+        if outcome is None:
+            outcome = (CANCELLED_REPLY, True)
+        _land_flight(key, flight, *outcome)
+        if response is not None:
+            response.close()
+        st.session_state["debug_info"] = "\n".join(debug)
+        st.session_state["ai_stream_failed"] = outcome[1]
+
+    # Errors aren't published as chunks: followers get them from the failed flight
+    result, failed = outcome
+    if failed:
+        if parts:
+            yield "\n\n"
+        yield result
 
 
 # =========================================================
@@ -65,3 +679,8 @@ def call_ai(prompt: str):
 # =========================================================
 def get_debug_info():
     return st.session_state.get("debug_info", "No debug info yet.")
+
+
+def last_stream_failed() -> bool:
+    """Whether the last call_ai_stream reply was an error, truncated or abandoned."""
+    return st.session_state.get("ai_stream_failed", False)
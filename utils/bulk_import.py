@@ -0,0 +1,180 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.database import fetch_run_ids, save_activity_streams_many, upsert_runs
+from utils.streams import (
+    STREAM_SUMMARY_FIELDS,
+    SUPPORTED_EXTENSIONS,
+    build_activity_run,
+    pack_streams,
+    parse_activity_file,
+)
+
+
+# Rows written per transaction by the single writer
+WRITE_BATCH_SIZE = 200
+
+# Below this many files the pool start-up costs more than it saves
+MIN_FILES_FOR_POOL = 4
+
+
+def _is_activity_file(name: str) -> bool:
+    lower = name.lower()
+    if lower.endswith(".gz"):
+        lower = lower[:-3]
+    return lower.endswith(SUPPORTED_EXTENSIONS)
+
+
+# -------------------------------------------------------------------
+# Task discovery
+# -------------------------------------------------------------------
+def collect_archive_tasks(archive_path: str, workdir: str) -> list:
+    """
+    Lists the activity files inside a zip as (archive_path, member) tasks.
+
+    Garmin bulk exports nest further zips (UploadedFiles_*.zip); each is
+    extracted to its own directory under `workdir` (inner archives can
+    repeat the same paths) and expanded in turn.
+    """
+    tasks = []
+    with zipfile.ZipFile(archive_path) as zf:
+        for member in sorted(zf.namelist()):
+            if member.endswith("/"):
+                continue
+            if member.lower().endswith(".zip"):
+                nested = zf.extract(member, tempfile.mkdtemp(dir=workdir))
+                tasks.extend(collect_archive_tasks(nested, workdir))
+            elif _is_activity_file(member):
+                tasks.append((archive_path, member))
+    return tasks
+
+
+def collect_folder_tasks(folder: str) -> list:
+    """Lists activity files under a folder as (None, path) tasks."""
+    tasks = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if _is_activity_file(name):
+                tasks.append((None, os.path.join(root, name)))
+    return sorted(tasks, key=lambda t: t[1])
+
+
+# -------------------------------------------------------------------
+# Worker (runs in a child process)
+# -------------------------------------------------------------------
+_open_archives = {}
+
+
+def _read_task(task) -> bytes:
+    archive_path, name = task
+    if archive_path is None:
+        with open(name, "rb") as f:
+            return f.read()
+
+    # Keep one open handle per archive per worker instead of re-reading
+    # the central directory for every member
+    zf = _open_archives.get(archive_path)
+    if zf is None:
+        zf = _open_archives[archive_path] = zipfile.ZipFile(archive_path)
+    return zf.read(name)
+
+
+def parse_task(task):
+    """
+    Reads, parses, summarizes and encodes one activity file.
+
+    Returns (name, run, blobs, error); never raises so a bad file only
+    produces an error entry.
+    """
+    name = task[1]
+    try:
+        streams = parse_activity_file(name, _read_task(task))
+        return name, build_activity_run(streams), pack_streams(streams), None
+    except Exception as e:
+        return name, None, None, f"{type(e).__name__}: {e}"
+
+
+# -------------------------------------------------------------------
+# Orchestration
+# -------------------------------------------------------------------
+def _write_batch(batch: list):
+    """Single writer: upsert the runs, then attach their streams. Returns (inserted, updated)."""
+    runs = [run for run, _ in batch]
+    counts = upsert_runs(runs, update_cols=STREAM_SUMMARY_FIELDS)
+
+    ids = fetch_run_ids([run["import_key"] for run in runs])
+    save_activity_streams_many(
+        [(ids[run["import_key"]], blobs) for run, blobs in batch]
+    )
+    return counts
+
+
+def import_tasks(tasks: list, progress=None, max_workers=None) -> dict:
+    """
+    Parses tasks in a process pool and writes results in task order.
+
+    `progress(done, total, summary)` is called as each result arrives.
+    Returns the summary: {"imported": runs inserted, "updated": existing
+    runs refreshed by a re-import, "errors": [(name, message), ...]}.
+    The counts grow as batches are written.
+    """
+    total = len(tasks)
+    summary = {"imported": 0, "updated": 0, "errors": []}
+    if not total:
+        return summary
+
+    workers = max_workers or os.cpu_count() or 1
+    batch = []
+
+    def flush():
+        inserted, updated = _write_batch(batch)
+        summary["imported"] += inserted
+        summary["updated"] += updated
+        batch.clear()
+
+    def handle(result, done):
+        name, run, blobs, error = result
+        if error is None:
+            batch.append((run, blobs))
+            if len(batch) >= WRITE_BATCH_SIZE:
+                flush()
+        else:
+            summary["errors"].append((name, error))
+        if progress is not None:
+            progress(done, total, summary)
+
+    if workers == 1 or total < MIN_FILES_FOR_POOL:
+        for done, task in enumerate(tasks, start=1):
+            handle(parse_task(task), done)
+    else:
+        # spawn: forking a multi-threaded server process is not safe
+        ctx = multiprocessing.get_context("spawn")
+        chunksize = max(1, min(32, total // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            results = pool.map(parse_task, tasks, chunksize=chunksize)
+            for done, result in enumerate(results, start=1):
+                handle(result, done)
+
+    if batch:
+        flush()
+
+    return summary
+
+
+def import_archive(archive_path: str, progress=None, max_workers=None) -> dict:
+    """Imports every activity file inside a (possibly nested) zip archive."""
+    workdir = tempfile.mkdtemp(prefix="run_tracker_import_")
+    try:
+        tasks = collect_archive_tasks(archive_path, workdir)
+        return import_tasks(tasks, progress=progress, max_workers=max_workers)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def import_folder(folder: str, progress=None, max_workers=None) -> dict:
+    """Imports every activity file found under a local folder."""
+    return import_tasks(collect_folder_tasks(folder), progress=progress, max_workers=max_workers)
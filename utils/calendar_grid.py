@@ -0,0 +1,154 @@
+import calendar
+import html
+
+import numpy as np
+import pandas as pd
+
+
+# Level 0 = no run; levels 1–4 split your own training days into quartiles
+LEVEL_COLORS = ["#161b22", "#0e4429", "#006d32", "#26a641", "#39d353"]
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+CELL_PX = 11
+GAP_PX = 3
+
+GRID_CSS = (
+    "<style>"
+    + "".join(f".rt-l{i}{{background:{c}}}" for i, c in enumerate(LEVEL_COLORS))
+    + ".rt-cal{display:grid;grid-template-columns:repeat(7,1fr);gap:6px}"
+    ".rt-cal .hd{font-weight:600;text-align:center;opacity:.7;font-size:.85rem}"
+    ".rt-cal .d{min-height:64px;border-radius:8px;padding:6px 8px;font-size:.85rem;"
+    "border:1px solid rgba(255,255,255,.08)}"
+    ".rt-cal .d b{display:block}"
+    ".rt-cal .out{opacity:.35;background:transparent}"
+    ".rt-cal .rt-l3,.rt-cal .rt-l4{color:#0B0E14}"
+    ".rt-heat{display:flex;flex-direction:column;gap:14px;overflow-x:auto}"
+    ".rt-heat .yr{font-weight:600;margin-bottom:4px}"
+    f".rt-heat .mo,.rt-heat .g{{display:grid;grid-auto-flow:column;"
+    f"grid-auto-columns:{CELL_PX}px;gap:{GAP_PX}px}}"
+    ".rt-heat .mo{font-size:.7rem;opacity:.7;height:14px}"
+    f".rt-heat .g{{grid-template-rows:repeat(7,{CELL_PX}px)}}"
+    ".rt-heat .g i{display:block;border-radius:2px}"
+    ".rt-heat .g .e{background:transparent}"
+    f".rt-legend{{display:flex;align-items:center;gap:{GAP_PX}px;font-size:.75rem;"
+    "opacity:.8;margin-top:8px}"
+    f".rt-legend i{{display:inline-block;width:{CELL_PX}px;height:{CELL_PX}px;border-radius:2px}}"
+    "</style>"
+)
+
+
+def color_levels(values, thresholds) -> np.ndarray:
+    """0 for days without a run, else 1–4 by where the value falls among `thresholds`."""
+    v = np.nan_to_num(np.asarray(values, dtype="float64"))
+    if not len(thresholds):
+        return np.zeros(len(v), dtype=np.int64)
+    return np.where(v > 0, 1 + np.searchsorted(thresholds, v, side="right"), 0)
+
+
+def _legend() -> str:
+    swatches = "".join(f'<i class="rt-l{i}"></i>' for i in range(len(LEVEL_COLORS)))
+    return f'<div class="rt-legend">Less {swatches} More</div>'
+
+
+def _title(day, miles, runs, types) -> str:
+    text = f"{day:%a %Y-%m-%d}"
+    if runs:
+        text += f" · {miles:.1f} mi · {runs} run{'s' if runs > 1 else ''}"
+        if types:
+            text += f" · {types}"
+    return html.escape(text, quote=True)
+
+
+# -------------------------------------------------------------------
+# Month view
+# -------------------------------------------------------------------
+def month_grid_html(days: dict, year: int, month: int, thresholds, metric: str = "miles") -> str:
+    """
+    One HTML grid for a month (Mon–Sun rows, leading/trailing days greyed).
+    `days` is {date: {miles, runs, types, ...}} as returned by load_month.
+    """
+    dates = list(calendar.Calendar(firstweekday=0).itermonthdates(year, month))
+    rows = [days.get(d) or {} for d in dates]
+    levels = color_levels([r.get(metric, 0.0) for r in rows], thresholds)
+
+    cells = [f'<div class="hd">{name}</div>' for name in WEEKDAYS]
+    for d, row, level in zip(dates, rows, levels):
+        if d.month != month:
+            cells.append(f'<div class="d out"><b>{d.day}</b></div>')
+            continue
+        miles, runs = row.get("miles", 0.0), row.get("runs", 0)
+        body = f"{miles:.1f} mi" if miles > 0 else ""
+        cells.append(
+            f'<div class="d rt-l{level}" title="{_title(d, miles, runs, row.get("types"))}">'
+            f"<b>{d.day}</b>{body}</div>"
+        )
+
+    return GRID_CSS + '<div class="rt-cal">' + "".join(cells) + "</div>" + _legend()
+
+
+# -------------------------------------------------------------------
+# Year / multi-year heatmap
+# -------------------------------------------------------------------
+def _cell_titles(days: pd.DatetimeIndex, window: pd.DataFrame) -> np.ndarray:
+    """Tooltip per day, built column-wise instead of per-cell formatting."""
+    iso = days.to_numpy().astype("datetime64[D]").astype(str).astype(object)
+    titles = np.asarray(WEEKDAYS, dtype=object)[days.weekday] + " " + iso
+    ran = window["runs"].fillna(0).to_numpy() > 0
+    if ran.any():
+        w = window[ran]
+        runs = w["runs"].astype(int)
+        types = w["types"].fillna("")
+        escaped = types.map({t: f" · {html.escape(t)}" if t else "" for t in types.unique()})
+        detail = (
+            " · " + w["miles"].map("{:.1f}".format) + " mi · "
+            + runs.astype(str) + np.where(runs > 1, " runs", " run") + escaped
+        )
+        titles[ran] = titles[ran] + detail.to_numpy(dtype=object)
+    return titles
+
+
+def _year_block(year: int, lead: int, miles, titles, levels) -> str:
+    # Columns are Mon–Sun weeks; `lead` blanks put Jan 1 on its weekday row
+    cells = '<i class="e"></i>' * lead + "".join(
+        [f'<i class="rt-l{lv}" title="{t}"></i>' for t, lv in zip(titles, levels.tolist())]
+    )
+    months = "".join(
+        f'<span style="grid-column:{(lead + doy) // 7 + 1}">{calendar.month_abbr[m]}</span>'
+        for m, doy in enumerate(_month_starts(year), start=1)
+    )
+    return (
+        f'<div><div class="yr">{year} · {miles.sum():,.0f} mi</div>'
+        f'<div class="mo">{months}</div>'
+        f'<div class="g">{cells}</div></div>'
+    )
+
+
+def _month_starts(year: int):
+    """Zero-based day-of-year of each month's 1st."""
+    lengths = [calendar.monthrange(year, m)[1] for m in range(1, 12)]
+    return np.concatenate(([0], np.cumsum(lengths))).tolist()
+
+
+def heatmap_html(daily: pd.DataFrame, years, thresholds, metric: str = "miles") -> str:
+    """
+    GitHub-style heatmap, one block per year (newest first), as one HTML
+    element. Levels and tooltips are computed for the whole span at once.
+    """
+    years = sorted(years)
+    days = pd.date_range(f"{years[0]}-01-01", f"{years[-1]}-12-31", freq="D")
+    window = daily.reindex(days)
+    titles = _cell_titles(days, window)
+    levels = color_levels(window[metric].to_numpy(dtype="float64"), thresholds)
+    miles = window["miles"].fillna(0.0).to_numpy(dtype="float64")
+
+    # Year boundaries as positions into the span
+    year_of = days.year.to_numpy()
+    starts = np.searchsorted(year_of, years)
+    ends = np.searchsorted(year_of, years, side="right")
+
+    blocks = [
+        _year_block(y, days[a].weekday(), miles[a:b], titles[a:b], levels[a:b])
+        for y, a, b in zip(reversed(years), reversed(starts), reversed(ends))
+    ]
+    return GRID_CSS + f'<div class="rt-heat">{"".join(blocks)}</div>' + _legend()
@@ -0,0 +1,152 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.database import get_data_version
+from utils.efficiency import efficiency_for_version
+from utils.metrics import metrics_for_version
+
+
+# Points sent to the browser per chart: roughly one per horizontal pixel
+DEFAULT_POINTS = 600
+
+# Trend name → chart label
+TRENDS = {
+    "pace": "Pace (min/mi)",
+    "heart_rate": "Avg HR (bpm)",
+    "mileage": "Rolling 7-day miles",
+    "efficiency": "Efficiency trend (%)",
+}
+
+
+# -------------------------------------------------------------------
+# LTTB (largest-triangle-three-buckets)
+# -------------------------------------------------------------------
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Indices of the `n_out` points LTTB keeps from (x, y).
+
+    x must be sorted ascending; neither may contain NaN. The first and last
+    points are always kept; every bucket in between keeps the point forming
+    the largest triangle with the previously kept point and the next
+    bucket's mean, which preserves peaks and dips a plain stride would drop.
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for the n_out - 2 middle buckets
+    every = (n - 2) / (n_out - 2)
+    bounds = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    bounds[-1] = n - 1
+
+    # Prefix sums give every bucket mean in O(1)
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        if i + 2 < len(bounds):
+            nlo, nhi = hi, bounds[i + 2]
+            avg_x = (cx[nhi] - cx[nlo]) / (nhi - nlo)
+            avg_y = (cy[nhi] - cy[nlo]) / (nhi - nlo)
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def downsample(series: pd.Series, points: int = DEFAULT_POINTS) -> pd.Series:
+    """LTTB-downsampled copy of a Series on a sorted DatetimeIndex (NaNs dropped)."""
+    s = series.dropna()
+    if len(s) <= points:
+        return s
+    # Seconds since the first point: keeps the prefix sums well inside float64 precision
+    x = (s.index.asi8 - s.index.asi8[0]) / 1e9
+    return s.iloc[lttb_indices(x, s.to_numpy(dtype="float64"), points)]
+
+
+# -------------------------------------------------------------------
+# Trend series (full resolution)
+# -------------------------------------------------------------------
+def _by_date(frame: pd.DataFrame, values: pd.Series) -> pd.Series:
+    s = pd.Series(values.to_numpy(dtype="float64"), index=pd.DatetimeIndex(frame["date_dt"]))
+    s = s[s.index.notna()].sort_index(kind="stable")
+    s.index.name = "date"
+    return s
+
+
+def build_trend(metrics: pd.DataFrame, name: str, eff: pd.DataFrame = None) -> pd.Series:
+    """One value per run for trend `name`, on a sorted DatetimeIndex."""
+    if name not in TRENDS:
+        raise ValueError(f"trend must be one of {list(TRENDS)}")
+    if metrics.empty:
+        return pd.Series(dtype="float64", index=pd.DatetimeIndex([], name="date"))
+
+    if name == "pace":
+        pace = pd.to_numeric(metrics["pace_seconds"], errors="coerce")
+        s = _by_date(metrics, pace.where(pace > 0) / 60.0)
+    elif name == "heart_rate":
+        hr = metrics["avg_hr"] if "avg_hr" in metrics else pd.Series(np.nan, index=metrics.index)
+        s = _by_date(metrics, hr.where(hr > 0))
+    elif name == "mileage":
+        daily = _by_date(metrics, metrics["distance"].fillna(0.0))
+        s = daily.rolling("7D").sum()
+    else:
+        s = _by_date(eff, eff["efficiency_trend"] * 100.0)
+
+    return s.dropna().rename(TRENDS[name])
+
+
+# -------------------------------------------------------------------
+# Cached by data version (+ range and point budget)
+# -------------------------------------------------------------------
+@st.cache_data(show_spinner=False, max_entries=8)
+def trend_for_version(version: int, name: str) -> pd.Series:
+    eff = efficiency_for_version(version) if name == "efficiency" else None
+    return build_trend(metrics_for_version(version), name, eff)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def chart_for_version(version: int, name: str, start=None, end=None, points: int = DEFAULT_POINTS) -> pd.Series:
+    full = trend_for_version(version, name)
+    # Zooming re-slices the full-resolution series, so detail reappears
+    lo = pd.Timestamp(start) if start else None
+    hi = pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1, "ns") if end else None
+    window = full.loc[lo:hi]
+    return downsample(window, points)
+
+
+def load_trend(name: str, start: date = None, end: date = None, points: int = DEFAULT_POINTS) -> pd.Series:
+    """
+    Chart-ready trend for [start, end] (inclusive dates, None = open),
+    downsampled to at most `points` points.
+    """
+    return chart_for_version(
+        get_data_version(),
+        name,
+        start.isoformat() if start else None,
+        end.isoformat() if end else None,
+        points,
+    )
+
+
+def trend_date_range(name: str):
+    """(first, last) date with a value for trend `name`, or None."""
+    full = trend_for_version(get_data_version(), name)
+    if full.empty:
+        return None
+    return full.index[0].date(), full.index[-1].date()
@@ -0,0 +1,197 @@
+import bisect
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.database import fetch_runs_after, get_data_version
+from utils.efficiency import efficiency_scores
+from utils.metrics import metrics_for_version, prepare_metrics_df
+
+
+# A run's cohort: same run type, same distance band, trailing window
+COHORT_DAYS = 90
+
+# Band edges in miles; band i covers [edge i, edge i+1)
+DISTANCE_BANDS = [0.0, 4.0, 7.0, 10.0, 14.0, 20.0]
+
+UNTYPED = "Other"
+
+# metric → (label, +1 if higher counts as "more" / -1 if lower does, phrase)
+RANK_METRICS = {
+    "pace_seconds": ("Pace", -1, "faster than"),
+    "avg_hr": ("Avg HR", -1, "lower than"),
+    "efficiency": ("Efficiency", 1, "better than"),
+    "effort": ("Effort", 1, "harder than"),
+}
+
+
+def band_label(band: int) -> str:
+    if band < 0:
+        return "unknown distance"
+    lo = DISTANCE_BANDS[band]
+    if band + 1 < len(DISTANCE_BANDS):
+        return f"{lo:g}–{DISTANCE_BANDS[band + 1]:g} mi"
+    return f"{lo:g}+ mi"
+
+
+def cohort_values(metrics: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-run rows for ranking: id, day, cohort key and one column per
+    RANK_METRICS entry (NaN where a run doesn't have the value).
+    """
+    if metrics.empty:
+        return pd.DataFrame(columns=["id", "day", "cohort", *RANK_METRICS])
+
+    def numeric(name):
+        if name not in metrics:
+            return pd.Series(np.nan, index=metrics.index)
+        values = pd.to_numeric(metrics[name], errors="coerce")
+        return values.where(values > 0)
+
+    distance = numeric("distance")
+    run_type = metrics["run_type"].fillna(UNTYPED) if "run_type" in metrics else UNTYPED
+    bands = np.digitize(distance.fillna(-1.0), DISTANCE_BANDS) - 1
+
+    return pd.DataFrame({
+        "id": metrics["id"].to_numpy(),
+        "day": metrics["date_dt"].dt.normalize().to_numpy(),
+        "cohort": list(zip(pd.Series(run_type, index=metrics.index), bands.tolist())),
+        "pace_seconds": numeric("pace_seconds").to_numpy(),
+        "avg_hr": numeric("avg_hr").to_numpy(),
+        "efficiency": efficiency_scores(distance, numeric("duration_seconds"), numeric("avg_hr")),
+        "effort": numeric("effort").to_numpy(),
+    }).dropna(subset=["day"])
+
+
+class CohortIndex:
+    """
+    Sorted metric values per cohort over the trailing COHORT_DAYS days
+    (ending at the latest run), so ranking a value is a binary search.
+
+    add() inserts new runs in place and evicts runs that slid out of the
+    window, so logging a run doesn't rebuild anything.
+    """
+
+    def __init__(self, days: int = COHORT_DAYS):
+        self.days = days
+        self.end = None
+        self.max_id = 0
+        self._days = {}     # cohort → sorted run days (parallel to _runs)
+        self._runs = {}     # cohort → [(id, {metric: value})] in day order
+        self._sorted = {}   # (cohort, metric) → sorted values
+        self._ids = set()
+        self._lock = threading.Lock()
+
+    @property
+    def start(self):
+        return self.end - pd.Timedelta(days=self.days) if self.end is not None else None
+
+    def add(self, rows: pd.DataFrame):
+        """Adds cohort_values rows (runs already in the index are ignored)."""
+        if rows.empty:
+            return
+        with self._lock:
+            self.max_id = max(self.max_id, int(rows["id"].max()))
+            latest = rows["day"].max()
+            if self.end is None or latest > self.end:
+                self.end = latest
+                self._evict()
+
+            fresh = rows[(rows["day"] > self.start) & ~rows["id"].isin(self._ids)]
+            for r in fresh.itertuples(index=False):
+                values = {m: getattr(r, m) for m in RANK_METRICS if pd.notna(getattr(r, m))}
+                at = bisect.bisect_right(self._days.setdefault(r.cohort, []), r.day)
+                self._days[r.cohort].insert(at, r.day)
+                self._runs.setdefault(r.cohort, []).insert(at, (r.id, values))
+                for metric, value in values.items():
+                    bisect.insort(self._sorted.setdefault((r.cohort, metric), []), value)
+                self._ids.add(r.id)
+
+    def _evict(self):
+        start = self.start
+        for cohort, days in self._days.items():
+            cut = bisect.bisect_right(days, start)
+            for run_id, values in self._runs[cohort][:cut]:
+                for metric, value in values.items():
+                    ordered = self._sorted[(cohort, metric)]
+                    del ordered[bisect.bisect_left(ordered, value)]
+                self._ids.discard(run_id)
+            del days[:cut]
+            del self._runs[cohort][:cut]
+
+    def rank(self, row) -> dict:
+        """
+        {metric: (percent, cohort size)} for one cohort_values row, where
+        percent is the share of the cohort (excluding the run itself) the
+        run beats in that metric's direction; ties count half.
+        """
+        out = {}
+        with self._lock:
+            own = 1 if row["id"] in self._ids else 0
+            for metric, (_, direction, _) in RANK_METRICS.items():
+                value = row[metric]
+                if pd.isna(value):
+                    continue
+                ordered = self._sorted.get((row["cohort"], metric), [])
+                n = len(ordered) - own
+                if n <= 0:
+                    continue
+                below = bisect.bisect_left(ordered, value)
+                above = len(ordered) - bisect.bisect_right(ordered, value)
+                ties = len(ordered) - below - above - own
+                beaten = below if direction > 0 else above
+                out[metric] = (100.0 * (beaten + ties / 2) / n, n)
+        return out
+
+
+# -------------------------------------------------------------------
+# Process-wide index, kept current incrementally
+# -------------------------------------------------------------------
+_state = {"version": None, "index": None}
+_state_lock = threading.Lock()
+
+
+def load_cohorts() -> CohortIndex:
+    """
+    The cohort index for the current data version.
+
+    Every row change bumps the data version by one, so when the version has
+    moved by exactly the number of runs added since the index was built,
+    nothing was edited or deleted: those runs are appended in place.
+    Anything else rebuilds from the cached metrics.
+    """
+    version = get_data_version()
+    with _state_lock:
+        index, known = _state["index"], _state["version"]
+        if index is not None and known == version:
+            return index
+
+        if index is not None and known is not None and version > known:
+            new = fetch_runs_after(index.max_id)
+            if len(new) == version - known:
+                index.add(cohort_values(prepare_metrics_df(new)))
+                _state["version"] = version
+                return index
+
+        index = CohortIndex()
+        index.add(cohort_values(metrics_for_version(version)))
+        _state.update(version=version, index=index)
+        return index
+
+
+def rank_run(run: pd.Series) -> dict:
+    """
+    Ranks one run (a row of fetch_runs) against its cohort. Returns
+    {"cohort": label, "ranks": {metric: (percent, n)}}.
+    """
+    values = cohort_values(prepare_metrics_df(run.to_frame().T))
+    if values.empty:
+        return {"cohort": None, "ranks": {}}
+    row = values.iloc[0]
+    index = load_cohorts()
+    run_type, band = row["cohort"]
+    return {
+        "cohort": f"{run_type} · {band_label(band)} · {index.days} days to {index.end:%Y-%m-%d}",
+        "ranks": index.rank(row),
+    }
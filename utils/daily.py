@@ -0,0 +1,116 @@
+import calendar
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.database import get_data_version
+from utils.metrics import metrics_for_version
+
+
+DAILY_COLUMNS = ["miles", "runs", "types", "effort", "load"]
+
+# Values that drive calendar / heatmap colors
+SCALE_METRICS = {"miles": "Miles", "load": "Load (min × effort)"}
+
+# Non-zero days are split into 4 color levels at these quantiles
+SCALE_QUANTILES = [0.25, 0.5, 0.75]
+
+
+def daily_index(metrics: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per day with at least one run, on a sorted DatetimeIndex:
+
+    - miles: total distance
+    - runs: number of runs
+    - types: distinct run types, comma-separated
+    - effort: hardest effort logged that day (NaN if none)
+    - load: sum of minutes x effort (runs without effort count as 10 per mile)
+
+    Built with a single groupby over the whole history.
+    """
+    if metrics.empty or "date_dt" not in metrics:
+        return pd.DataFrame(columns=DAILY_COLUMNS, index=pd.DatetimeIndex([], name="day"))
+
+    m = metrics[metrics["date_dt"].notna()]
+    day = m["date_dt"].dt.normalize().rename("day")
+    effort = pd.to_numeric(m["effort"], errors="coerce") if "effort" in m else pd.Series(float("nan"), index=m.index)
+    run_type = m["run_type"] if "run_type" in m else pd.Series(None, index=m.index, dtype="object")
+
+    distance = pd.to_numeric(m["distance"], errors="coerce").fillna(0.0)
+    minutes = pd.to_numeric(m["duration_seconds"], errors="coerce") / 60.0 if "duration_seconds" in m else np.nan
+    load = (minutes * effort).fillna(distance * 10)
+
+    grouped = pd.DataFrame({
+        "distance": distance,
+        "effort": effort,
+        "load": load,
+    }).groupby(day, sort=True)
+
+    # Distinct types per day: de-duplicate and sort first, then one join per day
+    pairs = (
+        pd.DataFrame({"day": day, "run_type": run_type})
+        .dropna()
+        .drop_duplicates()
+        .sort_values(["day", "run_type"])
+    )
+    types = pairs.groupby("day")["run_type"].agg(", ".join)
+
+    out = pd.DataFrame({
+        "miles": grouped["distance"].sum(),
+        "runs": grouped.size(),
+        "effort": grouped["effort"].max(),
+        "load": grouped["load"].sum(),
+    })
+    out["types"] = types.reindex(out.index).fillna("")
+    return out[DAILY_COLUMNS]
+
+
+def month_days(daily: pd.DataFrame, year: int, month: int) -> dict:
+    """{date: {miles, runs, types, effort}} for the days of one month that have runs."""
+    first = pd.Timestamp(year, month, 1)
+    last = pd.Timestamp(year, month, calendar.monthrange(year, month)[1])
+    window = daily.loc[first:last]
+    return {ts.date(): row for ts, row in zip(window.index, window.to_dict("records"))}
+
+
+def color_thresholds(daily: pd.DataFrame, metric: str = "miles") -> tuple:
+    """Quantile cut points over all days with a run, so colors mean the same in every view."""
+    values = daily[metric].to_numpy(dtype="float64") if metric in daily else np.array([])
+    values = values[values > 0]
+    if not len(values):
+        return ()
+    return tuple(float(q) for q in np.quantile(values, SCALE_QUANTILES))
+
+
+# -------------------------------------------------------------------
+# Cached by data version
+# -------------------------------------------------------------------
+@st.cache_data(show_spinner=False, max_entries=2)
+def daily_for_version(version: int) -> pd.DataFrame:
+    return daily_index(metrics_for_version(version))
+
+
+# Month navigation: each visited month is a small dict, served from cache
+@st.cache_data(show_spinner=False, max_entries=64)
+def month_for_version(version: int, year: int, month: int) -> dict:
+    return month_days(daily_for_version(version), year, month)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def thresholds_for_version(version: int, metric: str) -> tuple:
+    return color_thresholds(daily_for_version(version), metric)
+
+
+def load_daily() -> pd.DataFrame:
+    return daily_for_version(get_data_version())
+
+
+def load_thresholds(metric: str = "miles") -> tuple:
+    return thresholds_for_version(get_data_version(), metric)
+
+
+def load_month(year: int, month: int) -> dict:
+    """Per-day summaries for one month; look days up with .get(date)."""
+    return month_for_version(get_data_version(), int(year), int(month))
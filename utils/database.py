@@ -1,18 +1,26 @@
+import json
+import re
 import sqlite3
+from datetime import datetime
+
 import pandas as pd
 
 DB_PATH = "run_log.db"
 
 
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
     return conn
 
 
 def init_db():
     conn = get_conn()
     c = conn.cursor()
+
+    # WAL lets pages keep reading while a background import is writing
+    c.execute("PRAGMA journal_mode = WAL")
     c.execute(
         """
         CREATE TABLE IF NOT EXISTS runs (
@@ -38,14 +46,136 @@ def init_db():
             training_load REAL,
             hrv REAL,
             performance_condition TEXT,
-            notes TEXT
+            notes TEXT,
+            import_key TEXT,
+            row_version INTEGER NOT NULL DEFAULT 0
         )
         """
     )
+
+    # Older databases predate the import_key / row_version columns
+    existing = {row["name"] for row in c.execute("PRAGMA table_info(runs)")}
+    if "import_key" not in existing:
+        c.execute("ALTER TABLE runs ADD COLUMN import_key TEXT")
+    if "row_version" not in existing:
+        c.execute("ALTER TABLE runs ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0")
+
+    # Natural key for imported runs (NULL for manually logged runs)
+    c.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_runs_import_key ON runs(import_key)"
+    )
+
+    # Covers run pickers: newest-first listing and search without touching
+    # the table rows
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_runs_labels ON runs(date, id, run_type, distance)"
+    )
+
+    # Per-second activity streams, one compressed typed array per channel
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS activity_streams (
+            run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+            start_time TEXT,
+            sample_count INTEGER,
+            time BLOB,
+            distance BLOB,
+            heart_rate BLOB,
+            cadence BLOB,
+            elevation BLOB,
+            lat BLOB,
+            lon BLOB
+        )
+        """
+    )
+
+    # Background import jobs (see utils/import_jobs.py)
+    c.execute(
+        """
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT,
+            filename TEXT,
+            payload_path TEXT,
+            status TEXT,
+            done INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            imported INTEGER DEFAULT 0,
+            updated INTEGER DEFAULT 0,
+            errors TEXT DEFAULT '[]',
+            created_at TEXT,
+            started_at TEXT,
+            finished_at TEXT
+        )
+        """
+    )
+
+    # Jobs queued before re-imports were counted separately
+    if "updated" not in {row["name"] for row in c.execute("PRAGMA table_info(import_jobs)")}:
+        c.execute("ALTER TABLE import_jobs ADD COLUMN updated INTEGER DEFAULT 0")
+
+    # Data version: bumped by triggers on every change to runs, so cached
+    # metrics can be keyed on it instead of re-reading the table
+    c.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+    c.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0)")
+    _backfill_import_keys(c)
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS runs_version_{event.lower()}
+            AFTER {event} ON runs
+            BEGIN
+                UPDATE meta SET value = value + 1 WHERE key = 'data_version';
+            END
+            """
+        )
     conn.commit()
     conn.close()
 
 
+def _backfill_import_keys(c):
+    """
+    One-off migration: give runs imported before import_key existed the key
+    a re-import of the same CSV would produce, so it updates them instead of
+    duplicating them. Those imports stored Garmin's raw date and an "H:MM:SS"
+    duration; manually logged runs always have "0 days HH:MM:SS" and are
+    left alone. Exact duplicates keep a NULL key after the first.
+    """
+    if c.execute("SELECT 1 FROM meta WHERE key = 'import_key_backfill'").fetchone():
+        return
+
+    from utils.garmin import build_import_key
+
+    legacy = c.execute(
+        "SELECT id, date, distance, duration FROM runs "
+        "WHERE import_key IS NULL AND duration IS NOT NULL AND duration NOT LIKE '%day%'"
+    ).fetchall()
+    c.executemany(
+        "UPDATE OR IGNORE runs SET import_key = ? WHERE id = ?",
+        [
+            (build_import_key(date=row["date"], distance=row["distance"], duration=row["duration"]), row["id"])
+            for row in legacy
+        ],
+    )
+    c.execute("INSERT INTO meta (key, value) VALUES ('import_key_backfill', 1)")
+
+
+def get_data_version() -> int:
+    """Counter that changes whenever any run is added, edited or deleted."""
+    conn = get_conn()
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    conn.close()
+
+    if row is None:
+        # Page opened before app.py ran init_db on this database
+        init_db()
+        return 0
+    return row[0]
+
+
 def add_run(data: dict):
     conn = get_conn()
     c = conn.cursor()
@@ -57,27 +187,348 @@ def add_run(data: dict):
     conn.close()
 
 
-def update_run(run_id: int, data: dict):
+def upsert_runs(rows: list, update_cols=None):
+    """
+    Inserts or refreshes imported runs in a single transaction.
+
+    Rows are matched on their import_key; a row whose key already exists
+    only has `update_cols` overwritten (defaults to every supplied column),
+    so manual annotations survive a re-import.
+
+    Returns (inserted, updated).
+    """
+    if not rows:
+        return 0, 0
+
+    cols = list(rows[0].keys())
+    if "import_key" not in cols:
+        raise ValueError("upsert_runs requires an import_key on every row")
+
+    if update_cols is None:
+        update_cols = cols
+    update_cols = [c for c in update_cols if c != "import_key"]
+
+    placeholders = ", ".join(["?"] * len(cols))
+    assignments = ", ".join([f"{c} = excluded.{c}" for c in update_cols])
+    if assignments:
+        # A refreshed import is a change an open bulk edit must not overwrite
+        assignments += ", row_version = row_version + 1"
+    sql = (
+        f"INSERT INTO runs ({', '.join(cols)}) VALUES ({placeholders}) "
+        f"ON CONFLICT(import_key) DO "
+        + (f"UPDATE SET {assignments}" if assignments else "NOTHING")
+    )
+
+    conn = get_conn()
+    try:
+        with conn:
+            # Hold the write lock across both counts so a concurrent writer
+            # (e.g. the background import worker) can't skew them
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            conn.executemany(sql, [[row.get(c) for c in cols] for row in rows])
+            after = conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+    finally:
+        conn.close()
+
+    inserted = after - before
+    return inserted, len(rows) - inserted
+
+
+def fetch_run_ids(import_keys: list) -> dict:
+    """Maps import_key -> run id for the given keys (missing keys are omitted)."""
+    if not import_keys:
+        return {}
+    conn = get_conn()
+    ids = {}
+    # Stay well under SQLite's bound-parameter limit
+    for i in range(0, len(import_keys), 500):
+        chunk = import_keys[i:i + 500]
+        placeholders = ", ".join(["?"] * len(chunk))
+        rows = conn.execute(
+            f"SELECT id, import_key FROM runs WHERE import_key IN ({placeholders})",
+            chunk,
+        ).fetchall()
+        ids.update({row["import_key"]: row["id"] for row in rows})
+    conn.close()
+    return ids
+
+
+def save_activity_streams_many(items: list):
+    """Stores (or replaces) encoded streams for [(run_id, blobs), ...] in one transaction."""
+    if not items:
+        return
+    keys = list(items[0][1].keys())
+    cols = ["run_id"] + keys
+    placeholders = ", ".join(["?"] * len(cols))
+    conn = get_conn()
+    with conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO activity_streams ({', '.join(cols)}) VALUES ({placeholders})",
+            [[run_id] + [blobs.get(k) for k in keys] for run_id, blobs in items],
+        )
+    conn.close()
+
+
+def fetch_activity_streams(run_id: int):
+    conn = get_conn()
+    row = conn.execute(
+        "SELECT * FROM activity_streams WHERE run_id = ?", (run_id,)
+    ).fetchone()
+    conn.close()
+    return dict(row) if row is not None else None
+
+
+def update_run(run_id: int, data: dict, expected_version: int = None) -> bool:
+    """
+    Updates one run. With `expected_version` (the row_version the run was
+    read at) nothing is written if the run changed since; returns whether
+    the update was applied.
+    """
+    return not update_runs([(run_id, expected_version, data)])
+
+
+def delete_run(run_id: int, expected_version: int = None) -> bool:
+    return not delete_runs([(run_id, expected_version)])
+
+
+# -------------------------------------------------------------------
+# Bulk edits with optimistic concurrency
+# -------------------------------------------------------------------
+def _row_versions(conn, run_ids: list) -> dict:
+    """Maps run id -> current row_version (missing ids are omitted)."""
+    versions = {}
+    for i in range(0, len(run_ids), 500):
+        chunk = run_ids[i:i + 500]
+        placeholders = ", ".join(["?"] * len(chunk))
+        rows = conn.execute(
+            f"SELECT id, row_version FROM runs WHERE id IN ({placeholders})", chunk
+        ).fetchall()
+        versions.update({row["id"]: row["row_version"] for row in rows})
+    return versions
+
+
+def _stale_ids(conn, items: list) -> set:
+    """
+    Ids from [(run_id, expected_version, ...)] whose run is gone or has a
+    different row_version (an expected_version of None skips the check).
+    """
+    current = _row_versions(conn, [item[0] for item in items])
+    return {
+        item[0] for item in items
+        if item[0] not in current or (item[1] is not None and current[item[0]] != item[1])
+    }
+
+
+def update_runs(changes: list) -> list:
+    """
+    Applies [(run_id, expected_version, {column: value})] in one transaction.
+
+    The write lock is taken before the versions are checked, so a run that
+    someone else edited or deleted since it was read is skipped rather than
+    overwritten; every other change is applied, bumping its row_version.
+    Changes touching the same columns share one executemany.
+
+    Returns the ids that were skipped as conflicts.
+    """
+    changes = [(int(run_id), expected, data) for run_id, expected, data in changes if data]
+    if not changes:
+        return []
+
+    conn = get_conn()
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = _stale_ids(conn, changes)
+            groups = {}
+            for run_id, _, data in changes:
+                if run_id not in stale:
+                    groups.setdefault(tuple(data), []).append(list(data.values()) + [run_id])
+            for cols, params in groups.items():
+                assignments = ", ".join([f"{c} = ?" for c in cols])
+                conn.executemany(
+                    f"UPDATE runs SET {assignments}, row_version = row_version + 1 WHERE id = ?",
+                    params,
+                )
+    finally:
+        conn.close()
+    return sorted(stale)
+
+
+def delete_runs(items: list) -> list:
+    """
+    Deletes [(run_id, expected_version)] in one transaction, skipping runs
+    that changed (or are already gone) since they were read. Returns the
+    skipped ids.
+    """
+    items = [(int(run_id), expected) for run_id, expected in items]
+    if not items:
+        return []
+
+    conn = get_conn()
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = _stale_ids(conn, items)
+            conn.executemany(
+                "DELETE FROM runs WHERE id = ?",
+                [(run_id,) for run_id, _ in items if run_id not in stale],
+            )
+    finally:
+        conn.close()
+    return sorted(stale)
+
+
+def fetch_runs():
+    conn = get_conn()
+    df = pd.read_sql_query("SELECT * FROM runs ORDER BY date ASC", conn)
+    conn.close()
+    return df
+
+
+def fetch_run(run_id: int):
+    """One run as a dict (None if it doesn't exist)."""
+    conn = get_conn()
+    row = conn.execute("SELECT * FROM runs WHERE id = ?", (int(run_id),)).fetchone()
+    conn.close()
+    return dict(row) if row is not None else None
+
+
+_DATE_PREFIX = re.compile(r"^\d{4}[\d-]*$")
+
+
+def _run_search_filter(query: str):
+    """
+    WHERE clause + params for a run search. Each word must match: a run id
+    (all digits), a date prefix ("2025", "2025-03", "2025-03-14") as an
+    indexed range, or else part of the run type (case-insensitive).
+    """
+    clauses, params = [], []
+    for word in (query or "").split():
+        options = []
+        if word.isdigit():
+            options.append("id = ?")
+            params.append(int(word))
+        if _DATE_PREFIX.match(word):
+            options.append("(date >= ? AND date < ?)")
+            params += [word, word[:-1] + chr(ord(word[-1]) + 1)]
+        if not options:
+            options.append("run_type LIKE ?")
+            params.append(f"%{word}%")
+        clauses.append("(" + " OR ".join(options) + ")")
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def search_run_labels(query: str = "", limit: int = 50, offset: int = 0):
+    """
+    id, date, run_type, distance for runs matching `query`, newest first,
+    one page at a time. Reads only the covering label index.
+    """
+    where, params = _run_search_filter(query)
+    conn = get_conn()
+    df = pd.read_sql_query(
+        f"SELECT id, date, run_type, distance FROM runs{where} "
+        "ORDER BY date DESC, id DESC LIMIT ? OFFSET ?",
+        conn,
+        params=params + [int(limit), int(offset)],
+    )
+    conn.close()
+    return df
+
+
+def search_runs(query: str = "", limit: int = 200, offset: int = 0):
+    """Full rows (row_version included) for one page of a search_run_labels listing."""
+    where, params = _run_search_filter(query)
+    conn = get_conn()
+    df = pd.read_sql_query(
+        f"SELECT * FROM runs{where} ORDER BY date DESC, id DESC LIMIT ? OFFSET ?",
+        conn,
+        params=params + [int(limit), int(offset)],
+    )
+    conn.close()
+    return df
+
+
+def count_runs(query: str = "") -> int:
+    where, params = _run_search_filter(query)
+    conn = get_conn()
+    total = conn.execute(f"SELECT COUNT(*) FROM runs{where}", params).fetchone()[0]
+    conn.close()
+    return total
+
+
+def fetch_runs_after(run_id: int):
+    """Runs with an id above `run_id` (ids only grow, so: runs added since then)."""
+    conn = get_conn()
+    df = pd.read_sql_query(
+        "SELECT * FROM runs WHERE id > ? ORDER BY id ASC", conn, params=(int(run_id),)
+    )
+    conn.close()
+    return df
+
+
+# -------------------------------------------------------------------
+# Import jobs
+# -------------------------------------------------------------------
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def create_import_job(kind: str, filename: str, payload_path: str) -> int:
     conn = get_conn()
     c = conn.cursor()
-    assignments = ", ".join([f"{k} = ?" for k in data.keys()])
-    sql = f"UPDATE runs SET {assignments} WHERE id = ?"
-    values = list(data.values()) + [run_id]
-    c.execute(sql, values)
+    c.execute(
+        "INSERT INTO import_jobs (kind, filename, payload_path, status, created_at) "
+        "VALUES (?, ?, ?, 'queued', ?)",
+        (kind, filename, payload_path, _now()),
+    )
+    job_id = c.lastrowid
     conn.commit()
     conn.close()
+    return job_id
 
 
-def delete_run(run_id: int):
+def claim_next_import_job():
+    """Marks the oldest queued job as running and returns it (or None)."""
     conn = get_conn()
-    c = conn.cursor()
-    c.execute("DELETE FROM runs WHERE id = ?", (run_id,))
+    with conn:
+        row = conn.execute(
+            "SELECT * FROM import_jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE import_jobs SET status = 'running', started_at = ? WHERE id = ?",
+                (_now(), row["id"]),
+            )
+    conn.close()
+    return dict(row) if row is not None else None
+
+
+def update_import_job(job_id: int, **fields):
+    if "errors" in fields:
+        fields["errors"] = json.dumps(fields["errors"])
+    if fields.get("status") in ("done", "failed"):
+        fields["finished_at"] = _now()
+    update = ", ".join([f"{k} = ?" for k in fields.keys()])
+    conn = get_conn()
+    conn.execute(f"UPDATE import_jobs SET {update} WHERE id = ?", list(fields.values()) + [job_id])
     conn.commit()
     conn.close()
 
 
-def fetch_runs():
+def requeue_interrupted_import_jobs():
+    """Jobs left 'running' by a previous server process start over (imports are idempotent)."""
     conn = get_conn()
-    df = pd.read_sql_query("SELECT * FROM runs ORDER BY date ASC", conn)
+    conn.execute("UPDATE import_jobs SET status = 'queued', done = 0 WHERE status = 'running'")
+    conn.commit()
+    conn.close()
+
+
+def fetch_import_jobs(limit: int = 20):
+    conn = get_conn()
+    df = pd.read_sql_query(
+        "SELECT * FROM import_jobs ORDER BY id DESC LIMIT ?", conn, params=(limit,)
+    )
     conn.close()
+    df["errors"] = df["errors"].apply(lambda e: json.loads(e) if e else [])
     return df
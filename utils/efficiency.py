@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.database import get_data_version
+from utils.metrics import metrics_for_version
+
+
+# Score = miles per minute per heartbeat, scaled to a readable number
+EFFICIENCY_SCALE = 1000.0
+
+# Trend: exponentially weighted, time-aware (irregular run spacing is fine)
+TREND_HALFLIFE = "14 days"
+
+# Run types with fewer scored runs than this are normalized against all runs
+MIN_TYPE_RUNS = 5
+
+UNTYPED = "Other"
+
+
+def efficiency_scores(distance, duration_seconds, avg_hr) -> np.ndarray:
+    """
+    Per-run efficiency as float64 (NaN where distance, duration or HR is
+    missing or non-positive). Higher = more distance per heartbeat.
+    """
+    d = np.asarray(distance, dtype="float64")
+    t = np.asarray(duration_seconds, dtype="float64")
+    hr = np.asarray(avg_hr, dtype="float64")
+
+    valid = (d > 0) & (t > 0) & (hr > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        score = d / (t / 60.0) / hr * EFFICIENCY_SCALE
+    return np.where(valid, score, np.nan)
+
+
+def add_efficiency(metrics: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds efficiency columns to a prepare_metrics_df frame:
+
+    - efficiency_score: raw per-run score
+    - efficiency_norm: score / median score for that run type (1.0 = typical),
+      so easy days and workouts sit on one scale
+    - efficiency_pct: percentile rank (0–100) within the run type
+    - efficiency_trend: time-weighted EWM of efficiency_norm
+    """
+    if metrics.empty:
+        return metrics.assign(
+            efficiency_score=pd.Series(dtype="float64"),
+            efficiency_norm=pd.Series(dtype="float64"),
+            efficiency_pct=pd.Series(dtype="float64"),
+            efficiency_trend=pd.Series(dtype="float64"),
+        )
+
+    avg_hr = metrics["avg_hr"] if "avg_hr" in metrics else np.nan
+    score = pd.Series(
+        efficiency_scores(metrics["distance"], metrics["duration_seconds"], avg_hr),
+        index=metrics.index,
+    )
+
+    run_type = metrics["run_type"].fillna(UNTYPED) if "run_type" in metrics else UNTYPED
+    run_type = pd.Series(run_type, index=metrics.index)
+
+    by_type = score.groupby(run_type)
+    type_median = by_type.transform("median")
+    type_pct = by_type.rank(pct=True)
+
+    # Rare run types don't have a stable baseline; compare them to all runs
+    rare = by_type.transform("count") < MIN_TYPE_RUNS
+    norm = score / type_median.where(~rare, score.median())
+    pct = type_pct.where(~rare, score.rank(pct=True)) * 100.0
+
+    # EWM over scored runs only, in date order, then aligned back
+    scored = norm.notna() & metrics["date_dt"].notna()
+    ordered = metrics.loc[scored, "date_dt"].sort_values(kind="stable")
+    trend = pd.Series(np.nan, index=metrics.index)
+    if len(ordered):
+        trend.loc[ordered.index] = (
+            norm.loc[ordered.index]
+            .ewm(halflife=TREND_HALFLIFE, times=ordered.to_numpy())
+            .mean()
+            .to_numpy()
+        )
+
+    return metrics.assign(
+        efficiency_score=score,
+        efficiency_norm=norm,
+        efficiency_pct=pct,
+        efficiency_trend=trend,
+    )
+
+
+def efficiency_summary(eff: pd.DataFrame, lookback_days: int = 28) -> dict:
+    """Headline numbers for a frame returned by add_efficiency."""
+    scored = eff[eff["efficiency_trend"].notna()].sort_values("date_dt")
+    if scored.empty:
+        return {}
+
+    last = scored.iloc[-1]
+    cutoff = last["date_dt"] - pd.Timedelta(days=lookback_days)
+    before = scored[scored["date_dt"] <= cutoff]
+    previous = before["efficiency_trend"].iloc[-1] if not before.empty else np.nan
+
+    return {
+        "trend": float(last["efficiency_trend"]),
+        "trend_change": float(last["efficiency_trend"] - previous) if pd.notna(previous) else None,
+        "last_score": float(last["efficiency_score"]),
+        "last_pct": float(last["efficiency_pct"]),
+        "last_type": last.get("run_type") or UNTYPED,
+        "last_date": last["date_dt"],
+    }
+
+
+# -------------------------------------------------------------------
+# Cached loader (recomputed only when the runs table changes)
+# -------------------------------------------------------------------
+@st.cache_data(show_spinner=False, max_entries=2)
+def efficiency_for_version(version: int) -> pd.DataFrame:
+    return add_efficiency(metrics_for_version(version))
+
+
+def load_efficiency() -> pd.DataFrame:
+    return efficiency_for_version(get_data_version())
@@ -1,11 +1,399 @@
+import hashlib
+import re
+import threading
+
+import numpy as np
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
 
 
+METERS_PER_MILE = 1609.34
+KM_PER_MILE = 1.609344
+FEET_PER_METER = 3.28084
 
+SAMPLE_ROWS = 20
+
+# Columns refreshed when a run is re-imported; manual fields are left alone
+GARMIN_FIELDS = [
+    "date",
+    "run_type",
+    "distance",
+    "duration",
+    "avg_pace",
+    "avg_hr",
+    "max_hr",
+    "cadence",
+    "elevation",
+]
+
+# Fields Garmin doesn't export; only used when a run is first inserted
+MANUAL_DEFAULTS = {
+    "effort": 5,
+    "weather": "",
+    "terrain": "",
+    "felt": "",
+    "pain": "",
+    "sleep": "",
+    "stress": "",
+    "hydration": "",
+    "vo2max": None,
+    "training_load": None,
+    "hrv": None,
+    "performance_condition": "",
+    "notes": "",
+}
+
+
+# -------------------------------------------------------------------
+# Known Garmin Connect export flavors
+# -------------------------------------------------------------------
+# Header aliases per language, after normalization (lowercase, units in
+# parentheses stripped). The first alias found wins, so order matters.
+FLAVORS = {
+    "en": {
+        "activity_id": ["activity id", "activityid"],
+        "activity_type": ["activity type"],
+        "date": ["date", "start time"],
+        "start_time": ["start time"],
+        "distance": ["distance"],
+        "duration": ["time", "duration", "elapsed time", "moving time"],
+        "avg_pace": ["avg pace", "average pace"],
+        "avg_hr": ["avg hr", "average heart rate", "avg heart rate"],
+        "max_hr": ["max hr", "max heart rate", "maximum heart rate"],
+        "cadence": ["avg run cadence", "average run cadence", "avg cadence"],
+        "elevation": ["total ascent", "elevation gain"],
+    },
+    "de": {
+        "activity_id": ["aktivitäts-id", "aktivitäts id"],
+        "activity_type": ["aktivitätstyp"],
+        "date": ["datum"],
+        "start_time": ["startzeit"],
+        "distance": ["distanz", "strecke"],
+        "duration": ["zeit", "dauer"],
+        "avg_pace": ["ø pace", "durchschn. pace"],
+        "avg_hr": ["ø herzfrequenz", "durchschn. hf"],
+        "max_hr": ["maximale herzfrequenz", "max. hf"],
+        "cadence": ["ø schrittfrequenz", "durchschn. schrittfrequenz"],
+        "elevation": ["anstieg gesamt", "gesamtanstieg"],
+    },
+    "es": {
+        "activity_id": ["id de actividad"],
+        "activity_type": ["tipo de actividad"],
+        "date": ["fecha"],
+        "start_time": ["hora de inicio"],
+        "distance": ["distancia"],
+        "duration": ["tiempo", "duración"],
+        "avg_pace": ["ritmo medio"],
+        "avg_hr": ["fc media", "frecuencia cardiaca media"],
+        "max_hr": ["fc máxima", "frecuencia cardiaca máxima"],
+        "cadence": ["cadencia de carrera media", "cadencia media"],
+        "elevation": ["ascenso total"],
+    },
+    "fr": {
+        "activity_id": ["id de l'activité"],
+        "activity_type": ["type d'activité"],
+        "date": ["date"],
+        "start_time": ["heure de début"],
+        "distance": ["distance"],
+        "duration": ["temps", "durée"],
+        "avg_pace": ["allure moyenne"],
+        "avg_hr": ["fréquence cardiaque moyenne", "fc moyenne"],
+        "max_hr": ["fréquence cardiaque maximale", "fc maximale"],
+        "cadence": ["cadence de course moyenne", "cadence moyenne"],
+        "elevation": ["ascension totale", "gain d'altitude"],
+    },
+}
+
+# Display units of each flavor when the header carries no unit hint
+FLAVOR_UNITS = {
+    "en": {"distance": "mi", "elevation": "ft"},
+    "de": {"distance": "km", "elevation": "m"},
+    "es": {"distance": "km", "elevation": "m"},
+    "fr": {"distance": "km", "elevation": "m"},
+}
+
+_UNIT_ALIASES = {
+    "m": "m", "meters": "m", "metres": "m", "mètres": "m", "metros": "m", "meter": "m",
+    "km": "km", "kilometers": "km", "kilometres": "km",
+    "mi": "mi", "miles": "mi",
+    "ft": "ft", "feet": "ft",
+    "s": "s", "sec": "s", "seconds": "s",
+}
+
+_MISSING = {"", "--", "-", "nan", "none"}
+
+
+def _normalize_header(header):
+    """'Distance (km)' -> ('distance', 'km')."""
+    text = str(header).strip().lower()
+    unit = None
+    for inner in re.findall(r"\(([^)]*)\)", text):
+        unit = _UNIT_ALIASES.get(inner.strip(), unit)
+    name = re.sub(r"\([^)]*\)", "", text)
+    return re.sub(r"\s+", " ", name).strip(), unit
+
+
+# -------------------------------------------------------------------
+# Vectorized converters
+# -------------------------------------------------------------------
+def _clean_strings(series):
+    s = series.astype("string").str.strip()
+    return s.mask(s.str.lower().isin(_MISSING))
+
+
+def _to_number(series, decimal_comma):
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    s = _clean_strings(series)
+    if decimal_comma:
+        s = s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    else:
+        s = s.str.replace(",", "", regex=False)
+    return pd.to_numeric(s, errors="coerce").astype(float)
+
+
+def _clock_to_seconds(series):
+    """'1:02:03', '45:12', '00:45:12,3' -> seconds."""
+    s = _clean_strings(series).str.replace(",", ".", regex=False)
+    s = s.where(s.str.count(":") != 1, "00:" + s)
+    return pd.to_timedelta(s, errors="coerce").dt.total_seconds()
+
+
+def _seconds_to_pace(seconds):
+    """Seconds per mile -> 'M:SS' strings (None where missing)."""
+    valid = seconds.notna() & np.isfinite(seconds) & (seconds > 0)
+    whole = seconds.where(valid, 0).round().astype(int)
+    text = (whole // 60).astype(str) + ":" + (whole % 60).astype(str).str.zfill(2)
+    return text.where(valid, None).astype(object)
+
+
+# -------------------------------------------------------------------
+# Detection → plan
+# -------------------------------------------------------------------
+_plan_cache = {}
+_plan_lock = threading.Lock()
+_PLAN_CACHE_SIZE = 32
+
+
+def _looks_like_clock(sample):
+    s = _clean_strings(sample).dropna()
+    return bool(not s.empty and s.str.contains(":", regex=False).mean() > 0.5)
+
+
+def _detect_decimal_comma(sample_values, flavor):
+    values = [v for v in sample_values if v]
+    if any(re.fullmatch(r"-?\d+,\d{1,2}", v) for v in values):
+        return True
+    if any(re.fullmatch(r"-?[\d,]*\.\d+", v) for v in values):
+        return False
+    return flavor != "en"
+
+
+def _detect_plan(df):
+    headers = [_normalize_header(c) for c in df.columns]
+    names = [name for name, _ in headers]
+
+    # Flavor = language whose aliases match the most headers
+    def score(aliases):
+        return sum(any(a in names for a in alias_list) for alias_list in aliases.values())
+
+    flavor = max(FLAVORS, key=lambda f: score(FLAVORS[f]))
+    if score(FLAVORS[flavor]) == 0:
+        raise ValueError("Unrecognized CSV: no Garmin Connect columns found.")
+
+    columns, hints = {}, {}
+    for field, aliases in FLAVORS[flavor].items():
+        for alias in aliases:
+            if alias in names:
+                idx = names.index(alias)
+                columns[field] = df.columns[idx]
+                hints[field] = headers[idx][1]
+                break
+
+    if "date" not in columns or "distance" not in columns:
+        raise ValueError("Garmin CSV is missing a date or distance column.")
+    if columns.get("start_time") == columns["date"]:
+        del columns["start_time"]
+
+    sample = df.head(SAMPLE_ROWS)
+    numeric_text = []
+    for field in ("distance", "elevation", "avg_hr", "max_hr", "cadence"):
+        if field in columns and not pd.api.types.is_numeric_dtype(sample[columns[field]]):
+            numeric_text.extend(_clean_strings(sample[columns[field]]).dropna().tolist())
+
+    plan = {
+        "flavor": flavor,
+        "columns": columns,
+        "decimal_comma": _detect_decimal_comma(numeric_text, flavor),
+    }
+
+    # Distance: header hint > magnitude (meters are in the thousands) > locale
+    distance_unit = hints.get("distance")
+    if distance_unit is None:
+        median = _to_number(sample[columns["distance"]], plan["decimal_comma"]).median()
+        distance_unit = "m" if pd.notna(median) and median > 200 else FLAVOR_UNITS[flavor]["distance"]
+    plan["distance_unit"] = distance_unit
+
+    plan["elevation_unit"] = hints.get("elevation") or FLAVOR_UNITS[flavor]["elevation"]
+
+    if "duration" in columns:
+        plan["duration_clock"] = _looks_like_clock(sample[columns["duration"]])
+
+    date_sample = _clean_strings(sample[columns["date"]]).dropna()
+    plan["date_format"] = None
+    if not date_sample.empty:
+        plan["date_format"] = guess_datetime_format(date_sample.iloc[0], dayfirst=flavor != "en")
+
+    plan["converters"] = _compile_converters(plan)
+    return plan
+
+
+def _compile_converters(plan):
+    """Builds one vectorized Series -> Series function per output column."""
+    dc = plan["decimal_comma"]
+
+    miles_per_unit = {"m": 1 / METERS_PER_MILE, "km": 1 / KM_PER_MILE, "mi": 1.0}[
+        plan["distance_unit"]
+    ]
+    # Garmin reports pace per display unit (meters exports still use km)
+    pace_to_per_mile = KM_PER_MILE if plan["distance_unit"] in ("m", "km") else 1.0
+    feet_per_unit = FEET_PER_METER if plan["elevation_unit"] == "m" else 1.0
+    date_format = plan["date_format"]
+    dayfirst = plan["flavor"] != "en"
+
+    def dates(s):
+        cleaned = _clean_strings(s)
+        if date_format:
+            return pd.to_datetime(cleaned, format=date_format, errors="coerce")
+        return pd.to_datetime(cleaned, dayfirst=dayfirst, errors="coerce")
+
+    if plan.get("duration_clock"):
+        def duration(s):
+            return _clock_to_seconds(s)
+    else:
+        def duration(s):
+            return _to_number(s, dc)
 
-def parse_garmin_csv(df):
-    row = df.iloc[0]
     return {
-        "date": str(row.get("Date", "")),
-        "distance": float(row.get("Distance", 0)),
-}
\ No newline at end of file
+        "date": dates,
+        "distance": lambda s: _to_number(s, dc) * miles_per_unit,
+        "duration": duration,
+        "avg_pace": lambda s: _clock_to_seconds(s) * pace_to_per_mile,
+        "avg_hr": lambda s: _to_number(s, dc),
+        "max_hr": lambda s: _to_number(s, dc),
+        "cadence": lambda s: _to_number(s, dc),
+        "elevation": lambda s: _to_number(s, dc) * feet_per_unit,
+    }
+
+
+def detect_garmin_format(df):
+    """
+    Returns the conversion plan for this export's header, detecting the
+    flavor and units from a small sample the first time a header is seen.
+    """
+    signature = tuple(str(c) for c in df.columns)
+    with _plan_lock:
+        plan = _plan_cache.get(signature)
+    if plan is not None:
+        return plan
+
+    plan = _detect_plan(df)
+    with _plan_lock:
+        if len(_plan_cache) >= _PLAN_CACHE_SIZE:
+            _plan_cache.pop(next(iter(_plan_cache)))
+        _plan_cache[signature] = plan
+    return plan
+
+
+# -------------------------------------------------------------------
+# Parse
+# -------------------------------------------------------------------
+def parse_garmin_csv(df):
+    """
+    Converts a Garmin Connect activities export into `runs` rows.
+
+    Returns a DataFrame with date, run_type, distance (mi), duration,
+    avg_pace (per mile), avg_hr, max_hr, cadence, elevation (ft) and
+    import_key. Rows without a parseable date or distance are dropped.
+    """
+    if df.empty:
+        return pd.DataFrame()
+
+    plan = detect_garmin_format(df)
+    cols = plan["columns"]
+    conv = plan["converters"]
+
+    def column(field):
+        if field in cols:
+            return conv[field](df[cols[field]])
+        return pd.Series(np.nan, index=df.index)
+
+    when = conv["date"](df[cols["date"]])
+    distance = column("distance")
+    duration = column("duration")
+
+    pace = column("avg_pace")
+    derived = duration / distance.where(distance > 0)
+    pace = pace.where(pace.notna(), derived)
+
+    out = pd.DataFrame(index=df.index)
+    has_time = (when - when.dt.normalize()) != pd.Timedelta(0)
+    out["date"] = when.dt.strftime("%Y-%m-%d %H:%M:%S").where(has_time, when.dt.strftime("%Y-%m-%d"))
+    if "activity_type" in cols:
+        out["run_type"] = _clean_strings(df[cols["activity_type"]]).fillna("Run").astype(object)
+    else:
+        out["run_type"] = "Run"
+    out["distance"] = distance.round(2)
+    out["duration"] = [format_duration(s) if pd.notna(s) else None for s in duration]
+    out["avg_pace"] = _seconds_to_pace(pace)
+    for field in ("avg_hr", "max_hr", "cadence"):
+        out[field] = column(field)
+    out["elevation"] = column("elevation").round()
+
+    raw_date = df[cols["date"]].astype(str)
+    raw_start = df[cols["start_time"]].astype(str) if "start_time" in cols else pd.Series("", index=df.index)
+    raw_id = df[cols["activity_id"]] if "activity_id" in cols else pd.Series(None, index=df.index)
+    out["import_key"] = [
+        build_import_key(activity_id=a, date=d, start_time=t, distance=dist, duration=dur or "")
+        for a, d, t, dist, dur in zip(raw_id, raw_date, raw_start, distance, out["duration"])
+    ]
+
+    keep = when.notna() & distance.notna()
+    out = out[keep].reset_index(drop=True)
+
+    # NaN -> None so SQLite stores NULL
+    return out.astype(object).where(out.notna(), None)
+
+
+def format_duration(seconds) -> str:
+    """Stored duration text for every import source: "0 days HH:MM:SS"."""
+    return str(pd.Timedelta(seconds=int(seconds)))
+
+
+def build_import_key(activity_id=None, date="", start_time="", distance=None, duration=""):
+    """
+    Natural key used to deduplicate imported runs.
+
+    Garmin's activity id is used when the export has one; otherwise the key
+    is a content hash of date + start time + distance + duration.
+    """
+    if activity_id is not None and not pd.isna(activity_id) and str(activity_id).strip():
+        activity_id = str(activity_id).strip()
+        if activity_id.endswith(".0"):
+            activity_id = activity_id[:-2]
+        return f"garmin:{activity_id}"
+
+    try:
+        distance = f"{float(distance):.2f}"
+    except (TypeError, ValueError):
+        distance = ""
+
+    # Whole seconds, so "0:36:19" and "0 days 00:36:19" give the same key
+    try:
+        duration = str(int(pd.to_timedelta(str(duration).strip()).total_seconds()))
+    except (TypeError, ValueError):
+        duration = str(duration).strip()
+
+    parts = [str(date).strip(), str(start_time).strip(), distance, duration]
+    digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+    return f"hash:{digest}"
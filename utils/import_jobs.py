@@ -0,0 +1,188 @@
+import logging
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+from utils.bulk_import import import_archive, import_folder
+from utils.database import (
+    DB_PATH,
+    claim_next_import_job,
+    create_import_job,
+    fetch_import_jobs,
+    requeue_interrupted_import_jobs,
+    update_import_job,
+    upsert_runs,
+)
+from utils.garmin import GARMIN_FIELDS, MANUAL_DEFAULTS, parse_garmin_csv
+
+
+# Uploaded payloads are spooled to disk so queued jobs outlive the rerun
+SPOOL_DIR = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "import_spool")
+
+# CSV rows written per transaction (and per progress update)
+CSV_CHUNK_ROWS = 500
+
+# Minimum seconds between progress writes to the job table
+PROGRESS_INTERVAL = 0.5
+
+JOB_KINDS = ("csv", "files", "archive", "folder")
+
+logger = logging.getLogger(__name__)
+
+_worker = None
+_worker_lock = threading.Lock()
+_wake = threading.Event()
+
+
+# -------------------------------------------------------------------
+# Submission
+# -------------------------------------------------------------------
+def submit_import_job(kind: str, filename: str, payload) -> int:
+    """
+    Queues an import and returns its job id.
+
+    payload by kind:
+    - "csv" / "archive": file bytes
+    - "files": list of (name, bytes) activity files
+    - "folder": path of a local folder (read in place)
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"unknown import job kind: {kind}")
+
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    stamp = f"{time.time_ns()}"
+
+    if kind == "folder":
+        payload_path = payload
+    elif kind == "files":
+        payload_path = os.path.join(SPOOL_DIR, f"files_{stamp}")
+        os.makedirs(payload_path)
+        # Index prefix keeps same-named uploads apart; the extension still
+        # picks the parser
+        for i, (name, data) in enumerate(payload):
+            spooled = f"{i:05d}_{os.path.basename(name)}"
+            with open(os.path.join(payload_path, spooled), "wb") as f:
+                f.write(data)
+    else:
+        payload_path = os.path.join(SPOOL_DIR, f"{kind}_{stamp}")
+        with open(payload_path, "wb") as f:
+            f.write(payload)
+
+    job_id = create_import_job(kind, filename, payload_path)
+    ensure_worker()
+    _wake.set()
+    return job_id
+
+
+def list_import_jobs(limit: int = 20):
+    return fetch_import_jobs(limit)
+
+
+# -------------------------------------------------------------------
+# Worker — one thread per server process, so imports never contend
+# with each other for the database
+# -------------------------------------------------------------------
+def ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+        requeue_interrupted_import_jobs()
+        _worker = threading.Thread(target=_worker_loop, name="import-jobs", daemon=True)
+        _worker.start()
+
+
+def _worker_loop():
+    while True:
+        job = claim_next_import_job()
+        if job is None:
+            _wake.wait(timeout=5)
+            _wake.clear()
+            continue
+        _run_job(job)
+
+
+def _progress_reporter(job_id):
+    last = [0.0]
+
+    def report(done, total, imported=None, updated=None):
+        now = time.monotonic()
+        if done < total and now - last[0] < PROGRESS_INTERVAL:
+            return
+        last[0] = now
+        fields = {"done": done, "total": total}
+        if imported is not None:
+            fields.update(imported=imported, updated=updated or 0)
+        update_import_job(job_id, **fields)
+
+    return report
+
+
+def _run_job(job):
+    job_id = job["id"]
+    report = _progress_reporter(job_id)
+
+    try:
+        if job["kind"] == "csv":
+            result = _run_csv_job(job["payload_path"], report)
+        else:
+            def progress(done, total, summary):
+                report(done, total, summary["imported"], summary["updated"])
+
+            if job["kind"] == "archive":
+                result = import_archive(job["payload_path"], progress=progress)
+            else:
+                result = import_folder(job["payload_path"], progress=progress)
+
+        update_import_job(
+            job_id,
+            status="done",
+            imported=result["imported"],
+            updated=result["updated"],
+            errors=[list(e) for e in result["errors"]],
+        )
+    except Exception as e:
+        update_import_job(
+            job_id,
+            status="failed",
+            errors=[[job["filename"], f"{type(e).__name__}: {e}"]],
+        )
+        logger.exception("Import job %s failed", job_id)
+    finally:
+        if job["kind"] != "folder":
+            _remove_payload(job["payload_path"])
+
+
+def _run_csv_job(path, report):
+    df = pd.read_csv(path, sep=None, engine="python")
+    runs = parse_garmin_csv(df)
+
+    errors = []
+    skipped = len(df) - len(runs)
+    if skipped:
+        errors.append(["(csv)", f"Skipped {skipped} rows without a valid date or distance."])
+
+    rows = [{**MANUAL_DEFAULTS, **run} for run in runs.to_dict("records")]
+    total = len(rows)
+    inserted = updated = 0
+
+    for start in range(0, total, CSV_CHUNK_ROWS):
+        chunk = rows[start:start + CSV_CHUNK_ROWS]
+        new, refreshed = upsert_runs(chunk, update_cols=GARMIN_FIELDS)
+        inserted += new
+        updated += refreshed
+        report(min(start + CSV_CHUNK_ROWS, total), total, inserted, updated)
+
+    return {"imported": inserted, "updated": updated, "errors": errors}
+
+
+def _remove_payload(path):
+    if not path or not os.path.exists(path):
+        return
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
@@ -1,6 +1,9 @@
 import pandas as pd
+import streamlit as st
 from datetime import timedelta
 
+from utils.database import fetch_runs, get_data_version
+
 
 def prepare_metrics_df(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -92,3 +95,26 @@ def prepare_metrics_df(df: pd.DataFrame) -> pd.DataFrame:
     m = m.sort_values("date_dt")
 
     return m
+
+
+# ---------------------------
+# CACHED LOADERS
+# ---------------------------
+# Keyed on the database's data version, so every page shares one copy
+# per process until a run is added, edited or deleted.
+@st.cache_data(show_spinner=False, max_entries=2)
+def runs_for_version(version: int) -> pd.DataFrame:
+    return fetch_runs()
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def metrics_for_version(version: int) -> pd.DataFrame:
+    return prepare_metrics_df(runs_for_version(version))
+
+
+def load_runs() -> pd.DataFrame:
+    return runs_for_version(get_data_version())
+
+
+def load_metrics() -> pd.DataFrame:
+    return metrics_for_version(get_data_version())
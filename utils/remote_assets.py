@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
+import requests
+
+from utils.database import DB_PATH
+
+
+# Bundled copies shipped with the app (used until a remote copy is cached)
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+# Downloaded copies + their ETag / Last-Modified, next to run_log.db
+ASSET_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "asset_cache")
+
+# (connect, read) — background fetches only, but never let one hang
+FETCH_TIMEOUT = (3.05, 10)
+
+# Cached copies older than this are revalidated in the background
+REVALIDATE_AFTER_SECONDS = 24 * 3600
+
+# Minimum gap between fetch attempts for one URL (keeps offline reruns quiet)
+RETRY_INTERVAL_SECONDS = 300
+
+_memory = {}
+_refreshing = set()
+_last_attempt = {}
+_lock = threading.Lock()
+
+
+# -------------------------------------------------------------------
+# Disk cache
+# -------------------------------------------------------------------
+def _cache_paths(url: str):
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    base = os.path.join(ASSET_CACHE_DIR, digest)
+    return base + ".json", base + ".meta.json"
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    # Write-then-rename so a reader never sees a half-written file
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def _load_cached(url: str):
+    """Returns (data, meta) from disk, or (None, None)."""
+    data_path, meta_path = _cache_paths(url)
+    data = _read_json(data_path)
+    if data is None:
+        return None, None
+    return data, _read_json(meta_path) or {}
+
+
+# -------------------------------------------------------------------
+# Background fetch / revalidation
+# -------------------------------------------------------------------
+def _refresh(url: str):
+    data_path, meta_path = _cache_paths(url)
+    meta = _read_json(meta_path) or {}
+
+    headers = {}
+    if meta.get("etag") and os.path.exists(data_path):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified") and os.path.exists(data_path):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response = requests.get(url, headers=headers, timeout=FETCH_TIMEOUT)
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+
+        if response.status_code == 304:
+            meta["fetched_at"] = time.time()
+            _write_json(meta_path, meta)
+            data = _read_json(data_path)
+            if data is not None:
+                with _lock:
+                    _memory[url] = (data, meta["fetched_at"])
+            return
+
+        response.raise_for_status()
+        data = response.json()
+
+        _write_json(data_path, data)
+        _write_json(meta_path, {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        })
+        with _lock:
+            _memory[url] = (data, time.time())
+    except (requests.RequestException, ValueError, OSError):
+        # Offline or bad payload: keep serving whatever we already have
+        pass
+    finally:
+        with _lock:
+            _refreshing.discard(url)
+
+
+def _schedule_refresh(url: str):
+    now = time.time()
+    with _lock:
+        if url in _refreshing or now - _last_attempt.get(url, 0) < RETRY_INTERVAL_SECONDS:
+            return
+        _refreshing.add(url)
+        _last_attempt[url] = now
+    threading.Thread(target=_refresh, args=(url,), name="asset-refresh", daemon=True).start()
+
+
+@lru_cache(maxsize=16)
+def _bundled(name: str):
+    return _read_json(os.path.join(ASSETS_DIR, name))
+
+
+# -------------------------------------------------------------------
+# Public API
+# -------------------------------------------------------------------
+def load_json_asset(url: str, fallback: str = None):
+    """
+    JSON asset (e.g. a Lottie animation) without blocking on the network.
+
+    Lookup order: process memory → disk cache → bundled `assets/<fallback>`.
+    Missing or stale copies are fetched in the background (with ETag /
+    Last-Modified revalidation), so a later rerun picks up the remote
+    version. Returns None only if nothing is cached and no fallback exists.
+    """
+    now = time.time()
+
+    with _lock:
+        entry = _memory.get(url)
+    if entry is not None:
+        if now - entry[1] >= REVALIDATE_AFTER_SECONDS:
+            _schedule_refresh(url)
+        return entry[0]
+
+    data, meta = _load_cached(url)
+    if data is not None:
+        fetched_at = meta.get("fetched_at", 0)
+        with _lock:
+            _memory[url] = (data, fetched_at)
+        if now - fetched_at >= REVALIDATE_AFTER_SECONDS:
+            _schedule_refresh(url)
+        return data
+
+    _schedule_refresh(url)
+
+    return _bundled(fallback) if fallback else None
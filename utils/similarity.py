@@ -0,0 +1,152 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.database import get_data_version
+from utils.metrics import metrics_for_version
+
+
+# Numeric features and how much each counts towards "similar"
+FEATURE_WEIGHTS = {
+    "distance": 2.0,
+    "pace_seconds": 2.0,
+    "avg_hr": 1.0,
+    "elevation": 0.5,
+    "cadence": 0.5,
+    "effort": 1.0,
+}
+
+# Weight of each run-type one-hot column (a type mismatch costs 2x this)
+RUN_TYPE_WEIGHT = 1.0
+
+UNTYPED = "Other"
+
+
+class SimilarityIndex(NamedTuple):
+    ids: np.ndarray        # run id per row
+    features: np.ndarray   # (runs, features) float64, NaN = missing
+    weights: np.ndarray    # per feature column
+    columns: list          # feature column names
+    # Precomputed for distances_to (missing features are 0 in all three)
+    present_w: np.ndarray  # weight where the feature is present
+    filled_w: np.ndarray   # feature * weight
+    squared_w: np.ndarray  # feature² * weight
+
+
+# -------------------------------------------------------------------
+# Feature matrix
+# -------------------------------------------------------------------
+def _robust_scale(values: np.ndarray) -> np.ndarray:
+    """Centre on the median and scale by the IQR (std / 1 as fallbacks), keeping NaNs."""
+    if np.isnan(values).all():
+        return values
+    median = np.nanmedian(values)
+    q1, q3 = np.nanpercentile(values, [25, 75])
+    scale = (q3 - q1) / 1.349 or np.nanstd(values) or 1.0
+    return (values - median) / scale
+
+
+def build_index(metrics: pd.DataFrame) -> SimilarityIndex:
+    """Normalized feature matrix over every run in a prepare_metrics_df frame."""
+    if metrics.empty:
+        return _make_index(np.array([], dtype=np.int64), np.empty((0, 0)), np.array([]), [])
+
+    columns, blocks, weights = [], [], []
+    for name, weight in FEATURE_WEIGHTS.items():
+        raw = metrics[name] if name in metrics else pd.Series(np.nan, index=metrics.index)
+        values = pd.to_numeric(raw, errors="coerce").to_numpy(dtype="float64")
+        if name != "elevation":
+            values = np.where(values > 0, values, np.nan)
+        columns.append(name)
+        blocks.append(_robust_scale(values))
+        weights.append(weight)
+
+    run_type = metrics["run_type"].fillna(UNTYPED) if "run_type" in metrics else UNTYPED
+    one_hot = pd.get_dummies(pd.Series(run_type, index=metrics.index), dtype="float64")
+    columns += [f"type:{t}" for t in one_hot.columns]
+    weights += [RUN_TYPE_WEIGHT] * one_hot.shape[1]
+
+    features = np.column_stack(blocks + [one_hot.to_numpy()])
+    return _make_index(
+        metrics["id"].to_numpy(dtype=np.int64),
+        features,
+        np.asarray(weights, dtype="float64"),
+        columns,
+    )
+
+
+def _make_index(ids, features, weights, columns) -> SimilarityIndex:
+    present = ~np.isnan(features)
+    filled = np.where(present, features, 0.0)
+    return SimilarityIndex(
+        ids, features, weights, columns,
+        present_w=present * weights,
+        filled_w=filled * weights,
+        squared_w=filled * filled * weights,
+    )
+
+
+# -------------------------------------------------------------------
+# Queries
+# -------------------------------------------------------------------
+def distances_to(index: SimilarityIndex, row: int) -> np.ndarray:
+    """
+    Weighted RMS distance from run `row` to every run, over the features
+    both runs have (so a missing HR neither helps nor hurts).
+    """
+    q = index.features[row]
+    has_q = ~np.isnan(q)
+    q0 = np.where(has_q, q, 0.0)
+
+    # sum w·(x - q)² over shared features, expanded into matrix-vector
+    # products against the precomputed columns (no (runs x features) temporaries)
+    total_weight = index.present_w @ has_q
+    squared = (
+        index.squared_w @ has_q
+        - 2.0 * (index.filled_w @ q0)
+        + index.present_w @ (q0 * q0)
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        d = np.sqrt(np.clip(squared, 0.0, None) / total_weight)
+    return np.where(total_weight > 0, d, np.inf)
+
+
+def nearest_runs(index: SimilarityIndex, run_id: int, k: int = 5) -> pd.DataFrame:
+    """The `k` runs closest to `run_id` (itself excluded), closest first."""
+    rows = np.flatnonzero(index.ids == run_id)
+    if not len(rows) or len(index.ids) < 2:
+        return pd.DataFrame({"id": pd.Series(dtype="int64"), "distance": pd.Series(dtype="float64")})
+
+    d = distances_to(index, rows[0])
+    d[rows[0]] = np.inf
+
+    k = min(k, len(d) - 1)
+    top = np.argpartition(d, k - 1)[:k]
+    top = top[np.argsort(d[top], kind="stable")]
+    top = top[np.isfinite(d[top])]
+    return pd.DataFrame({"id": index.ids[top], "distance": d[top]})
+
+
+def similarity_pct(distance) -> np.ndarray:
+    """Display score: 100% = identical, falling off with distance."""
+    return 100.0 / (1.0 + np.asarray(distance, dtype="float64"))
+
+
+# -------------------------------------------------------------------
+# Cached by data version
+# -------------------------------------------------------------------
+@st.cache_data(show_spinner=False, max_entries=2)
+def index_for_version(version: int) -> SimilarityIndex:
+    return build_index(metrics_for_version(version))
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def similar_for_version(version: int, run_id: int, k: int) -> pd.DataFrame:
+    return nearest_runs(index_for_version(version), run_id, k)
+
+
+def load_similar(run_id: int, k: int = 5) -> pd.DataFrame:
+    """Top-k most similar runs to `run_id`: columns id, distance."""
+    return similar_for_version(get_data_version(), int(run_id), k)
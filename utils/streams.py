@@ -0,0 +1,493 @@
+import gzip
+import io
+import struct
+import zlib
+import xml.etree.ElementTree as ET
+import numpy as np
+import pandas as pd
+
+from utils.garmin import build_import_key, format_duration
+
+
+# -------------------------------------------------------------------
+# Storage layout
+# -------------------------------------------------------------------
+# One typed little-endian array per channel, zlib-compressed on disk.
+# Missing HR / cadence samples are stored as 0, missing floats as NaN.
+STREAM_DTYPES = {
+    "time": np.dtype("<u4"),        # seconds since start_time
+    "distance": np.dtype("<f4"),    # meters, cumulative
+    "heart_rate": np.dtype("u1"),   # bpm
+    "cadence": np.dtype("u1"),      # steps per minute
+    "elevation": np.dtype("<f4"),   # meters
+    "lat": np.dtype("<f4"),         # degrees
+    "lon": np.dtype("<f4"),         # degrees
+}
+
+SUPPORTED_EXTENSIONS = (".fit", ".gpx", ".tcx")
+
+# `runs` columns that are derived from streams (refreshed on re-import)
+STREAM_SUMMARY_FIELDS = [
+    "date",
+    "distance",
+    "duration",
+    "avg_pace",
+    "avg_hr",
+    "max_hr",
+    "cadence",
+    "elevation",
+]
+
+METERS_PER_MILE = 1609.34
+FEET_PER_METER = 3.28084
+
+
+# -------------------------------------------------------------------
+# Encode / decode
+# -------------------------------------------------------------------
+def encode_streams(streams: dict) -> dict:
+    """Packs stream arrays into compressed blobs keyed by channel name."""
+    blobs = {}
+    for channel, dtype in STREAM_DTYPES.items():
+        arr = streams.get(channel)
+        if arr is None:
+            blobs[channel] = None
+            continue
+        packed = np.ascontiguousarray(arr, dtype=dtype)
+        blobs[channel] = zlib.compress(packed.tobytes(), 6)
+    return blobs
+
+
+def decode_streams(blobs: dict) -> dict:
+    """
+    Inverse of encode_streams. Arrays are read-only views over the
+    decompressed buffers (np.frombuffer), so no extra copy is made.
+    """
+    streams = {
+        "start_time": blobs.get("start_time"),
+        "sample_count": blobs.get("sample_count"),
+    }
+    for channel, dtype in STREAM_DTYPES.items():
+        blob = blobs.get(channel)
+        streams[channel] = (
+            None if blob is None else np.frombuffer(zlib.decompress(blob), dtype=dtype)
+        )
+    return streams
+
+
+def pack_streams(streams: dict) -> dict:
+    """encode_streams plus the metadata columns of activity_streams."""
+    blobs = encode_streams(streams)
+    blobs["start_time"] = streams["start_time"]
+    blobs["sample_count"] = len(streams["time"])
+    return blobs
+
+
+# -------------------------------------------------------------------
+# Normalization shared by all parsers
+# -------------------------------------------------------------------
+def _haversine_cumulative(lat, lon):
+    lat_r = np.radians(lat.astype(np.float64))
+    lon_r = np.radians(lon.astype(np.float64))
+    dlat = np.diff(lat_r)
+    dlon = np.diff(lon_r)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_r[:-1]) * np.cos(lat_r[1:]) * np.sin(dlon / 2) ** 2
+    step = 2 * 6371008.8 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    step = np.nan_to_num(step, nan=0.0)
+    return np.concatenate([[0.0], np.cumsum(step)])
+
+
+def _build_streams(epoch_seconds, distance=None, heart_rate=None, cadence=None,
+                   elevation=None, lat=None, lon=None):
+    """
+    Turns raw per-sample columns (float arrays, NaN = missing) into the
+    canonical stream dict: sorted by time, time relative to the first sample.
+    """
+    t = np.asarray(epoch_seconds, dtype=np.float64)
+    valid = ~np.isnan(t)
+    if not valid.any():
+        raise ValueError("activity has no timestamped samples")
+
+    order = np.argsort(t[valid], kind="stable")
+
+    def column(values):
+        if values is None:
+            return None
+        arr = np.asarray(values, dtype=np.float64)[valid][order]
+        return None if np.isnan(arr).all() else arr
+
+    t = t[valid][order]
+    start = t[0]
+
+    lat = column(lat)
+    lon = column(lon)
+    distance = column(distance)
+    if distance is None and lat is not None and lon is not None:
+        has_fix = ~(np.isnan(lat) | np.isnan(lon))
+        distance = np.full(len(t), np.nan)
+        if has_fix.sum() > 1:
+            distance[has_fix] = _haversine_cumulative(lat[has_fix], lon[has_fix])
+    if distance is not None:
+        # Carry the last known cumulative distance through GPS dropouts
+        distance = pd.Series(distance).ffill().fillna(0.0).to_numpy()
+
+    def counts(values):
+        arr = column(values)
+        if arr is None:
+            return None
+        return np.clip(np.nan_to_num(arr, nan=0.0), 0, 255).round()
+
+    return {
+        "start_time": pd.Timestamp(start, unit="s", tz="UTC").isoformat(),
+        "time": np.round(t - start),
+        "distance": distance,
+        "heart_rate": counts(heart_rate),
+        "cadence": counts(cadence),
+        "elevation": column(elevation),
+        "lat": lat,
+        "lon": lon,
+    }
+
+
+def _to_epoch_seconds(time_strings):
+    ts = pd.to_datetime(pd.Series(time_strings, dtype="object"), utc=True, errors="coerce")
+    return (ts - pd.Timestamp(0, tz="UTC")).dt.total_seconds().to_numpy()
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# -------------------------------------------------------------------
+# GPX
+# -------------------------------------------------------------------
+def parse_gpx(data: bytes) -> dict:
+    times, lat, lon, ele, hr, cad = [], [], [], [], [], []
+
+    for _, elem in ET.iterparse(io.BytesIO(data), events=("end",)):
+        if _local(elem.tag) != "trkpt":
+            continue
+
+        point = {"time": None, "ele": np.nan, "hr": np.nan, "cad": np.nan}
+        for child in elem.iter():
+            name = _local(child.tag)
+            if name == "time":
+                point["time"] = child.text
+            elif name == "ele":
+                point["ele"] = _float(child.text)
+            elif name == "hr":
+                point["hr"] = _float(child.text)
+            elif name == "cad":
+                point["cad"] = _float(child.text)
+
+        times.append(point["time"])
+        lat.append(_float(elem.get("lat")))
+        lon.append(_float(elem.get("lon")))
+        ele.append(point["ele"])
+        hr.append(point["hr"])
+        # Garmin records strides (one foot) per minute
+        cad.append(point["cad"] * 2)
+        elem.clear()
+
+    if not times:
+        raise ValueError("GPX file has no track points")
+
+    return _build_streams(
+        _to_epoch_seconds(times), heart_rate=hr, cadence=cad,
+        elevation=ele, lat=lat, lon=lon,
+    )
+
+
+# -------------------------------------------------------------------
+# TCX
+# -------------------------------------------------------------------
+def parse_tcx(data: bytes) -> dict:
+    times, lat, lon, ele, dist, hr, cad = [], [], [], [], [], [], []
+
+    for _, elem in ET.iterparse(io.BytesIO(data), events=("end",)):
+        if _local(elem.tag) != "Trackpoint":
+            continue
+
+        point = {
+            "Time": None, "LatitudeDegrees": np.nan, "LongitudeDegrees": np.nan,
+            "AltitudeMeters": np.nan, "DistanceMeters": np.nan, "Value": np.nan,
+            "Cadence": np.nan, "RunCadence": np.nan,
+        }
+        for child in elem.iter():
+            name = _local(child.tag)
+            if name == "Time":
+                point["Time"] = child.text
+            elif name in point:
+                point[name] = _float(child.text)
+
+        times.append(point["Time"])
+        lat.append(point["LatitudeDegrees"])
+        lon.append(point["LongitudeDegrees"])
+        ele.append(point["AltitudeMeters"])
+        dist.append(point["DistanceMeters"])
+        hr.append(point["Value"])
+        strides = point["RunCadence"]
+        if np.isnan(strides):
+            strides = point["Cadence"]
+        cad.append(strides * 2)
+        elem.clear()
+
+    if not times:
+        raise ValueError("TCX file has no track points")
+
+    return _build_streams(
+        _to_epoch_seconds(times), distance=dist, heart_rate=hr, cadence=cad,
+        elevation=ele, lat=lat, lon=lon,
+    )
+
+
+# -------------------------------------------------------------------
+# FIT (binary) — minimal decoder for `record` messages
+# -------------------------------------------------------------------
+FIT_EPOCH_OFFSET = 631065600  # 1989-12-31T00:00:00Z
+FIT_RECORD_MESSAGE = 20
+SEMICIRCLE_TO_DEG = 180.0 / 2 ** 31
+
+# base type number -> (struct code, size, invalid value)
+_FIT_BASE_TYPES = {
+    0x00: ("B", 1, 0xFF),
+    0x01: ("b", 1, 0x7F),
+    0x02: ("B", 1, 0xFF),
+    0x03: ("h", 2, 0x7FFF),
+    0x04: ("H", 2, 0xFFFF),
+    0x05: ("i", 4, 0x7FFFFFFF),
+    0x06: ("I", 4, 0xFFFFFFFF),
+    0x08: ("f", 4, None),
+    0x09: ("d", 8, None),
+    0x0A: ("B", 1, 0x00),
+    0x0B: ("H", 2, 0x0000),
+    0x0C: ("I", 4, 0x00000000),
+    0x0E: ("q", 8, 0x7FFFFFFFFFFFFFFF),
+    0x0F: ("Q", 8, 0xFFFFFFFFFFFFFFFF),
+    0x10: ("Q", 8, 0x0000000000000000),
+}
+
+# record field number -> output column
+_FIT_RECORD_FIELDS = {
+    253: "timestamp",
+    0: "lat",
+    1: "lon",
+    2: "altitude",
+    3: "heart_rate",
+    4: "cadence",
+    5: "distance",
+    53: "fractional_cadence",
+    78: "enhanced_altitude",
+}
+
+
+def _fit_definition(data, pos, has_dev_fields):
+    big_endian = data[pos + 1] == 1
+    global_num = struct.unpack_from(">H" if big_endian else "<H", data, pos + 2)[0]
+    n_fields = data[pos + 4]
+    pos += 5
+
+    fmt = ">" if big_endian else "<"
+    wanted = {}
+    index = 0
+    for _ in range(n_fields):
+        field_num, size, base = data[pos], data[pos + 1], data[pos + 2] & 0x1F
+        pos += 3
+        code, base_size, invalid = _FIT_BASE_TYPES.get(base, (None, size, None))
+        if code is not None and size == base_size:
+            fmt += code
+            if global_num == FIT_RECORD_MESSAGE and field_num in _FIT_RECORD_FIELDS:
+                wanted[_FIT_RECORD_FIELDS[field_num]] = (index, invalid)
+            index += 1
+        else:
+            fmt += f"{size}x"
+
+    if has_dev_fields:
+        n_dev = data[pos]
+        pos += 1
+        for _ in range(n_dev):
+            fmt += f"{data[pos + 1]}x"
+            pos += 3
+
+    layout = struct.Struct(fmt)
+    return pos, {"global": global_num, "struct": layout, "wanted": wanted}
+
+
+def parse_fit(data: bytes) -> dict:
+    if len(data) < 12 or data[8:12] != b".FIT":
+        raise ValueError("not a FIT file")
+
+    header_size = data[0]
+    data_size = struct.unpack_from("<I", data, 4)[0]
+    end = min(header_size + data_size, len(data))
+    pos = header_size
+
+    definitions = {}
+    columns = {name: [] for name in _FIT_RECORD_FIELDS.values()}
+    last_timestamp = None
+
+    while pos < end:
+        header = data[pos]
+        pos += 1
+
+        if header & 0x80:
+            # Compressed timestamp header (always a data message)
+            local = (header >> 5) & 0x03
+            offset = header & 0x1F
+            timestamp = None
+            if last_timestamp is not None:
+                timestamp = (last_timestamp & ~0x1F) + offset
+                if offset < (last_timestamp & 0x1F):
+                    timestamp += 0x20
+        elif header & 0x40:
+            pos, definitions[header & 0x0F] = _fit_definition(data, pos, header & 0x20)
+            continue
+        else:
+            local = header & 0x0F
+            timestamp = None
+
+        definition = definitions.get(local)
+        if definition is None:
+            raise ValueError("FIT data message without a definition")
+
+        layout = definition["struct"]
+        if definition["global"] != FIT_RECORD_MESSAGE:
+            pos += layout.size
+            continue
+
+        values = layout.unpack_from(data, pos)
+        pos += layout.size
+
+        sample = {}
+        for name, (index, invalid) in definition["wanted"].items():
+            value = values[index]
+            sample[name] = np.nan if value == invalid else value
+
+        if not np.isnan(sample.get("timestamp", np.nan)):
+            timestamp = int(sample["timestamp"])
+        if timestamp is not None:
+            last_timestamp = timestamp
+        sample["timestamp"] = np.nan if timestamp is None else timestamp
+
+        for name in columns:
+            columns[name].append(sample.get(name, np.nan))
+
+    if not columns["timestamp"]:
+        raise ValueError("FIT file has no record messages")
+
+    col = {name: np.asarray(values, dtype=np.float64) for name, values in columns.items()}
+
+    altitude = col["enhanced_altitude"]
+    altitude = np.where(np.isnan(altitude), col["altitude"], altitude) / 5.0 - 500.0
+
+    # Running cadence is strides per minute (+ a fractional part)
+    cadence = (col["cadence"] + np.nan_to_num(col["fractional_cadence"] / 128.0)) * 2
+
+    return _build_streams(
+        col["timestamp"] + FIT_EPOCH_OFFSET,
+        distance=col["distance"] / 100.0,
+        heart_rate=col["heart_rate"],
+        cadence=cadence,
+        elevation=altitude,
+        lat=col["lat"] * SEMICIRCLE_TO_DEG,
+        lon=col["lon"] * SEMICIRCLE_TO_DEG,
+    )
+
+
+# -------------------------------------------------------------------
+# Dispatch + summary
+# -------------------------------------------------------------------
+_PARSERS = {".fit": parse_fit, ".gpx": parse_gpx, ".tcx": parse_tcx}
+
+
+def parse_activity_file(name: str, data: bytes) -> dict:
+    """Parses a FIT / GPX / TCX file (optionally .gz compressed) into streams."""
+    lower = name.lower()
+    if lower.endswith(".gz"):
+        data = gzip.decompress(data)
+        lower = lower[:-3]
+
+    for ext, parser in _PARSERS.items():
+        if lower.endswith(ext):
+            return parser(data)
+
+    raise ValueError(f"unsupported activity file: {name}")
+
+
+def _format_pace(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def summarize_streams(streams: dict) -> dict:
+    """Derives the `runs` summary columns from per-second streams."""
+    t = streams["time"]
+    duration = float(t[-1]) if len(t) else 0.0
+
+    distance_m = 0.0
+    if streams.get("distance") is not None:
+        distance_m = float(np.nanmax(streams["distance"]))
+    distance_mi = distance_m / METERS_PER_MILE
+
+    # start_time is UTC; file the run under the local calendar day it was run
+    # on (an evening run west of UTC would otherwise land on the next day)
+    local_start = pd.Timestamp(streams["start_time"]).to_pydatetime().astimezone()
+
+    summary = {
+        "date": local_start.date().isoformat(),
+        "distance": round(distance_mi, 2),
+        "duration": format_duration(duration),
+        "avg_pace": _format_pace(duration / distance_mi) if distance_mi > 0 else None,
+        "avg_hr": None,
+        "max_hr": None,
+        "cadence": None,
+        "elevation": None,
+    }
+
+    hr = streams.get("heart_rate")
+    if hr is not None and (hr > 0).any():
+        summary["avg_hr"] = round(float(hr[hr > 0].mean()), 1)
+        summary["max_hr"] = float(hr.max())
+
+    cad = streams.get("cadence")
+    if cad is not None and (cad > 0).any():
+        summary["cadence"] = round(float(cad[cad > 0].mean()), 1)
+
+    ele = streams.get("elevation")
+    if ele is not None:
+        ele = ele[~np.isnan(ele)]
+        if len(ele) > 1:
+            # Light smoothing so barometer noise doesn't inflate the gain
+            smooth = pd.Series(ele).rolling(5, min_periods=1, center=True).mean().to_numpy()
+            gain = np.clip(np.diff(smooth), 0, None).sum()
+            summary["elevation"] = round(float(gain) * FEET_PER_METER)
+
+    return summary
+
+
+def build_activity_run(streams: dict) -> dict:
+    """
+    Full `runs` row for an activity file, keyed for idempotent re-import.
+    Files don't say what kind of run it was or how hard it felt: run_type is
+    the generic "Run" (as for CSV rows without an activity type) and effort
+    is left NULL, so effort-based metrics skip the run until it's edited.
+    """
+    summary = summarize_streams(streams)
+    return {
+        **summary,
+        "run_type": "Run",
+        "effort": None,
+        # Keyed on the UTC start, which doesn't depend on the local timezone
+        "import_key": build_import_key(
+            start_time=streams["start_time"],
+            distance=summary["distance"],
+            duration=summary["duration"],
+        ),
+    }
@@ -0,0 +1,124 @@
+from datetime import date
+
+import pandas as pd
+import streamlit as st
+
+from utils.database import get_data_version
+from utils.metrics import metrics_for_version
+
+
+# granularity → (resample rule, period frequency); weeks run Mon–Sun
+GRANULARITIES = {
+    "week": ("W-SUN", "W-SUN"),
+    "month": ("MS", "M"),
+    "year": ("YS", "Y"),
+}
+
+LABEL_FORMATS = {"week": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+
+VOLUME_COLUMNS = ["miles", "runs", "hours", "long_run"]
+
+
+def _check(granularity):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {list(GRANULARITIES)}")
+
+
+def index_runs(metrics: pd.DataFrame) -> pd.DataFrame:
+    """Minimal volume frame on a sorted DatetimeIndex (rows without a date dropped)."""
+    if metrics.empty or "date_dt" not in metrics:
+        return pd.DataFrame(
+            {"distance": [], "duration_seconds": []},
+            index=pd.DatetimeIndex([], name="date_dt"),
+        )
+
+    m = metrics.loc[metrics["date_dt"].notna(), ["date_dt", "distance", "duration_seconds"]]
+    m = m.assign(
+        distance=pd.to_numeric(m["distance"], errors="coerce").fillna(0.0),
+        duration_seconds=pd.to_numeric(m["duration_seconds"], errors="coerce").fillna(0.0),
+    )
+    return m.set_index("date_dt").sort_index(kind="stable")
+
+
+def aggregate_volume(indexed: pd.DataFrame, granularity: str, start=None, end=None) -> pd.DataFrame:
+    """
+    Miles / runs / hours / longest run per period, indexed by Period.
+
+    Gaps are zero-filled, and the range runs through `end` (default: the
+    current period) so recent empty weeks show as 0 rather than vanishing.
+    """
+    _check(granularity)
+    rule, freq = GRANULARITIES[granularity]
+
+    end_period = pd.Timestamp(end or pd.Timestamp.today()).to_period(freq)
+    if start is not None:
+        start_period = pd.Timestamp(start).to_period(freq)
+    elif not indexed.empty:
+        start_period = indexed.index[0].to_period(freq)
+    else:
+        start_period = end_period
+
+    resampled = indexed["distance"].resample(rule)
+    table = pd.DataFrame({
+        "miles": resampled.sum(),
+        "runs": resampled.count(),
+        "hours": indexed["duration_seconds"].resample(rule).sum() / 3600.0,
+        "long_run": resampled.max(),
+    })
+    table.index = table.index.to_period(freq)
+
+    periods = pd.period_range(start_period, max(start_period, end_period), freq=freq)
+    table = table.reindex(periods).fillna(0.0)
+    table["runs"] = table["runs"].astype(int)
+    table.index.name = granularity
+    return table
+
+
+def last_n_periods(indexed: pd.DataFrame, granularity: str, n: int, today=None) -> pd.DataFrame:
+    """
+    Volume for the last `n` periods (including the current one).
+
+    The sorted index is sliced at the first period's start before
+    aggregating, so older history is never scanned.
+    """
+    _check(granularity)
+    _, freq = GRANULARITIES[granularity]
+
+    current = pd.Timestamp(today or pd.Timestamp.today()).to_period(freq)
+    first = current - (n - 1)
+    if not indexed.empty:
+        # Don't pad with empty periods from before the first run
+        first = max(first, min(current, indexed.index[0].to_period(freq)))
+    recent = indexed.loc[first.start_time:]
+    return aggregate_volume(recent, granularity, start=first.start_time, end=current.start_time)
+
+
+def format_volume(table: pd.DataFrame, granularity: str) -> pd.DataFrame:
+    """Display copy: readable period labels and rounded numbers."""
+    fmt = LABEL_FORMATS[granularity]
+    out = table.round({"miles": 1, "hours": 1, "long_run": 1})
+    out.index = [p.start_time.strftime(fmt) for p in table.index]
+    out.index.name = granularity.title()
+    return out
+
+
+# -------------------------------------------------------------------
+# Cached by data version
+# -------------------------------------------------------------------
+@st.cache_data(show_spinner=False, max_entries=2)
+def indexed_runs_for_version(version: int) -> pd.DataFrame:
+    return index_runs(metrics_for_version(version))
+
+
+# `today` is part of the key so the current period rolls over at midnight
+@st.cache_data(show_spinner=False, max_entries=8)
+def volume_for_version(version: int, granularity: str, n=None, today=None) -> pd.DataFrame:
+    indexed = indexed_runs_for_version(version)
+    if n is None:
+        return aggregate_volume(indexed, granularity, end=today)
+    return last_n_periods(indexed, granularity, n, today=today)
+
+
+def load_volume(granularity: str = "week", n=None) -> pd.DataFrame:
+    """Per-period volume (all history, or the last `n` periods)."""
+    return volume_for_version(get_data_version(), granularity, n, date.today().isoformat())
@@ -0,0 +1,393 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.database import fetch_runs_after, get_data_version
+from utils.metrics import metrics_for_version, prepare_metrics_df
+
+
+# Runs that approximate threshold effort
+THRESHOLD_TYPES = ["Tempo", "Threshold", "Interval", "Race"]
+MIN_THRESHOLD_MILES = 2.0
+
+# Thresholds are medians over the qualifying runs of this trailing window
+THRESHOLD_WINDOW = "90D"
+
+RESTING_HR_DEFAULT = 60
+
+# Zone settings combinations kept in memory (each holds per-run zones)
+MAX_ZONE_STATES = 8
+
+ZONE_MODELS = {
+    "pace": "Pace (% of threshold pace)",
+    "hr": "Heart rate (% of threshold HR)",
+    "hrr": "Heart-rate reserve (Karvonen)",
+}
+
+# Pace zones: (name, target pace as a multiple of threshold pace).
+# Zone edges sit halfway between neighbouring targets.
+PACE_ZONES = [
+    ("Easy / Recovery", 1.20),
+    ("Steady / Aerobic", 1.08),
+    ("Marathon Pace (approx)", 1.03),
+    ("Threshold / Tempo", 1.00),
+    ("Interval", 0.90),
+    ("Repetition / Speed", 0.80),
+]
+
+# HR zones: (name, lower bound) as a fraction of threshold HR / of HR reserve
+HR_ZONES = [
+    ("Z1 Recovery", 0.0),
+    ("Z2 Aerobic", 0.85),
+    ("Z3 Tempo", 0.90),
+    ("Z4 Threshold", 0.95),
+    ("Z5 VO2max", 1.00),
+]
+HRR_ZONES = [
+    ("Z1 Recovery", 0.0),
+    ("Z2 Aerobic", 0.60),
+    ("Z3 Tempo", 0.70),
+    ("Z4 Threshold", 0.80),
+    ("Z5 VO2max", 0.90),
+]
+
+
+def zone_names(model: str) -> list:
+    if model == "pace":
+        return [name for name, _ in PACE_ZONES]
+    return [name for name, _ in (HR_ZONES if model == "hr" else HRR_ZONES)]
+
+
+def zone_edges(model: str) -> np.ndarray:
+    """
+    Ascending intensity lower bounds of zones 2..n (higher = harder).
+    Pace intensity is threshold pace / run pace, i.e. relative speed.
+    """
+    if model == "pace":
+        targets = np.array([ratio for _, ratio in PACE_ZONES])
+        return 1.0 / ((targets[:-1] + targets[1:]) / 2.0)
+    if model in ("hr", "hrr"):
+        return np.array([lo for _, lo in (HR_ZONES if model == "hr" else HRR_ZONES)][1:])
+    raise ValueError(f"model must be one of {list(ZONE_MODELS)}")
+
+
+# -------------------------------------------------------------------
+# Threshold estimation
+# -------------------------------------------------------------------
+def qualifying_runs(metrics: pd.DataFrame) -> pd.DataFrame:
+    """
+    Runs that threshold estimates are based on: date_dt, pace_seconds,
+    avg_hr, sorted by date. Tempo / threshold / interval / race runs over
+    MIN_THRESHOLD_MILES; if there are none, every run with a pace (the
+    `fallback` attr is set so the page can say so).
+    """
+    columns = ["date_dt", "pace_seconds", "avg_hr"]
+    if metrics.empty:
+        out = pd.DataFrame(columns=columns)
+        out.attrs["fallback"] = False
+        return out
+
+    pace = pd.to_numeric(metrics["pace_seconds"], errors="coerce")
+    usable = metrics["date_dt"].notna() & pace.gt(0)
+    fast = usable & metrics["run_type"].isin(THRESHOLD_TYPES) & metrics["distance"].gt(MIN_THRESHOLD_MILES)
+
+    fallback = not fast.any()
+    picked = metrics.loc[usable if fallback else fast]
+    out = pd.DataFrame({
+        "date_dt": picked["date_dt"],
+        "pace_seconds": pace[picked.index],
+        "avg_hr": pd.to_numeric(picked["avg_hr"], errors="coerce") if "avg_hr" in picked else np.nan,
+    }).sort_values("date_dt", kind="stable").reset_index(drop=True)
+    out.attrs["fallback"] = fallback
+    return out
+
+
+def rolling_thresholds(qualifying: pd.DataFrame) -> pd.DataFrame:
+    """
+    Threshold pace / HR as of each qualifying run: the median over the
+    trailing THRESHOLD_WINDOW. Indexed by date (one row per day).
+    """
+    if qualifying.empty:
+        return pd.DataFrame(
+            {"threshold_pace": [], "threshold_hr": []},
+            index=pd.DatetimeIndex([], name="date_dt"),
+        )
+
+    q = qualifying.set_index("date_dt")[["pace_seconds", "avg_hr"]].astype("float64")
+    rolled = q.rolling(THRESHOLD_WINDOW).median()
+    rolled.columns = ["threshold_pace", "threshold_hr"]
+    # Several qualifying runs on one day: keep the last (it saw them all)
+    return rolled[~rolled.index.duplicated(keep="last")]
+
+
+# Keyed on the qualifying runs themselves, so new easy runs (or edits to
+# them) reuse the estimate; it's only recomputed when qualifying runs change.
+@st.cache_data(show_spinner=False, max_entries=4)
+def _thresholds_cached(qualifying: pd.DataFrame) -> pd.DataFrame:
+    return rolling_thresholds(qualifying)
+
+
+def thresholds_as_of(thresholds: pd.DataFrame, dates: pd.Series) -> pd.DataFrame:
+    """Threshold in force on each date (runs before the first estimate use the first)."""
+    left = pd.DataFrame({"date_dt": dates.to_numpy(), "_pos": np.arange(len(dates))})
+    valid = left["date_dt"].notna()
+    out = pd.DataFrame(
+        {"threshold_pace": np.nan, "threshold_hr": np.nan}, index=np.arange(len(dates))
+    )
+    if thresholds.empty or not valid.any():
+        return out
+
+    merged = pd.merge_asof(
+        left[valid].sort_values("date_dt"),
+        thresholds.reset_index(),
+        on="date_dt",
+        direction="backward",
+    )
+    first = thresholds.iloc[0]
+    merged["threshold_pace"] = merged["threshold_pace"].fillna(first["threshold_pace"])
+    merged["threshold_hr"] = merged["threshold_hr"].fillna(first["threshold_hr"])
+    out.loc[merged["_pos"].to_numpy(), ["threshold_pace", "threshold_hr"]] = (
+        merged[["threshold_pace", "threshold_hr"]].to_numpy()
+    )
+    return out
+
+
+def observed_max_hr(metrics: pd.DataFrame):
+    for col in ("max_hr", "avg_hr"):
+        if col in metrics:
+            value = pd.to_numeric(metrics[col], errors="coerce").max()
+            if pd.notna(value) and value > 0:
+                return float(value)
+    return None
+
+
+# -------------------------------------------------------------------
+# Classification
+# -------------------------------------------------------------------
+def intensity(metrics: pd.DataFrame, model: str, as_of: pd.DataFrame,
+              resting_hr: float = RESTING_HR_DEFAULT, max_hr: float = None) -> np.ndarray:
+    """Per-run intensity on the model's scale (NaN where it can't be computed)."""
+    pace = pd.to_numeric(metrics["pace_seconds"], errors="coerce").to_numpy(dtype="float64")
+    hr = (
+        pd.to_numeric(metrics["avg_hr"], errors="coerce").to_numpy(dtype="float64")
+        if "avg_hr" in metrics else np.full(len(metrics), np.nan)
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if model == "pace":
+            value = as_of["threshold_pace"].to_numpy() / np.where(pace > 0, pace, np.nan)
+        elif model == "hr":
+            value = np.where(hr > 0, hr, np.nan) / as_of["threshold_hr"].to_numpy()
+        else:
+            if not max_hr or max_hr <= resting_hr:
+                return np.full(len(metrics), np.nan)
+            value = (np.where(hr > 0, hr, np.nan) - resting_hr) / (max_hr - resting_hr)
+    return value
+
+
+def classify(values: np.ndarray, model: str) -> np.ndarray:
+    """Zone index per run (0 = easiest), -1 where intensity is unknown."""
+    zones = np.searchsorted(zone_edges(model), values, side="right")
+    return np.where(np.isnan(values), -1, zones)
+
+
+def weekly_time_in_zone(metrics: pd.DataFrame, zones: np.ndarray, model: str) -> pd.DataFrame:
+    """Hours per zone per Mon–Sun week (whole runs counted in their zone)."""
+    names = zone_names(model)
+    hours = pd.to_numeric(metrics["duration_seconds"], errors="coerce").fillna(0.0).to_numpy() / 3600.0
+    keep = (zones >= 0) & metrics["date_dt"].notna().to_numpy()
+    if not keep.any():
+        return pd.DataFrame(columns=names, index=pd.PeriodIndex([], freq="W-SUN", name="week"))
+
+    weeks = metrics["date_dt"][keep].dt.to_period("W-SUN")
+    codes, uniques = pd.factorize(weeks, sort=True)
+    # One bincount over (week, zone) pairs instead of a groupby / pivot
+    flat = np.bincount(codes * len(names) + zones[keep], weights=hours[keep],
+                       minlength=len(uniques) * len(names))
+    table = pd.DataFrame(flat.reshape(len(uniques), len(names)), index=uniques, columns=names)
+    full = pd.period_range(uniques.min(), uniques.max(), freq="W-SUN")
+    table = table.reindex(full, fill_value=0.0)
+    table.index.name = "week"
+    return table
+
+
+def zone_ranges(model: str, threshold_pace=None, threshold_hr=None,
+                resting_hr: float = RESTING_HR_DEFAULT, max_hr: float = None) -> pd.DataFrame:
+    """Current zone boundaries in display units (pace in sec/mi, HR in bpm)."""
+    names = zone_names(model)
+    lo = np.concatenate(([np.nan], zone_edges(model)))
+    hi = np.concatenate((zone_edges(model), [np.nan]))
+
+    if model == "pace":
+        # Higher intensity = faster pace = fewer seconds per mile
+        table = pd.DataFrame({
+            "zone": names,
+            "target": [threshold_pace * ratio for _, ratio in PACE_ZONES],
+            "slowest": threshold_pace / lo,
+            "fastest": threshold_pace / hi,
+        })
+    elif model == "hr":
+        table = pd.DataFrame({"zone": names, "from": threshold_hr * lo, "to": threshold_hr * hi})
+    else:
+        reserve = (max_hr or np.nan) - resting_hr
+        table = pd.DataFrame({
+            "zone": names,
+            "from": resting_hr + reserve * np.where(np.isnan(lo), 0.5, lo),
+            "to": resting_hr + reserve * np.where(np.isnan(hi), 1.0, hi),
+        })
+    return table.set_index("zone")
+
+
+# -------------------------------------------------------------------
+# Process-wide zones per settings, kept current incrementally
+# -------------------------------------------------------------------
+# (model, resting_hr, max_hr_override) → {"version", "max_id", "latest",
+# "observed_max_hr", "qualifying", "thresholds", "zones"}
+_state = {}
+_state_lock = threading.Lock()
+
+
+def _summary(entry: dict, model: str, resting_hr: float, max_hr_override,
+             run_zones: pd.Series, weekly: pd.DataFrame) -> dict:
+    thresholds = entry["thresholds"]
+    qualifying = entry["qualifying"]
+    current = thresholds.iloc[-1]
+    as_of = thresholds.index[-1]
+    max_hr = max_hr_override or entry["observed_max_hr"]
+    in_window = qualifying["date_dt"] > as_of - pd.Timedelta(THRESHOLD_WINDOW)
+
+    return {
+        "threshold_pace": float(current["threshold_pace"]),
+        "threshold_hr": float(current["threshold_hr"]) if pd.notna(current["threshold_hr"]) else None,
+        "as_of": as_of,
+        "max_hr": max_hr,
+        "resting_hr": resting_hr,
+        "fallback": qualifying.attrs.get("fallback", False),
+        # Runs behind the current estimate, not all history
+        "qualifying_runs": int(in_window.sum()),
+        "trend": thresholds,
+        "ranges": zone_ranges(model, current["threshold_pace"], current["threshold_hr"], resting_hr, max_hr),
+        "run_zones": run_zones,
+        "weekly": weekly,
+    }
+
+
+def _build_zones(metrics: pd.DataFrame, model: str, resting_hr: float, max_hr_override) -> dict:
+    qualifying = qualifying_runs(metrics)
+    entry = {
+        "max_id": int(metrics["id"].max()) if not metrics.empty else 0,
+        "latest": metrics["date_dt"].max() if not metrics.empty else pd.NaT,
+        "observed_max_hr": observed_max_hr(metrics),
+        "qualifying": qualifying,
+        "thresholds": _thresholds_cached(qualifying),
+        "zones": {},
+    }
+    if metrics.empty or entry["thresholds"].empty:
+        return entry
+
+    max_hr = max_hr_override or entry["observed_max_hr"]
+    as_of = thresholds_as_of(entry["thresholds"], metrics["date_dt"])
+    zones = classify(intensity(metrics, model, as_of, resting_hr, max_hr), model)
+    entry["zones"] = _summary(
+        entry, model, resting_hr, max_hr_override,
+        pd.Series(zones, index=metrics["id"].to_numpy(), name="zone"),
+        weekly_time_in_zone(metrics, zones, model),
+    )
+    return entry
+
+
+def _extend_zones(entry: dict, new: pd.DataFrame, model: str, resting_hr: float, max_hr_override):
+    """
+    `entry` with the runs in `new` (prepared metrics) classified and added,
+    or None when they could move an already-classified run's zone: a
+    qualifying run dated on or before the latest known run, the first
+    tempo run ending the all-runs fallback, or a new observed max HR under
+    the Karvonen model. Earlier runs keep their zones otherwise.
+    """
+    if not entry["zones"]:
+        return None
+
+    fallback = entry["qualifying"].attrs.get("fallback", False)
+    fresh = qualifying_runs(new)
+    has_fast = not fresh.attrs["fallback"] and not fresh.empty
+    if fallback and has_fast:
+        return None
+    if not fallback and not has_fast:
+        fresh = fresh.iloc[:0]
+
+    observed = observed_max_hr(new)
+    if observed is not None and observed > (entry["observed_max_hr"] or 0):
+        if model == "hrr" and not max_hr_override:
+            return None
+    else:
+        observed = entry["observed_max_hr"]
+
+    qualifying, thresholds = entry["qualifying"], entry["thresholds"]
+    if not fresh.empty:
+        start = fresh["date_dt"].min()
+        if start <= entry["latest"]:
+            return None
+        qualifying = pd.concat([qualifying, fresh], ignore_index=True)
+        qualifying.attrs["fallback"] = fallback
+        # Only medians dated from the first new run on can change
+        tail = qualifying[qualifying["date_dt"] > start - pd.Timedelta(THRESHOLD_WINDOW)]
+        rolled = rolling_thresholds(tail)
+        thresholds = pd.concat([thresholds, rolled[rolled.index >= start]])
+
+    extended = {
+        "max_id": max(entry["max_id"], int(new["id"].max())),
+        "latest": max(entry["latest"], new["date_dt"].max()) if new["date_dt"].notna().any() else entry["latest"],
+        "observed_max_hr": observed,
+        "qualifying": qualifying,
+        "thresholds": thresholds,
+    }
+
+    max_hr = max_hr_override or observed
+    as_of = thresholds_as_of(thresholds, new["date_dt"])
+    zones = classify(intensity(new, model, as_of, resting_hr, max_hr), model)
+
+    weekly = entry["zones"]["weekly"].add(weekly_time_in_zone(new, zones, model), fill_value=0.0)
+    if not weekly.empty:
+        weekly = weekly.reindex(
+            pd.period_range(weekly.index.min(), weekly.index.max(), freq="W-SUN"), fill_value=0.0
+        )
+    weekly = weekly[zone_names(model)]
+    weekly.index.name = "week"
+
+    run_zones = pd.concat([
+        entry["zones"]["run_zones"],
+        pd.Series(zones, index=new["id"].to_numpy(), name="zone"),
+    ])
+    extended["zones"] = _summary(extended, model, resting_hr, max_hr_override, run_zones, weekly)
+    return extended
+
+
+def load_zones(model: str = "pace", resting_hr: float = RESTING_HR_DEFAULT, max_hr: float = None) -> dict:
+    """
+    Thresholds, zone ranges, per-run zones and weekly hours in zone for `model`.
+
+    Like load_cohorts: when the data version has moved by exactly the number
+    of runs added since the last call, only those runs are classified and
+    added to the weekly totals. Anything else rebuilds from the cached metrics.
+    """
+    key = (model, float(resting_hr), float(max_hr) if max_hr else None)
+    version = get_data_version()
+    with _state_lock:
+        entry = _state.get(key)
+        if entry is not None and entry["version"] == version:
+            return entry["zones"]
+
+        extended = None
+        if entry is not None and version > entry["version"]:
+            new = fetch_runs_after(entry["max_id"])
+            if len(new) == version - entry["version"]:
+                extended = _extend_zones(entry, prepare_metrics_df(new), *key)
+
+        entry = extended if extended is not None else _build_zones(metrics_for_version(version), *key)
+        entry["version"] = version
+        _state.pop(key, None)
+        _state[key] = entry
+        while len(_state) > MAX_ZONE_STATES:
+            _state.pop(next(iter(_state)))
+        return entry["zones"]